@@ -0,0 +1,30 @@
+# UBICACIÓN: gunicorn.conf.py (gunicorn lo lee solo desde la carpeta del proyecto)
+"""
+Servidor de producción: gunicorn como administrador de procesos con workers ASGI de uvicorn
+(salon_project/asgi.py). Cada worker es un proceso con un event loop: las vistas async
+(p. ej. api.consultar_disponibilidad_async) atienden muchas peticiones a la vez mientras
+esperan a la base de datos; las vistas normales (sync) corren en hilos del mismo worker.
+
+Cuántos workers:
+  - Un worker ASGI por núcleo asignado (WEB_CONCURRENCY). A diferencia de los workers sync
+    (2 x núcleos + 1, uno por petición en curso), la espera de E/S no ocupa el proceso, así
+    que más procesos solo suman memoria y conexiones.
+  - Conexiones a la base: bajo ASGI no hay conexiones persistentes (asgi.py pone
+    DB_CONN_MAX_AGE=0), cada petición abre y cierra la suya. Las peticiones en curso de todos
+    los workers no deben pasar de max_connections de PostgreSQL; con tráfico alto poner
+    PgBouncer (modo transaction) delante antes que bajar los workers.
+  - Por defecto 2, lo que aguanta una instancia chica (512 MB, 1 núcleo compartido). No se usa
+    cpu_count(): dentro de un contenedor devuelve los núcleos del host, no los asignados.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'uvicorn_worker.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Reinicia cada worker tras N peticiones (con algo de azar para no reiniciarlos todos juntos)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 20
+accesslog = '-'
+errorlog = '-'
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Tenant, Professional, Service, Product, Appointment, ExternalPayment, Absence, HorarioEmpleado
+from .models import Tenant, Professional, Service, Product, Appointment, AppointmentArchive, DailyRollup, ExternalPayment, Absence, HorarioEmpleado
 
 @admin.register(Tenant)
 class TenantAdmin(admin.ModelAdmin):
@@ -26,6 +26,16 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_display = ('cliente_nombre', 'fecha_hora_inicio', 'servicio', 'empleado', 'estado')
     list_filter = ('estado', 'fecha_hora_inicio')
 
+@admin.register(AppointmentArchive)
+class AppointmentArchiveAdmin(admin.ModelAdmin):
+    list_display = ('cliente_nombre', 'fecha_hora_inicio', 'servicio', 'empleado', 'estado', 'archivada_en')
+    list_filter = ('estado', 'tenant')
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'empleado', 'estado', 'citas', 'ingresos', 'minutos')
+    list_filter = ('estado', 'tenant')
+
 admin.site.register(Product)
 admin.site.register(ExternalPayment)
 admin.site.register(Absence)
@@ -1,130 +1,447 @@
 # UBICACIÓN: salon/api.py
-from django.http import JsonResponse
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
 from django.db import transaction
 from django.conf import settings
+from django.utils import timezone
 from datetime import datetime, timedelta
 import json
+import logging
+import uuid
 
-from .models import Tenant as Peluqueria, Service as Servicio, Professional as Empleado, Appointment as Cita
-from .services import obtener_bloques_disponibles, verificar_conflicto_atomic
+from .models import Service as Servicio, Professional as Empleado, Appointment as Cita, SlotHold as Apartado
+from .services import (
+    DURACION_MAXIMA_CITA, buscar_proximos_turnos, citas_y_apartados, intervalo_cita, localizar, verificar_conflicto_atomic,
+)
+from .signals import registrar_creadas_en_lote
+from .utils.cache_disponibilidad import adisponibilidad_cacheada, disponibilidad_cacheada
+from .utils import catalogo, huecos, reservas
 # IMPORTAMOS AL GUARDIA (Asumiendo que tienes este archivo)
 from salon.utils.booking_lock import BookingManager
+from salon.utils.idempotencia import idempotente
+
+logger = logging.getLogger(__name__)
+
+# Máximo de días que se pueden pedir en modo rango (desde/hasta)
+MAX_DIAS_RANGO = 31
+
+# Límites de la búsqueda de próximos turnos
+MAX_TURNOS_PROXIMOS = 20
+MAX_HORIZONTE_DIAS = 90
+
+# Máximo de citas por petición en la creación en lote
+MAX_CITAS_LOTE = 100
 
 def proteger_api(vista_func):
-    """Decorador simple para verificar la API Key"""
-    def _wrapped_view(request, *args, **kwargs):
+    """Decorador simple para verificar la API Key (sirve también para vistas async)"""
+    def _denegado(request):
         api_key_recibida = request.headers.get('X-API-KEY')
         if api_key_recibida != settings.API_SECRET_KEY:
             return JsonResponse({'error': 'Acceso denegado: API Key inválida o faltante'}, status=403)
-        return vista_func(request, *args, **kwargs)
+        return None
+
+    if iscoroutinefunction(vista_func):
+        async def _wrapped_view(request, *args, **kwargs):
+            return _denegado(request) or await vista_func(request, *args, **kwargs)
+    else:
+        def _wrapped_view(request, *args, **kwargs):
+            return _denegado(request) or vista_func(request, *args, **kwargs)
     return _wrapped_view
 
+# Catálogo: el cliente puede guardarlo este tiempo sin preguntar; después revalida con
+# If-None-Match y, si no cambió, recibe un 304 sin cuerpo (ver salon/utils/catalogo.py)
+CATALOGO_MAX_AGE = 60
+
 @proteger_api
+@cache_control(private=True, max_age=CATALOGO_MAX_AGE)
+@condition(etag_func=catalogo.etag('servicios'))
 def listar_servicios(request, slug_peluqueria):
-    servicios = Servicio.objects.filter(tenant__subdomain=slug_peluqueria)
-    data = list(servicios.values('id', 'nombre', 'duracion', 'precio'))
-    for s in data:
-        # s['duracion'] ya es int en minutos según el modelo corregido
-        s['precio'] = float(s['precio'])
-    return JsonResponse(data, safe=False)
+    def _servicios():
+        servicios = Servicio.objects.filter(tenant_id=request.tenant.id)
+        data = list(servicios.values('id', 'nombre', 'duracion', 'precio'))
+        for s in data:
+            # s['duracion'] ya es int en minutos según el modelo corregido
+            s['precio'] = float(s['precio'])
+        return data
+    return _respuesta_catalogo(request, 'servicios', _servicios)
 
 @proteger_api
+@cache_control(private=True, max_age=CATALOGO_MAX_AGE)
+@condition(etag_func=catalogo.etag('empleados'))
 def listar_empleados(request, slug_peluqueria):
-    # Asumimos que todos los Professional activos se muestran
-    empleados = Empleado.objects.filter(tenant__subdomain=slug_peluqueria)
-    data = [{'id': e.id, 'nombre': e.nombre} for e in empleados]
-    return JsonResponse(data, safe=False)
+    def _empleados():
+        # Asumimos que todos los Professional activos se muestran
+        empleados = Empleado.objects.filter(tenant_id=request.tenant.id)
+        return [{'id': e.id, 'nombre': e.nombre} for e in empleados]
+    return _respuesta_catalogo(request, 'empleados', _empleados)
+
+def _respuesta_catalogo(request, nombre, construir):
+    """Cuerpo desde la cache por versión (salon/utils/catalogo.py) con el ETag de esa versión."""
+    cuerpo, version = catalogo.cuerpo(nombre, request.tenant.id, request.version_catalogo, construir)
+    respuesta = HttpResponse(cuerpo, content_type='application/json')
+    # Si es la copia anterior (otro worker reconstruye), su propio ETag; si no, lo pone @condition
+    if version != request.version_catalogo:
+        respuesta['ETag'] = catalogo.formato_etag(nombre, request.tenant.id, version)
+    return respuesta
 
 @proteger_api
 def consultar_disponibilidad(request, slug_peluqueria):
     fecha_str = request.GET.get('fecha')
+    desde_str = request.GET.get('desde')
+    hasta_str = request.GET.get('hasta')
     servicio_id = request.GET.get('service_id')
     empleado_id = request.GET.get('empleado_id') 
 
-    if not (fecha_str and servicio_id):
-        return JsonResponse({'error': 'Faltan parámetros fecha o service_id'}, status=400)
+    if not ((fecha_str or (desde_str and hasta_str)) and servicio_id):
+        return JsonResponse({'error': 'Faltan parámetros fecha (o desde/hasta) o service_id'}, status=400)
 
     try:
-        fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-        servicio = get_object_or_404(Servicio, id=servicio_id)
+        tenant = request.tenant
+        servicio = Servicio.objects.get(id=servicio_id, tenant_id=tenant.id)
         
         # Filtro de empleados
+        empleados = Empleado.objects.filter(tenant_id=tenant.id)
         if empleado_id and empleado_id != 'todos': 
-            empleados = Empleado.objects.filter(id=empleado_id)
-        else: 
-            empleados = Empleado.objects.filter(tenant__subdomain=slug_peluqueria)
-
-        resultados = {}
-        for emp in empleados:
-            # Usamos la duración del servicio seleccionado para calcular bloques
-            horas = obtener_bloques_disponibles(emp, fecha, servicio.duracion)
-            if horas: 
-                resultados[emp.nombre] = [{'hora_inicio': h} for h in horas]
-        
-        return JsonResponse(resultados)
+            empleados = empleados.filter(id=empleado_id)
+        empleados = list(empleados)
+
+        # Modo rango: calendario semanal/mensual en una sola petición
+        if not fecha_str:
+            desde = datetime.strptime(desde_str, "%Y-%m-%d").date()
+            hasta = datetime.strptime(hasta_str, "%Y-%m-%d").date()
+            if hasta < desde or (hasta - desde).days >= MAX_DIAS_RANGO:
+                return JsonResponse({'error': f'Rango inválido: máximo {MAX_DIAS_RANGO} días'}, status=400)
+            return JsonResponse(_formato_rango(desde, hasta, _disponibilidad(tenant, empleados, desde, hasta, servicio.duracion)))
+
+        fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
+        # Un solo lote (y cacheado) para todos los empleados: 3 consultas como máximo
+        return JsonResponse(_formato_dia(_disponibilidad(tenant, empleados, fecha, fecha, servicio.duracion)[fecha]))
+    except Servicio.DoesNotExist:
+        return JsonResponse({'error': 'Servicio no encontrado'}, status=404)
     except ValueError:
         return JsonResponse({'error': 'Formato de fecha inválido. Use YYYY-MM-DD'}, status=400)
-    except Exception as e:
-        print(f"Error API: {e}") 
+    except Exception:
+        logger.exception('Error consultando disponibilidad')
         return JsonResponse({'error': 'Error interno del servidor'}, status=500)
 
+@proteger_api
+async def consultar_disponibilidad_async(request, slug_peluqueria):
+    """
+    consultar_disponibilidad para el servidor ASGI (ver gunicorn.conf.py), con los mismos parámetros
+    y respuestas. Las consultas van por el ORM asíncrono y el cálculo por profesional en hilos
+    aparte: mientras espera, el worker sigue atendiendo otras peticiones.
+    """
+    fecha_str = request.GET.get('fecha')
+    desde_str = request.GET.get('desde')
+    hasta_str = request.GET.get('hasta')
+    servicio_id = request.GET.get('service_id')
+    empleado_id = request.GET.get('empleado_id')
+
+    if not ((fecha_str or (desde_str and hasta_str)) and servicio_id):
+        return JsonResponse({'error': 'Faltan parámetros fecha (o desde/hasta) o service_id'}, status=400)
+
+    try:
+        tenant = request.tenant
+        servicio = await Servicio.objects.aget(id=servicio_id, tenant_id=tenant.id)
+
+        empleados = Empleado.objects.filter(tenant_id=tenant.id)
+        if empleado_id and empleado_id != 'todos':
+            empleados = empleados.filter(id=empleado_id)
+        empleados = [emp async for emp in empleados]
+
+        if not fecha_str:
+            desde = datetime.strptime(desde_str, "%Y-%m-%d").date()
+            hasta = datetime.strptime(hasta_str, "%Y-%m-%d").date()
+            if hasta < desde or (hasta - desde).days >= MAX_DIAS_RANGO:
+                return JsonResponse({'error': f'Rango inválido: máximo {MAX_DIAS_RANGO} días'}, status=400)
+            return JsonResponse(_formato_rango(desde, hasta, await _adisponibilidad(tenant, empleados, desde, hasta, servicio.duracion)))
+
+        fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
+        return JsonResponse(_formato_dia((await _adisponibilidad(tenant, empleados, fecha, fecha, servicio.duracion))[fecha]))
+    except Servicio.DoesNotExist:
+        return JsonResponse({'error': 'Servicio no encontrado'}, status=404)
+    except ValueError:
+        return JsonResponse({'error': 'Formato de fecha inválido. Use YYYY-MM-DD'}, status=400)
+    except Exception:
+        logger.exception('Error consultando disponibilidad (async)')
+        return JsonResponse({'error': 'Error interno del servidor'}, status=500)
+
+def _disponibilidad(tenant, empleados, desde, hasta, duracion):
+    """Usa la tabla materializada de huecos si el negocio la tiene para ese rango; si no, el cálculo cacheado."""
+    if huecos.usa_huecos(tenant, desde, hasta):
+        return huecos.disponibilidad_materializada(empleados, desde, hasta, duracion)
+    return disponibilidad_cacheada(empleados, desde, hasta, duracion)
+
+async def _adisponibilidad(tenant, empleados, desde, hasta, duracion):
+    """_disponibilidad desde una vista async."""
+    if await sync_to_async(huecos.usa_huecos)(tenant, desde, hasta):
+        return await sync_to_async(huecos.disponibilidad_materializada)(empleados, desde, hasta, duracion)
+    return await adisponibilidad_cacheada(empleados, desde, hasta, duracion)
+
+def _formato_dia(por_empleado):
+    """{empleado: [{'hora_inicio': ...}]} sin los que no tienen bloques libres."""
+    return {
+        emp.nombre: [{'hora_inicio': h} for h in horas]
+        for emp, horas in por_empleado.items() if horas
+    }
+
+def _formato_rango(desde, hasta, disponibilidad):
+    """
+    Arma la respuesta del modo rango:
+      - 'dias': {fecha: {empleado: [{'hora_inicio': ...}]}} igual que el modo de un día
+      - 'libres_por_dia': {fecha: total de bloques libres} para pintar el mapa de calor
+    """
+    dias = {}
+    libres_por_dia = {}
+    for fecha, por_empleado in disponibilidad.items():
+        clave = fecha.isoformat()
+        dias[clave] = _formato_dia(por_empleado)
+        libres_por_dia[clave] = sum(len(horas) for horas in por_empleado.values())
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'dias': dias,
+        'libres_por_dia': libres_por_dia,
+    }
+
+@proteger_api
+def proximos_turnos(request, slug_peluqueria):
+    """Los próximos turnos libres para un servicio con cualquier profesional (o uno en particular)."""
+    servicio_id = request.GET.get('service_id')
+    empleado_id = request.GET.get('empleado_id')
+    if not servicio_id:
+        return JsonResponse({'error': 'Falta el parámetro service_id'}, status=400)
+
+    try:
+        k = min(int(request.GET.get('k', 5)), MAX_TURNOS_PROXIMOS)
+        dias = min(int(request.GET.get('dias', 30)), MAX_HORIZONTE_DIAS)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros k/dias inválidos'}, status=400)
+    if not servicio_id.isdigit() or (empleado_id and empleado_id != 'todos' and not empleado_id.isdigit()):
+        return JsonResponse({'error': 'Parámetros service_id/empleado_id inválidos'}, status=400)
+
+    try:
+        servicio = Servicio.objects.get(id=servicio_id, tenant_id=request.tenant.id)
+    except Servicio.DoesNotExist:
+        return JsonResponse({'error': 'Servicio no encontrado'}, status=404)
+
+    empleados = Empleado.objects.filter(tenant_id=request.tenant.id)
+    if empleado_id and empleado_id != 'todos':
+        empleados = empleados.filter(id=empleado_id)
+
+    turnos = buscar_proximos_turnos(empleados, servicio.duracion, k=k, horizonte_dias=dias)
+    return JsonResponse([
+        {
+            'fecha': inicio.date().isoformat(),
+            'hora_inicio': inicio.strftime("%H:%M"),
+            'empleado_id': emp.id,
+            'empleado': emp.nombre,
+        }
+        for inicio, emp in turnos
+    ], safe=False)
+
 @csrf_exempt
 @proteger_api
+@idempotente
 def crear_cita_api(request, slug_peluqueria):
     if request.method != 'POST': 
         return JsonResponse({'error': 'Método no permitido'}, status=405)
 
     try:
         data = json.loads(request.body)
-        peluqueria = get_object_or_404(Peluqueria, subdomain=slug_peluqueria)
-        
-        # Obtenemos IDs básicos
-        empleado_id = data.get('empleado_id')
-        servicio_id = data.get('servicio_id')
-        servicio = get_object_or_404(Servicio, id=servicio_id)
+
+        apartado = None
+        if data.get('apartado'):
+            # Confirmación de un apartado: profesional, servicio y horario salen de él
+            apartado = reservas.resolver_apartado(request.tenant, uuid.UUID(str(data['apartado'])))
+            if not apartado:
+                return JsonResponse({'error': 'APARTADO_VENCIDO'}, status=410)
+            empleado_id, servicio, inicio = apartado.empleado_id, apartado.servicio, apartado.inicio
+        else:
+            empleado_id = data.get('empleado_id')
+            servicio = reservas.resolver_servicio(request.tenant, data.get('servicio_id'))
+            inicio = _leer_inicio(data)
+
+        # --- EJECUCIÓN CON EL GUARDIA (ver salon/utils/reservas.py) ---
+        cita = reservas.crear_cita(
+            servicio, empleado_id, inicio,
+            cliente_nombre=data.get('cliente_nombre', 'Cliente App'),
+            cliente_telefono=data.get('cliente_telefono', '0000000000'),
+            apartado=apartado,
+        )
         
-        # Parseo seguro de fecha y hora
-        fecha_str = data.get('fecha')
-        hora_str = data.get('hora_inicio')
-        inicio = datetime.strptime(f"{fecha_str} {hora_str}", "%Y-%m-%d %H:%M")
+        return JsonResponse({'mensaje': 'Cita creada exitosamente', 'id': cita.id}, status=201)
+
+    except Servicio.DoesNotExist:
+        return JsonResponse({'error': 'Servicio no encontrado'}, status=404)
+    except ValueError as ve:
+        mensaje = str(ve)
+        if 'HORARIO_OCUPADO' in mensaje:
+            return JsonResponse({'error': 'HORARIO_OCUPADO'}, status=409)
+        return JsonResponse({'error': f'Error de validación: {mensaje}'}, status=400)
+    except ValidationError as ve:
+        return JsonResponse({'error': f"Error de validación: {' '.join(ve.messages)}"}, status=400)
+    except Exception as e:
+        print(f"Error API Crear Cita: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+def _leer_inicio(data):
+    """Parseo seguro de fecha y hora (YYYY-MM-DD y HH:MM, hora Colombia)."""
+    return localizar(datetime.strptime(f"{data.get('fecha')} {data.get('hora_inicio')}", "%Y-%m-%d %H:%M"))
+
+@csrf_exempt
+@proteger_api
+def crear_apartado_api(request, slug_peluqueria):
+    """
+    Aparta un horario por APARTADO_TTL_MINUTOS mientras el cliente termina de reservar.
+    Mientras esté vigente cuenta como ocupado en la disponibilidad; se confirma enviando
+    el token como 'apartado' a crear_cita_api.
+    """
+    if request.method != 'POST': 
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        peluqueria = request.tenant
+        servicio = reservas.resolver_servicio(peluqueria, data.get('servicio_id'))
+        inicio = _leer_inicio(data)
         fin = inicio + timedelta(minutes=servicio.duracion)
 
-        # --- DEFINICIÓN DE LA LÓGICA SEGURA ---
-        def _logica_crear_cita(empleado_bloqueado, *args, **kwargs):
-            # Validar pertenencia
-            if empleado_bloqueado.tenant != peluqueria:
+        def _logica_apartar(empleado_bloqueado, *args, **kwargs):
+            if empleado_bloqueado.tenant_id != peluqueria.id:
                 raise ValueError('El empleado no pertenece a esta peluquería')
-
-            # 1. Verificar conflicto
             if verificar_conflicto_atomic(empleado_bloqueado, inicio, fin):
                 raise ValueError('HORARIO_OCUPADO')
-
-            # 2. Crear Cita
-            nueva_cita = Cita.objects.create(
+            return Apartado.objects.create(
                 tenant=peluqueria,
                 empleado=empleado_bloqueado,
                 servicio=servicio,
-                cliente_nombre=data.get('cliente_nombre', 'Cliente App'),
-                cliente_telefono=data.get('cliente_telefono', '0000000000'),
-                fecha_hora_inicio=inicio,
-                fecha_hora_fin=fin,
-                precio_total=servicio.precio,
-                estado='confirmada' # Confirmada directamente
+                inicio=inicio,
+                fin=fin,
+                expira=timezone.now() + timedelta(minutes=settings.APARTADO_TTL_MINUTOS),
             )
-            return nueva_cita
 
-        # --- EJECUCIÓN CON EL GUARDIA ---
-        cita = BookingManager.ejecutar_reserva_segura(empleado_id, _logica_crear_cita)
-        
-        return JsonResponse({'mensaje': 'Cita creada exitosamente', 'id': cita.id}, status=201)
+        apartado = BookingManager.ejecutar_apartado_seguro(data.get('empleado_id'), _logica_apartar)
+        return JsonResponse({'apartado': str(apartado.token), 'expira': apartado.expira.isoformat()}, status=201)
 
+    except Servicio.DoesNotExist:
+        return JsonResponse({'error': 'Servicio no encontrado'}, status=404)
     except ValueError as ve:
         mensaje = str(ve)
         if 'HORARIO_OCUPADO' in mensaje:
             return JsonResponse({'error': 'HORARIO_OCUPADO'}, status=409)
         return JsonResponse({'error': f'Error de validación: {mensaje}'}, status=400)
-    except Exception as e:
-        print(f"Error API Crear Cita: {e}")
-        return JsonResponse({'error': str(e)}, status=500)
+    except Exception:
+        logger.exception('Error apartando horario')
+        return JsonResponse({'error': 'Error interno del servidor'}, status=500)
+
+@csrf_exempt
+@proteger_api
+def liberar_apartado_api(request, slug_peluqueria, token):
+    """El cliente desistió: suelta el apartado antes de que venza (DELETE)."""
+    if request.method != 'DELETE':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    for apartado in Apartado.objects.filter(token=token, tenant_id=request.tenant.id):
+        apartado.delete()  # Uno a uno para que las señales liberen la disponibilidad
+    return HttpResponse(status=204)
+
+@csrf_exempt
+@proteger_api
+@idempotente
+def crear_citas_lote_api(request, slug_peluqueria):
+    """
+    Crea varias citas en una sola transacción (recepción, importaciones).
+    Cuerpo: {"citas": [{empleado_id, servicio_id, fecha, hora_inicio, cliente_nombre, cliente_telefono}, ...]}
+
+    Cada cita se valida contra la base y contra las demás del mismo lote; las que pasan
+    se insertan juntas con bulk_create. Responde el resultado de cada una, en el mismo
+    orden: 201 si entraron todas, 207 si solo algunas.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+    try:
+        items = json.loads(request.body).get('citas')
+    except (ValueError, AttributeError):
+        items = None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'error': "Se requiere la lista 'citas'"}, status=400)
+    if len(items) > MAX_CITAS_LOTE:
+        return JsonResponse({'error': f'Máximo {MAX_CITAS_LOTE} citas por lote'}, status=400)
+
+    peluqueria = request.tenant
+    servicios = {s.id: s for s in Servicio.objects.filter(tenant_id=peluqueria.id)}
+
+    resultados = [None] * len(items)
+    pendientes = []  # (indice, empleado_id, datos, servicio, inicio, fin)
+    for indice, datos in enumerate(items):
+        try:
+            empleado_id = int(datos.get('empleado_id'))
+            servicio = servicios.get(int(datos.get('servicio_id')))
+            inicio = _leer_inicio(datos)
+        except (AttributeError, TypeError, ValueError):
+            resultados[indice] = {'ok': False, 'error': 'DATOS_INVALIDOS'}
+            continue
+        if not servicio:
+            resultados[indice] = {'ok': False, 'error': 'SERVICIO_INVALIDO'}
+            continue
+        if timedelta(minutes=servicio.duracion) > DURACION_MAXIMA_CITA:  # bulk_create no pasa por Cita.save
+            resultados[indice] = {'ok': False, 'error': 'DURACION_INVALIDA'}
+            continue
+        pendientes.append((indice, empleado_id, datos, servicio, inicio, inicio + timedelta(minutes=servicio.duracion)))
+
+    def _logica_crear_citas(empleados_bloqueados):
+        # Lo ya ocupado de todos los profesionales del lote, en una consulta
+        ocupados = {}
+        if pendientes:
+            filas = citas_y_apartados(
+                list(empleados_bloqueados), min(p[4] for p in pendientes), max(p[5] for p in pendientes)
+            )
+            for empleado_id, *cita in filas:
+                ocupados.setdefault(empleado_id, []).append(intervalo_cita(*cita))
+
+        nuevas = []
+        for indice, empleado_id, datos, servicio, inicio, fin in pendientes:
+            empleado = empleados_bloqueados.get(empleado_id)
+            if not empleado or empleado.tenant_id != peluqueria.id:
+                resultados[indice] = {'ok': False, 'error': 'EMPLEADO_INVALIDO'}
+                continue
+            agenda = ocupados.setdefault(empleado.id, [])
+            if any(inicio < fin_ocupado and fin > inicio_ocupado for inicio_ocupado, fin_ocupado in agenda):
+                resultados[indice] = {'ok': False, 'error': 'HORARIO_OCUPADO'}
+                continue
+            agenda.append((inicio, fin))  # Las siguientes del lote chocan con esta
+            nuevas.append((indice, Cita(
+                tenant=peluqueria,
+                empleado=empleado,
+                servicio=servicio,
+                cliente_nombre=datos.get('cliente_nombre', 'Cliente App'),
+                cliente_telefono=datos.get('cliente_telefono', '0000000000'),
+                fecha_hora_inicio=inicio,
+                fecha_hora_fin=fin,
+                precio_total=servicio.precio,
+                estado='confirmada',
+            )))
+
+        creadas = Cita.objects.bulk_create([cita for _, cita in nuevas])
+        registrar_creadas_en_lote(creadas)
+        for (indice, _), cita in zip(nuevas, creadas):
+            resultados[indice] = {'ok': True, 'id': cita.id}
+
+    try:
+        BookingManager.ejecutar_reservas_en_lote([p[1] for p in pendientes], _logica_crear_citas)
+    except ValueError as ve:
+        if 'HORARIO_OCUPADO' in str(ve):
+            return JsonResponse({'error': 'HORARIO_OCUPADO'}, status=409)
+        raise
+
+    creadas = sum(1 for r in resultados if r['ok'])
+    return JsonResponse(
+        {'creadas': creadas, 'resultados': [dict(indice=i, **r) for i, r in enumerate(resultados)]},
+        status=201 if creadas == len(items) else 207,
+    )
+
@@ -4,3 +4,7 @@ class SalonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'salon'
     verbose_name = 'Gestión de Peluquerías'
+
+    def ready(self):
+        # Conecta los receptores de señales (invalidación de cache de disponibilidad)
+        from . import signals  # noqa: F401
@@ -3,19 +3,7 @@
 def tenant_context(request):
     """
     Inyecta el objeto 'current_tenant' a todas las plantillas.
+    Es el mismo `request.current_tenant` de TenantMiddleware (dueño o profesional): perezoso,
+    solo consulta si la plantilla lo usa, y una sola vez por petición.
     """
-    tenant = None
-    if request.user.is_authenticated:
-        try:
-            # 1. Intentar desde PerfilUsuario (Dueño - asumiendo relación tenant)
-            if hasattr(request.user, 'tenants') and request.user.tenants.exists():
-                tenant = request.user.tenants.first()
-            
-            # 2. Intentar desde Empleado (Estilista)
-            elif hasattr(request.user, 'professional_profile') and request.user.professional_profile.tenant:
-                tenant = request.user.professional_profile.tenant
-                
-        except Exception:
-            pass
-            
-    return {'current_tenant': tenant}
+    return {'current_tenant': getattr(request, 'current_tenant', None)}
@@ -4,7 +4,7 @@ from .models import Tenant, Absence
 class ConfigNegocioForm(forms.ModelForm):
     class Meta:
         model = Tenant
-        fields = ['name', 'subdomain', 'ciudad', 'direccion', 'telefono', 'instagram', 'facebook']
+        fields = ['name', 'subdomain', 'ciudad', 'direccion', 'telefono', 'latitud', 'longitud', 'instagram', 'facebook']
 
 class AbsenceForm(forms.ModelForm):
     class Meta:
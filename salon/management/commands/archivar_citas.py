@@ -0,0 +1,21 @@
+# UBICACIÓN: salon/management/commands/archivar_citas.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from salon.utils.archivo import archivar
+
+class Command(BaseCommand):
+    help = 'Mueve a la tabla de archivo las citas completadas/canceladas antiguas (correr a diario, p. ej. con cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.CITAS_ARCHIVAR_DIAS,
+                            help=f'Antigüedad mínima en días (default CITAS_ARCHIVAR_DIAS={settings.CITAS_ARCHIVAR_DIAS})')
+        parser.add_argument('--lote', type=int, default=1000, help='Citas a mover por transacción (default 1000)')
+
+    def handle(self, *args, **options):
+        corte = timezone.now() - timedelta(days=options['dias'])
+        total = archivar(corte, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"📦 {total} citas anteriores a {corte:%Y-%m-%d} archivadas"))
@@ -0,0 +1,125 @@
+# UBICACIÓN: salon/management/commands/benchmark_disponibilidad.py
+import asyncio
+import statistics
+import time
+from asgiref.sync import ThreadSensitiveContext
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from salon.models import Tenant, Service
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el rendimiento de la disponibilidad sync (workers con un hilo cada uno, como gunicorn '
+        'sync) contra la async (un event loop, como un worker de uvicorn), en el mismo proceso y sobre '
+        'la base configurada. --latencia-ms simula la red hasta la base de datos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Subdominio del negocio')
+        parser.add_argument('--servicio', type=int, help='ID del servicio (default: el primero del negocio)')
+        parser.add_argument('--fecha', type=date.fromisoformat, help='Primer día consultado (default: hoy)')
+        parser.add_argument('--dias', type=int, default=7, help='Días distintos entre los que rotan las peticiones')
+        parser.add_argument('--peticiones', type=int, default=200, help='Peticiones por modo (default 200)')
+        parser.add_argument('--workers', type=int, default=4, help='Workers sync simulados (default 4)')
+        parser.add_argument('--concurrencia', type=int, default=50, help='Peticiones simultáneas en el modo async')
+        parser.add_argument('--latencia-ms', type=float, default=0, help='Espera extra por consulta SQL')
+        parser.add_argument('--sin-cache', action='store_true', help='Vacía la cache de disponibilidad en cada petición')
+
+    def handle(self, *args, **options):
+        tenant = Tenant.objects.filter(subdomain=options['slug']).first()
+        if not tenant:
+            raise CommandError(f"No existe el negocio '{options['slug']}'")
+        servicio = Service.objects.filter(tenant=tenant, **({'id': options['servicio']} if options['servicio'] else {})).first()
+        if not servicio:
+            raise CommandError('El negocio no tiene ese servicio')
+
+        inicio = options['fecha'] or date.today()
+        consultas = [
+            {'service_id': servicio.id, 'fecha': (inicio + timedelta(days=i % options['dias'])).isoformat()}
+            for i in range(options['peticiones'])
+        ]
+        self.sin_cache = options['sin_cache']
+        self.cabeceras = {'X-API-KEY': settings.API_SECRET_KEY}
+        if options['latencia_ms']:
+            self._simular_latencia(options['latencia_ms'] / 1000)
+
+        url_sync = reverse('api_disponibilidad', args=[tenant.subdomain])
+        url_async = reverse('api_disponibilidad_async', args=[tenant.subdomain])
+        # Misma respuesta por los dos caminos
+        respuestas = [Client().get(url, consultas[0], headers=self.cabeceras) for url in (url_sync, url_async)]
+        if any(r.status_code != 200 for r in respuestas) or respuestas[0].json() != respuestas[1].json():
+            raise CommandError('Las respuestas sync y async no coinciden')
+
+        self.stdout.write(f"📊 {options['peticiones']} peticiones, {options['dias']} días, "
+                          f"latencia SQL +{options['latencia_ms']} ms, cache {'no' if self.sin_cache else 'sí'}")
+        caches['disponibilidad'].clear()
+        self._reportar(f"sync  ({options['workers']} workers)", *self._sync(url_sync, consultas, options['workers']))
+        caches['disponibilidad'].clear()
+        self._reportar(f"async (concurrencia {options['concurrencia']})",
+                       *asyncio.run(self._async(url_async, consultas, options['concurrencia'])))
+
+    def _sync(self, url, consultas, workers):
+        def pedir(params):
+            if self.sin_cache:
+                caches['disponibilidad'].clear()
+            t = time.perf_counter()
+            respuesta = Client().get(url, params, headers=self.cabeceras)
+            return time.perf_counter() - t, respuesta.status_code
+
+        t = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            resultados = list(pool.map(pedir, consultas))
+        return time.perf_counter() - t, resultados
+
+    async def _async(self, url, consultas, concurrencia):
+        cliente = AsyncClient()
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def pedir(params):
+            async with semaforo:
+                if self.sin_cache:
+                    caches['disponibilidad'].clear()
+                t = time.perf_counter()
+                # Como ASGIHandler (AsyncClient no lo hace): el código sync de cada petición en su propio hilo
+                async with ThreadSensitiveContext():
+                    respuesta = await cliente.get(url, params, headers=self.cabeceras)
+                return time.perf_counter() - t, respuesta.status_code
+
+        t = time.perf_counter()
+        resultados = await asyncio.gather(*map(pedir, consultas))
+        return time.perf_counter() - t, resultados
+
+    def _reportar(self, modo, total, resultados):
+        tiempos = [tiempo for tiempo, _ in resultados]
+        fallidas = sum(1 for _, estado in resultados if estado != 200)
+        if fallidas:
+            raise CommandError(f'{modo}: {fallidas} peticiones no respondieron 200')
+        p95 = statistics.quantiles(tiempos, n=20)[-1] if len(tiempos) > 1 else tiempos[0]
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {modo}: {len(tiempos) / total:.1f} pet/s · "
+            f"p50 {statistics.median(tiempos) * 1000:.1f} ms · p95 {p95 * 1000:.1f} ms"
+        ))
+
+    @staticmethod
+    def _simular_latencia(segundos):
+        """Cada consulta SQL espera `segundos` más (en todos los hilos, también los que se abran luego)."""
+        def esperar(execute, sql, params, many, context):
+            time.sleep(segundos)
+            return execute(sql, params, many, context)
+
+        def instalar(sender, connection, **kwargs):
+            if esperar not in connection.execute_wrappers:
+                connection.execute_wrappers.append(esperar)
+
+        connection_created.connect(instalar, weak=False)
+        instalar(None, connection)
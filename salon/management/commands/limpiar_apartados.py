@@ -0,0 +1,22 @@
+# UBICACIÓN: salon/management/commands/limpiar_apartados.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from salon.models import SlotHold
+
+class Command(BaseCommand):
+    help = 'Borra por lotes los apartados vencidos (correr cada minuto, p. ej. con cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Apartados a borrar por lote (default 500)')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            # Usa el índice de `expira`; el delete por objeto dispara las señales que
+            # liberan la disponibilidad cacheada y los huecos materializados.
+            ids = list(SlotHold.objects.filter(expira__lte=timezone.now()).values_list('id', flat=True)[:options['lote']])
+            if not ids:
+                break
+            total += SlotHold.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"🧹 {total} apartados vencidos eliminados"))
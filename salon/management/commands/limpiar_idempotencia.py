@@ -0,0 +1,14 @@
+# UBICACIÓN: salon/management/commands/limpiar_idempotencia.py
+from django.core.management.base import BaseCommand
+
+from salon.utils.idempotencia import limpiar_vencidas
+
+class Command(BaseCommand):
+    help = 'Borra por lotes las claves de idempotencia vencidas (correr periódicamente, p. ej. cada hora)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Filas a borrar por lote (default 1000)')
+
+    def handle(self, *args, **options):
+        total = limpiar_vencidas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"🧹 {total} claves de idempotencia vencidas eliminadas"))
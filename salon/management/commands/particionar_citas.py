@@ -0,0 +1,30 @@
+# UBICACIÓN: salon/management/commands/particionar_citas.py
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from salon.utils import particiones
+
+class Command(BaseCommand):
+    help = (
+        'Particiona por mes la tabla de citas (solo PostgreSQL) y crea por adelantado las '
+        'particiones de los próximos meses. La primera vez convierte la tabla; correrlo a diario.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=4, help='Meses a tener creados, contando el actual (default 4)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING("⏭️  El particionado solo aplica a PostgreSQL: nada que hacer"))
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            convertir = not particiones.esta_particionada(cursor)
+            creadas = particiones.asegurar_particiones(cursor, options['meses'])
+
+        if convertir:
+            self.stdout.write(self.style.SUCCESS(f"🧱 Tabla de citas particionada (histórico en {particiones.HISTORICO})"))
+        for nombre in creadas:
+            self.stdout.write(self.style.SUCCESS(f"✅ Partición {nombre} creada"))
+        if not creadas:
+            self.stdout.write("👌 Las particiones ya estaban al día")
@@ -0,0 +1,44 @@
+# UBICACIÓN: salon/management/commands/reconstruir_huecos.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from salon.models import Tenant, FreeSlot
+from salon.utils import huecos
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula en bloque la tabla materializada de huecos libres (FreeSlot). '
+        'Sin slugs, refresca los negocios que ya la tienen activa; conviene correrlo a diario '
+        'para que el horizonte avance.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Subdominios de los negocios a activar/reconstruir')
+        parser.add_argument('--dias', type=int, default=30, help='Días hacia adelante a materializar (default 30)')
+        parser.add_argument('--desactivar', action='store_true', help='Borra los huecos y vuelve al cálculo en vivo')
+
+    def handle(self, *args, **options):
+        if options['slugs']:
+            tenants = Tenant.objects.filter(subdomain__in=options['slugs'])
+        else:
+            tenants = Tenant.objects.filter(huecos_hasta__isnull=False)
+
+        desde = huecos.hoy()
+        hasta = desde + timedelta(days=options['dias'] - 1)
+
+        for tenant in tenants:
+            with transaction.atomic():
+                if options['desactivar']:
+                    FreeSlot.objects.filter(empleado__tenant=tenant).delete()
+                    tenant.huecos_hasta = None
+                    tenant.save(update_fields=['huecos_hasta'])
+                    self.stdout.write(self.style.WARNING(f"⏸️  {tenant.subdomain}: huecos desactivados"))
+                    continue
+
+                total = huecos.reconstruir(tenant.professionals.all(), desde, hasta)
+                FreeSlot.objects.filter(empleado__tenant=tenant, fecha__lt=desde).delete()
+                tenant.huecos_hasta = hasta
+                tenant.save(update_fields=['huecos_hasta'])
+            self.stdout.write(self.style.SUCCESS(f"✅ {tenant.subdomain}: {total} huecos hasta {hasta}"))
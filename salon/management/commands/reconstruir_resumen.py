@@ -0,0 +1,45 @@
+# UBICACIÓN: salon/management/commands/reconstruir_resumen.py
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from salon.models import Tenant, Appointment, AppointmentArchive
+from salon.services import localizar
+from salon.utils import resumen_diario
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula el resumen diario (DailyRollup) desde las citas vivas y archivadas, por tramos '
+        'de fechas (una transacción por tramo). Sin fechas cubre todo el historial.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Subdominios de los negocios (default: todos)')
+        parser.add_argument('--desde', type=date.fromisoformat, help='Primer día (YYYY-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Último día (YYYY-MM-DD)')
+        parser.add_argument('--dias-por-lote', type=int, default=31, help='Días por transacción (default 31)')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.filter(subdomain__in=options['slugs']) if options['slugs'] else None
+        desde, hasta = options['desde'], options['hasta']
+        if not (desde and hasta):
+            extremos = [
+                modelo.objects.filter(**({'tenant__in': tenants} if tenants is not None else {})).aggregate(
+                    primera=Min('fecha_hora_inicio'), ultima=Max('fecha_hora_inicio'))
+                for modelo in (Appointment, AppointmentArchive)
+            ]
+            fechas = [localizar(valor).date() for e in extremos for valor in e.values() if valor]
+            if not fechas:
+                self.stdout.write(self.style.WARNING("⚠️  No hay citas para resumir"))
+                return
+            desde, hasta = desde or min(fechas), hasta or max(fechas)
+
+        filas = 0
+        inicio = desde
+        while inicio <= hasta:
+            fin = min(inicio + timedelta(days=options['dias_por_lote'] - 1), hasta)
+            filas += resumen_diario.reconstruir(inicio, fin, tenants)
+            self.stdout.write(f"   {inicio} → {fin}")
+            inicio = fin + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"✅ Resumen diario reconstruido del {desde} al {hasta}: {filas} filas"))
@@ -1,10 +1,114 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.models import Case, Q, Value, When
+from django.http import Http404, JsonResponse
+from django.utils.functional import SimpleLazyObject
+
 from .models import Tenant
+from .utils import cache_tenants, replicas
+
+
+def negocio_del_usuario(user):
+    """
+    Negocio del usuario autenticado: el suyo si es dueño, si no el del profesional que es.
+    Una sola consulta (con JOIN a profesionales); el objeto trae `es_dueno` anotado.
+    Sin sesión devuelve None sin consultar.
+    """
+    if not user.is_authenticated:
+        return None
+    return Tenant.objects.filter(Q(user=user) | Q(professionals__user=user)).annotate(
+        es_dueno=Case(When(user=user, then=Value(True)), default=Value(False))
+    ).order_by('-es_dueno', 'id').first()
+
 
 class TenantMiddleware:
+    """
+    Resuelve el negocio de las URLs públicas (<slug> o <slug_peluqueria>) una sola vez por
+    petición, desde la cache de salon/utils/cache_tenants.py, y lo deja en `request.tenant`.
+    Un slug inexistente responde 404 antes de llegar a la vista.
+
+    Para el panel deja además `request.current_tenant`: el negocio del usuario logueado
+    (negocio_del_usuario), perezoso y memorizado, compartido por vistas, context processor
+    y plantillas. Solo consulta la primera vez que se usa en la petición.
+
+    Sirve en WSGI y en ASGI sin cambiar de hilo; process_view (que puede consultar la base)
+    Django lo corre en un hilo cuando la petición es asíncrona.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._preparar(request)
         return self.get_response(request)
 
+    async def __acall__(self, request):
+        self._preparar(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def _preparar(request):
+        request.tenant = None
+        request.current_tenant = SimpleLazyObject(lambda: negocio_del_usuario(request.user))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slug = view_kwargs.get('slug_peluqueria') or view_kwargs.get('slug')
+        if not slug:
+            return None
+        request.tenant = cache_tenants.obtener(slug)
+        if request.tenant is None:
+            if 'slug_peluqueria' in view_kwargs:
+                return JsonResponse({'error': 'Negocio no encontrado'}, status=404)
+            raise Http404('Negocio no encontrado')
+        return None
+
 PeluqueriaMiddleware = TenantMiddleware
+
+
+class ReplicaMiddleware:
+    """
+    Marca cada petición para RouterReplica (salon/utils/replicas.py): las de lectura van a la
+    réplica; si la petición escribió, su respuesta fija al cliente a la primaria unos segundos.
+    Va antes de SessionMiddleware para ver también la escritura de la sesión.
+
+    Sirve en WSGI y en ASGI: el estado vive en un ContextVar, que sync_to_async copia a
+    los hilos donde corre el código sync de la petición.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = replicas.iniciar_peticion(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            escribio = replicas.terminar_peticion(token)
+        return self._fijar(response, escribio)
+
+    async def __acall__(self, request):
+        token = replicas.iniciar_peticion(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            escribio = replicas.terminar_peticion(token)
+        return self._fijar(response, escribio)
+
+    @staticmethod
+    def _fijar(response, escribio):
+        if escribio and replicas.alias_replica():
+            response.set_cookie(replicas.REPLICA_COOKIE, '1', max_age=settings.REPLICA_FIJAR_SEGUNDOS,
+                                httponly=True, samesite='Lax')
+        return response
@@ -209,7 +209,7 @@ class Migration(migrations.Migration):
             model_name="appointment",
             name="empleado",
             field=models.ForeignKey(
-                default=django.utils.timezone.now,
+                default=1,
                 on_delete=django.db.models.deletion.CASCADE,
                 to="salon.professional",
                 verbose_name="Profesional",
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0003_alter_appointment_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='fecha_hora_fin',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fecha Fin'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='cliente_telefono',
+            field=models.CharField(max_length=50, verbose_name='Teléfono Cliente'),
+        ),
+        migrations.AlterField(
+            model_name='professional',
+            name='telefono',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='Teléfono'),
+        ),
+        migrations.AlterField(
+            model_name='tenant',
+            name='nequi_number',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='Nequi'),
+        ),
+        migrations.AlterField(
+            model_name='tenant',
+            name='telefono',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='Teléfono'),
+        ),
+        migrations.CreateModel(
+            name='HorarioEmpleado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.IntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')], verbose_name='Día de la semana')),
+                ('hora_inicio', models.TimeField(verbose_name='Inicio Jornada')),
+                ('hora_fin', models.TimeField(verbose_name='Fin Jornada')),
+                ('almuerzo_inicio', models.TimeField(blank=True, null=True, verbose_name='Inicio Almuerzo')),
+                ('almuerzo_fin', models.TimeField(blank=True, null=True, verbose_name='Fin Almuerzo')),
+                ('empleado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='horarios', to='salon.professional', verbose_name='Profesional')),
+            ],
+            options={
+                'verbose_name': 'Horario Laboral',
+                'verbose_name_plural': 'Horarios Laborales',
+                'unique_together': {('empleado', 'dia_semana')},
+            },
+        ),
+    ]
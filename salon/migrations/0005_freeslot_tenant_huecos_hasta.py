@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0004_horarioempleado_appointment_fecha_hora_fin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='huecos_hasta',
+            field=models.DateField(blank=True, help_text="Vacío = se calcula en cada consulta. Lo llena 'manage.py reconstruir_huecos'.", null=True, verbose_name='Huecos materializados hasta'),
+        ),
+        migrations.CreateModel(
+            name='FreeSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('inicio_turno', models.DateTimeField(verbose_name='Inicio Jornada')),
+                ('inicio', models.DateTimeField(verbose_name='Inicio Hueco')),
+                ('fin', models.DateTimeField(verbose_name='Fin Hueco')),
+                ('empleado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='free_slots', to='salon.professional', verbose_name='Profesional')),
+            ],
+            options={
+                'verbose_name': 'Hueco Libre',
+                'verbose_name_plural': 'Huecos Libres',
+                'indexes': [models.Index(fields=['empleado', 'fecha'], name='freeslot_empleado_fecha')],
+            },
+        ),
+    ]
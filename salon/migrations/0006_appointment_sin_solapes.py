@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# Ver salon/utils/booking_lock.py (RESTRICCION_SIN_SOLAPES)
+NOMBRE = 'appointment_sin_solapes'
+
+
+def crear_restriccion(apps, schema_editor):
+    # Solo PostgreSQL. En SQLite el BookingManager usa bloqueo de fila.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(f"""
+        ALTER TABLE salon_appointment ADD CONSTRAINT {NOMBRE}
+        EXCLUDE USING gist (
+            empleado_id WITH =,
+            tstzrange(fecha_hora_inicio, fecha_hora_fin, '[)') WITH &&
+        ) WHERE (estado IN ('pendiente', 'confirmada') AND fecha_hora_fin IS NOT NULL)
+    """)
+
+
+def borrar_restriccion(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'ALTER TABLE salon_appointment DROP CONSTRAINT IF EXISTS {NOMBRE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0005_freeslot_tenant_huecos_hasta'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_restriccion, borrar_restriccion),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0006_appointment_sin_solapes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=255, verbose_name='Idempotency-Key')),
+                ('huella', models.CharField(max_length=64, verbose_name='Hash del cuerpo')),
+                ('estado_http', models.PositiveSmallIntegerField(verbose_name='Código HTTP')),
+                ('cuerpo', models.TextField(verbose_name='Cuerpo de la respuesta')),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('expira', models.DateTimeField(db_index=True, verbose_name='Expira')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to='salon.tenant')),
+            ],
+            options={
+                'verbose_name': 'Clave de Idempotencia',
+                'verbose_name_plural': 'Claves de Idempotencia',
+                'unique_together': {('tenant', 'clave')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:37
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inicio', models.DateTimeField(verbose_name='Inicio')),
+                ('fin', models.DateTimeField(verbose_name='Fin')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('expira', models.DateTimeField(db_index=True, verbose_name='Expira')),
+                ('empleado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='salon.professional', verbose_name='Profesional')),
+                ('servicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='salon.service', verbose_name='Servicio')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='salon.tenant')),
+            ],
+            options={
+                'verbose_name': 'Apartado',
+                'verbose_name_plural': 'Apartados',
+                'indexes': [models.Index(fields=['empleado', 'inicio'], name='slothold_empleado_inicio')],
+            },
+        ),
+    ]
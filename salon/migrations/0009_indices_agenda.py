@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0008_slothold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='absence',
+            index=models.Index(fields=['professional', 'fecha_inicio', 'fecha_fin'], name='ausencia_profesional_inicio'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('estado__in', ['confirmada', 'pendiente'])), fields=['empleado', 'fecha_hora_inicio', 'fecha_hora_fin'], name='cita_activa_empleado_inicio'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['tenant', 'fecha_hora_inicio'], name='cita_tenant_inicio'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0009_indices_agenda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_hora_inicio', models.DateTimeField(verbose_name='Fecha y Hora')),
+                ('fecha_hora_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha Fin')),
+                ('cliente_nombre', models.CharField(max_length=100, verbose_name='Nombre Cliente')),
+                ('cliente_telefono', models.CharField(max_length=50, verbose_name='Teléfono Cliente')),
+                ('cliente_email', models.EmailField(blank=True, max_length=254, null=True, verbose_name='Email Cliente')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('cancelada', 'Cancelada'), ('completada', 'Completada')], max_length=20)),
+                ('precio_total', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Total a Pagar')),
+                ('archivada_en', models.DateTimeField(auto_now_add=True, verbose_name='Archivada el')),
+                ('empleado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='salon.professional', verbose_name='Profesional')),
+                ('servicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='salon.service', verbose_name='Servicio')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='salon.tenant')),
+            ],
+            options={
+                'verbose_name': 'Cita Archivada',
+                'verbose_name_plural': 'Citas Archivadas',
+                'indexes': [models.Index(fields=['tenant', 'fecha_hora_inicio'], name='cita_archivada_tenant_inicio')],
+            },
+        ),
+    ]
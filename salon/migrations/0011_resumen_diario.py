@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0010_appointmentarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('cancelada', 'Cancelada'), ('completada', 'Completada')], max_length=20)),
+                ('citas', models.IntegerField(default=0, verbose_name='Citas')),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Ingresos')),
+                ('minutos', models.IntegerField(default=0, verbose_name='Minutos reservados')),
+                ('empleado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='salon.professional', verbose_name='Profesional')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='salon.tenant')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+                'indexes': [models.Index(fields=['tenant', 'fecha'], name='resumen_tenant_fecha')],
+                'constraints': [models.UniqueConstraint(fields=('empleado', 'fecha', 'estado'), name='resumen_empleado_fecha_estado')],
+            },
+        ),
+    ]
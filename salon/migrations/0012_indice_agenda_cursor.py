@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0011_resumen_diario'),
+    ]
+
+    operations = [
+        # Primero el índice nuevo: las consultas del panel nunca se quedan sin índice
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['tenant', 'fecha_hora_inicio', 'id'], name='cita_tenant_inicio_id'),
+        ),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='cita_tenant_inicio',
+        ),
+    ]
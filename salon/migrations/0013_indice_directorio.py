@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0012_indice_agenda_cursor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['ciudad', 'name'], name='negocio_ciudad_nombre'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0013_indice_directorio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='celda_geo',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=24, null=True, verbose_name='Celda de la grilla'),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='latitud',
+            field=models.FloatField(blank=True, null=True, verbose_name='Latitud'),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='longitud',
+            field=models.FloatField(blank=True, null=True, verbose_name='Longitud'),
+        ),
+    ]
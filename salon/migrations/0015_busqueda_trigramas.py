@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Ver salon/utils/busqueda.py (motor 'trigramas')
+INDICES = [
+    ('busqueda_negocio_nombre_trgm', 'salon_tenant', 'name'),
+    ('busqueda_negocio_ciudad_trgm', 'salon_tenant', 'ciudad'),
+    ('busqueda_servicio_nombre_trgm', 'salon_service', 'nombre'),
+    ('busqueda_profesional_especialidad_trgm', 'salon_professional', 'especialidad'),
+]
+
+
+def crear_indices(apps, schema_editor):
+    # Solo PostgreSQL. En SQLite la búsqueda usa el índice en memoria.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for nombre, tabla, columna in INDICES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} USING gin ({columna} gin_trgm_ops)'
+        )
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, _ in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0014_ubicacion_negocio'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salon', '0015_busqueda_trigramas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='version_catalogo',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Versión del catálogo'),
+        ),
+    ]
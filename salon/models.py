@@ -1,4 +1,8 @@
-from django.db import models
+import uuid
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 
@@ -10,6 +14,12 @@ class Tenant(models.Model):
     direccion = models.CharField(max_length=200, blank=True, null=True, verbose_name="Dirección")
     telefono = models.CharField(max_length=50, blank=True, null=True, verbose_name="Teléfono")
     
+    # Ubicación (búsqueda de negocios cercanos, ver salon/utils/geo.py)
+    latitud = models.FloatField(blank=True, null=True, verbose_name="Latitud")
+    longitud = models.FloatField(blank=True, null=True, verbose_name="Longitud")
+    celda_geo = models.CharField(max_length=24, blank=True, null=True, db_index=True, editable=False,
+                                 verbose_name="Celda de la grilla")  # Se calcula al guardar
+    
     # Redes y Pagos
     instagram = models.URLField(blank=True, null=True, verbose_name="Instagram")
     facebook = models.URLField(blank=True, null=True, verbose_name="Facebook")
@@ -17,9 +27,26 @@ class Tenant(models.Model):
     nequi_number = models.CharField(max_length=50, blank=True, null=True, verbose_name="Nequi")
     bold_api_key = models.CharField(max_length=200, blank=True, null=True, verbose_name="API Key Bold")
 
+    # Disponibilidad precalculada (opcional, para negocios con mucho tráfico de lectura)
+    huecos_hasta = models.DateField(blank=True, null=True, verbose_name="Huecos materializados hasta",
+                                    help_text="Vacío = se calcula en cada consulta. Lo llena 'manage.py reconstruir_huecos'.")
+
+    # Sube con cada cambio de servicios o profesionales: ETag del catálogo (ver salon/utils/catalogo.py)
+    version_catalogo = models.PositiveIntegerField(default=1, editable=False, verbose_name="Versión del catálogo")
+
     class Meta:
         verbose_name = "Negocio"
         verbose_name_plural = "Negocios"
+        # Directorio público: filtro por ciudad, orden alfabético (ver landing_saas_view)
+        indexes = [models.Index(fields=['ciudad', 'name'], name='negocio_ciudad_nombre')]
+
+    def save(self, *args, **kwargs):
+        # version_catalogo solo la cambia catalogo.subir_version (UPDATE ... + 1): una copia
+        # vieja del negocio (cache, formulario) no debe devolverla a un valor anterior
+        if not self._state.adding and not kwargs.get('update_fields') and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name != 'version_catalogo']
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -85,6 +112,14 @@ class Product(models.Model):
     def __str__(self):
         return self.nombre
 
+# Estados de cita que bloquean la agenda (el índice parcial de Appointment depende de esta lista exacta)
+ESTADOS_ACTIVOS = ['confirmada', 'pendiente']
+
+# Tope de duración de una cita (Appointment.save lo hace cumplir). Da una cota inferior a
+# fecha_hora_inicio en las búsquedas de choques: con la tabla particionada por mes
+# (particionar_citas), PostgreSQL solo abre las particiones recientes en vez de todas.
+DURACION_MAXIMA_CITA = timedelta(hours=24)
+
 class Appointment(models.Model):
     ESTADOS = [
         ('pendiente', 'Pendiente'),
@@ -107,16 +142,62 @@ class Appointment(models.Model):
     class Meta:
         verbose_name = "Cita"
         verbose_name_plural = "Citas"
+        indexes = [
+            # Choques y disponibilidad: empleado = X AND estado IN activos AND inicio < fin_rango AND fin > inicio_rango.
+            # Parcial: las canceladas/completadas (la mayoría con el tiempo) no ocupan el índice.
+            models.Index(fields=['empleado', 'fecha_hora_inicio', 'fecha_hora_fin'], name='cita_activa_empleado_inicio',
+                         condition=models.Q(estado__in=ESTADOS_ACTIVOS)),
+            # Panel y agenda del negocio: tenant = X ordenado/filtrado por fecha; el id desempata
+            # el orden de las páginas por cursor (ver salon/utils/agenda.py)
+            models.Index(fields=['tenant', 'fecha_hora_inicio', 'id'], name='cita_tenant_inicio_id'),
+        ]
 
     def __str__(self):
         return f"{self.cliente_nombre} - {self.fecha_hora_inicio}"
     
+    def clean(self):
+        super().clean()
+        self.validar_duracion()
+
+    def validar_duracion(self):
+        """Las búsquedas de choques no ven citas más largas que DURACION_MAXIMA_CITA: se rechazan."""
+        if self.fecha_hora_inicio and self.fecha_hora_fin and \
+                self.fecha_hora_fin - self.fecha_hora_inicio > DURACION_MAXIMA_CITA:
+            horas = int(DURACION_MAXIMA_CITA.total_seconds() // 3600)
+            raise ValidationError({'fecha_hora_fin': f'Una cita no puede durar más de {horas} horas.'})
+
     def save(self, *args, **kwargs):
-        # Calcular fecha fin automáticamente si no existe
-        if not self.fecha_hora_fin and self.servicio:
-             from datetime import timedelta
+        # Calcular fecha fin automáticamente si no existe (quien ya la trae no dispara la consulta del servicio)
+        if not self.fecha_hora_fin and self.servicio_id:
              self.fecha_hora_fin = self.fecha_hora_inicio + timedelta(minutes=self.servicio.duracion)
-        super().save(*args, **kwargs)
+        self.validar_duracion()
+        # La cita y su resumen diario (post_save, ver salon/signals.py) se guardan juntos
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+class AppointmentArchive(models.Model):
+    """Citas completadas/canceladas antiguas, movidas fuera de la tabla caliente (ver 'manage.py archivar_citas')"""
+    # Conserva el id original de la cita
+    id = models.BigIntegerField(primary_key=True)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='archived_appointments')
+    servicio = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='archived_appointments', verbose_name="Servicio")
+    empleado = models.ForeignKey(Professional, on_delete=models.CASCADE, related_name='archived_appointments', verbose_name="Profesional")
+    fecha_hora_inicio = models.DateTimeField(verbose_name="Fecha y Hora")
+    fecha_hora_fin = models.DateTimeField(verbose_name="Fecha Fin", blank=True, null=True)
+    cliente_nombre = models.CharField(max_length=100, verbose_name="Nombre Cliente")
+    cliente_telefono = models.CharField(max_length=50, verbose_name="Teléfono Cliente")
+    cliente_email = models.EmailField(blank=True, null=True, verbose_name="Email Cliente")
+    estado = models.CharField(max_length=20, choices=Appointment.ESTADOS)
+    precio_total = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Total a Pagar")
+    archivada_en = models.DateTimeField(auto_now_add=True, verbose_name="Archivada el")
+
+    class Meta:
+        verbose_name = "Cita Archivada"
+        verbose_name_plural = "Citas Archivadas"
+        indexes = [models.Index(fields=['tenant', 'fecha_hora_inicio'], name='cita_archivada_tenant_inicio')]
+
+    def __str__(self):
+        return f"{self.cliente_nombre} - {self.fecha_hora_inicio} (archivada)"
 
 class ExternalPayment(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
@@ -139,6 +220,75 @@ class Absence(models.Model):
         verbose_name = "Ausencia"
         verbose_name_plural = "Ausencias"
         ordering = ['fecha_inicio']
+        indexes = [models.Index(fields=['professional', 'fecha_inicio', 'fecha_fin'], name='ausencia_profesional_inicio')]
 
     def __str__(self):
         return f"{self.professional.nombre}: {self.motivo}"
+
+class FreeSlot(models.Model):
+    """Hueco libre precalculado de un profesional. Se mantiene en salon/utils/huecos.py"""
+    empleado = models.ForeignKey(Professional, on_delete=models.CASCADE, related_name='free_slots', verbose_name="Profesional")
+    fecha = models.DateField(verbose_name="Fecha")
+    inicio_turno = models.DateTimeField(verbose_name="Inicio Jornada")  # Ancla de la grilla de bloques
+    inicio = models.DateTimeField(verbose_name="Inicio Hueco")
+    fin = models.DateTimeField(verbose_name="Fin Hueco")
+
+    class Meta:
+        verbose_name = "Hueco Libre"
+        verbose_name_plural = "Huecos Libres"
+        indexes = [models.Index(fields=['empleado', 'fecha'], name='freeslot_empleado_fecha')]
+
+    def __str__(self):
+        return f"{self.empleado_id}: {self.inicio} - {self.fin}"
+
+class IdempotencyKey(models.Model):
+    """Respuesta guardada de un POST con cabecera Idempotency-Key (ver salon/utils/idempotencia.py)"""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='idempotency_keys')
+    clave = models.CharField(max_length=255, verbose_name="Idempotency-Key")
+    huella = models.CharField(max_length=64, verbose_name="Hash del cuerpo")
+    estado_http = models.PositiveSmallIntegerField(verbose_name="Código HTTP")
+    cuerpo = models.TextField(verbose_name="Cuerpo de la respuesta")
+    creada = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField(db_index=True, verbose_name="Expira")
+
+    class Meta:
+        verbose_name = "Clave de Idempotencia"
+        verbose_name_plural = "Claves de Idempotencia"
+        unique_together = ('tenant', 'clave')
+
+class SlotHold(models.Model):
+    """Apartado temporal de un horario mientras el cliente confirma la reserva"""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='slot_holds')
+    empleado = models.ForeignKey(Professional, on_delete=models.CASCADE, related_name='slot_holds', verbose_name="Profesional")
+    servicio = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name="Servicio")
+    inicio = models.DateTimeField(verbose_name="Inicio")
+    fin = models.DateTimeField(verbose_name="Fin")
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    expira = models.DateTimeField(db_index=True, verbose_name="Expira")
+
+    class Meta:
+        verbose_name = "Apartado"
+        verbose_name_plural = "Apartados"
+        indexes = [models.Index(fields=['empleado', 'inicio'], name='slothold_empleado_inicio')]
+
+    def __str__(self):
+        return f"{self.empleado_id}: {self.inicio} (hasta {self.expira})"
+
+class DailyRollup(models.Model):
+    """Totales por día, profesional y estado de cita. Se mantiene en salon/utils/resumen_diario.py"""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='daily_rollups')
+    empleado = models.ForeignKey(Professional, on_delete=models.CASCADE, related_name='daily_rollups', verbose_name="Profesional")
+    fecha = models.DateField(verbose_name="Fecha")  # Día en hora Colombia
+    estado = models.CharField(max_length=20, choices=Appointment.ESTADOS)
+    citas = models.IntegerField(default=0, verbose_name="Citas")
+    ingresos = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Ingresos")
+    minutos = models.IntegerField(default=0, verbose_name="Minutos reservados")
+
+    class Meta:
+        verbose_name = "Resumen Diario"
+        verbose_name_plural = "Resúmenes Diarios"
+        constraints = [models.UniqueConstraint(fields=['empleado', 'fecha', 'estado'], name='resumen_empleado_fecha_estado')]
+        indexes = [models.Index(fields=['tenant', 'fecha'], name='resumen_tenant_fecha')]
+
+    def __str__(self):
+        return f"{self.empleado_id} {self.fecha} {self.estado}: {self.citas}"
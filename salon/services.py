@@ -1,85 +1,276 @@
-import pytz
-from datetime import timedelta, datetime
+import asyncio
+import heapq
+from collections import defaultdict
+from datetime import timedelta, datetime, time
+from zoneinfo import ZoneInfo
+from asgiref.sync import sync_to_async
 from django.utils import timezone
-from .models import Appointment as Cita, Absence as Ausencia, HorarioEmpleado
+from django.db.models import IntegerField, Value
+from . import models
+from .models import Appointment as Cita, Absence as Ausencia, HorarioEmpleado, SlotHold as Apartado
+from .utils.ocupacion import MapaOcupacion
 
 # Intervalo de los bloques de tiempo (cada cuánto inicia una cita)
 INTERVALO_MINUTOS = 30
 
+# Estados de cita que bloquean la agenda (misma lista que el índice parcial de Appointment)
+ESTADOS_ACTIVOS = models.ESTADOS_ACTIVOS
+
+# Tope de duración de una cita (ver models.DURACION_MAXIMA_CITA)
+DURACION_MAXIMA_CITA = models.DURACION_MAXIMA_CITA
+
+# Zona Horaria Colombia para evitar desfases. Con zoneinfo (no pytz): make_aware con pytz
+# aplica el offset LMT (-04:56) y corría todos los turnos 4 minutos.
+ZONA_CO = ZoneInfo('America/Bogota')
+
+def localizar(dt):
+    """Datetime en hora Colombia. Los naive se interpretan en hora Colombia (TIME_ZONE del proyecto)."""
+    if timezone.is_naive(dt):
+        return timezone.make_aware(dt, ZONA_CO)
+    return dt.astimezone(ZONA_CO)
+
+def fechas_locales(inicio, fin):
+    """Fechas (hora Colombia) que toca el intervalo [inicio, fin)."""
+    primera = localizar(inicio).date()
+    ultima = max(localizar(fin - timedelta(microseconds=1)).date(), primera)
+    return [primera + timedelta(days=i) for i in range((ultima - primera).days + 1)]
+
+def inicio_dia(fecha_date):
+    """Medianoche (hora Colombia) de esa fecha."""
+    return timezone.make_aware(datetime.combine(fecha_date, time.min), ZONA_CO)
+
+def limites_jornada(horario, fecha_date):
+    """Devuelve (inicio_turno, fin_turno, almuerzo) con zona horaria de Colombia. almuerzo puede ser None."""
+    inicio_turno = timezone.make_aware(datetime.combine(fecha_date, horario.hora_inicio), ZONA_CO)
+    fin_turno = timezone.make_aware(datetime.combine(fecha_date, horario.hora_fin), ZONA_CO)
+
+    almuerzo = None
+    if horario.almuerzo_inicio and horario.almuerzo_fin:
+        almuerzo = (
+            timezone.make_aware(datetime.combine(fecha_date, horario.almuerzo_inicio), ZONA_CO),
+            timezone.make_aware(datetime.combine(fecha_date, horario.almuerzo_fin), ZONA_CO),
+        )
+    return inicio_turno, fin_turno, almuerzo
+
+def calcular_bloques(horario, fecha_date, duracion_servicio, ocupados):
+    """
+    Calcula los bloques libres de una jornada a partir de intervalos ya cargados en memoria.
+    `ocupados` es un iterable de tuplas (inicio, fin) con citas, ausencias, etc.
+    No hace consultas a la base de datos.
+    """
+    mapa = mapa_jornada(horario, fecha_date, ocupados)
+    return [h.strftime("%H:%M") for h in mapa.inicios_libres(duracion_servicio, INTERVALO_MINUTOS)]
+
+def mapa_jornada(horario, fecha_date, ocupados):
+    """MapaOcupacion del turno con el almuerzo y los intervalos `ocupados` ya estampados."""
+    inicio_turno, fin_turno, almuerzo = limites_jornada(horario, fecha_date)
+
+    mapa = MapaOcupacion(inicio_turno, fin_turno)
+    if almuerzo:
+        mapa.marcar(*almuerzo)
+    for inicio, fin in ocupados:
+        mapa.marcar(inicio, fin)
+    return mapa
+
+def intervalo_cita(inicio, fin, duracion_servicio):
+    """Fin real de una cita: usa fecha_hora_fin y, si falta, la duración del servicio."""
+    return inicio, (fin if fin else inicio + timedelta(minutes=duracion_servicio))
+
 def obtener_bloques_disponibles(empleado, fecha_date, duracion_servicio):
     """
     Calcula los bloques de inicio disponibles para un servicio de X duración.
     """
     dia_semana = fecha_date.weekday() # 0=Lunes, 6=Domingo
-    
-    # Zona Horaria Colombia para evitar desfases
-    zona_co = pytz.timezone('America/Bogota')
 
     try:
         horario = HorarioEmpleado.objects.get(empleado=empleado, dia_semana=dia_semana)
     except HorarioEmpleado.DoesNotExist:
         return []
 
-    bloques = []
-    
-    # 1. Crear fechas con Zona Horaria Correcta (Colombia)
-    inicio_turno = timezone.make_aware(datetime.combine(fecha_date, horario.hora_inicio), zona_co)
-    fin_turno = timezone.make_aware(datetime.combine(fecha_date, horario.hora_fin), zona_co)
-    
-    inicio_almuerzo = None
-    fin_almuerzo = None
-    if horario.almuerzo_inicio and horario.almuerzo_fin:
-        inicio_almuerzo = timezone.make_aware(datetime.combine(fecha_date, horario.almuerzo_inicio), zona_co)
-        fin_almuerzo = timezone.make_aware(datetime.combine(fecha_date, horario.almuerzo_fin), zona_co)
+    inicio_turno, fin_turno, _ = limites_jornada(horario, fecha_date)
+
+    # Citas (y apartados) y Ausencias que SOLAPEN con el turno. La duración del servicio viene
+    # en la misma consulta para no hacer un query extra por cada cita sin fecha_hora_fin.
+    citas = citas_y_apartados([empleado.pk], inicio_turno, fin_turno)
 
-    # 2. Obtener Citas y Ausencias que SOLAPEN con el turno
-    citas = Cita.objects.filter(
-        empleado=empleado, 
-        estado__in=['confirmada', 'pendiente'], 
-        fecha_hora_fin__gt=inicio_turno,
-        fecha_hora_inicio__lt=fin_turno
-    )
-    
     ausencias = Ausencia.objects.filter(
-        professional=empleado, 
+        professional=empleado,
         fecha_fin__gt=inicio_turno,
         fecha_inicio__lt=fin_turno
-    )
-
-    hora_actual = inicio_turno
-
-    # 3. Iterar bloques
-    while hora_actual + timedelta(minutes=duracion_servicio) <= fin_turno:
-        fin_bloque = hora_actual + timedelta(minutes=duracion_servicio)
-        ocupado = False
-
-        if inicio_almuerzo and fin_almuerzo:
-            if (hora_actual < fin_almuerzo) and (fin_bloque > inicio_almuerzo):
-                ocupado = True
-
-        if not ocupado:
-            for c in citas:
-                # Se asume que c.fecha_hora_fin existe (ver save() en model Appointment)
-                fin_cita = c.fecha_hora_fin if c.fecha_hora_fin else (c.fecha_hora_inicio + timedelta(minutes=c.servicio.duracion))
-                if (hora_actual < fin_cita) and (fin_bloque > c.fecha_hora_inicio):
-                    ocupado = True; break
-        
-        if not ocupado:
-            for a in ausencias:
-                if (hora_actual < a.fecha_fin) and (fin_bloque > a.fecha_inicio):
-                    ocupado = True; break
-            
-        if not ocupado: 
-            bloques.append(hora_actual.strftime("%H:%M"))
-        
-        hora_actual += timedelta(minutes=INTERVALO_MINUTOS)
-            
-    return bloques
-
-def verificar_conflicto_atomic(empleado, inicio, fin):
-    return Cita.objects.filter(
+    ).values_list('fecha_inicio', 'fecha_fin')
+
+    ocupados = [intervalo_cita(*c) for _, *c in citas]
+    ocupados.extend(ausencias)
+
+    return calcular_bloques(horario, fecha_date, duracion_servicio, ocupados)
+
+def citas_y_apartados(empleado_ids, inicio, fin):
+    """
+    Citas activas y apartados vigentes de esos empleados que se cruzan con [inicio, fin),
+    en UNA consulta (UNION ALL). Filas: (empleado_id, inicio, fin, duracion_servicio).
+    """
+    citas = Cita.objects.filter(
+        empleado_id__in=empleado_ids,
+        estado__in=ESTADOS_ACTIVOS,
+        fecha_hora_fin__gt=inicio,
+        fecha_hora_inicio__lt=fin,
+        fecha_hora_inicio__gt=inicio - DURACION_MAXIMA_CITA
+    ).values_list('empleado_id', 'fecha_hora_inicio', 'fecha_hora_fin', 'servicio__duracion')
+    apartados = Apartado.objects.filter(
+        empleado_id__in=empleado_ids,
+        expira__gt=timezone.now(),
+        fin__gt=inicio,
+        inicio__lt=fin
+    ).values_list('empleado_id', 'inicio', 'fin', Value(0, output_field=IntegerField()))
+    return citas.union(apartados, all=True)
+
+def cargar_agendas(empleados, inicio, fin):
+    """
+    Trae de una sola vez horarios, citas activas (con apartados) y ausencias de varios
+    empleados para la ventana [inicio, fin). Siempre son 3 consultas, sin importar
+    cuántos empleados o días abarque la ventana. `empleados` puede traer objetos o ids.
+
+    Devuelve (horarios, ocupados):
+      - horarios: {(empleado_id, dia_semana): HorarioEmpleado}
+      - ocupados: {empleado_id: [(inicio, fin), ...]}
+    """
+    return _armar_agendas(*(list(consulta) for consulta in _consultas_agenda(empleados, inicio, fin)))
+
+async def acargar_agendas(empleados, inicio, fin):
+    """cargar_agendas con el ORM asíncrono: las 3 consultas se lanzan a la vez (asyncio.gather)."""
+    async def _filas(consulta):
+        return [fila async for fila in consulta]
+    return _armar_agendas(*await asyncio.gather(*map(_filas, _consultas_agenda(empleados, inicio, fin))))
+
+def _consultas_agenda(empleados, inicio, fin):
+    """QuerySets (sin evaluar) de horarios, citas con apartados y ausencias de cargar_agendas."""
+    ids = [getattr(e, 'id', e) for e in empleados]
+    ausencias = Ausencia.objects.filter(
+        professional_id__in=ids,
+        fecha_fin__gt=inicio,
+        fecha_inicio__lt=fin
+    ).values_list('professional_id', 'fecha_inicio', 'fecha_fin')
+    return HorarioEmpleado.objects.filter(empleado_id__in=ids), citas_y_apartados(ids, inicio, fin), ausencias
+
+def _armar_agendas(filas_horarios, filas_citas, filas_ausencias):
+    horarios = {(h.empleado_id, h.dia_semana): h for h in filas_horarios}
+
+    ocupados = defaultdict(list)
+    for empleado_id, *cita in filas_citas:
+        ocupados[empleado_id].append(intervalo_cita(*cita))
+    for empleado_id, *ausencia in filas_ausencias:
+        ocupados[empleado_id].append(tuple(ausencia))
+
+    return horarios, ocupados
+
+def obtener_disponibilidad_rango(empleados, desde, hasta, duracion_servicio):
+    """
+    Bloques disponibles de varios empleados para cada día entre `desde` y `hasta` (inclusive).
+    Devuelve {fecha: {empleado: [horas]}} con un número fijo de consultas.
+    """
+    empleados = list(empleados)
+    horarios, ocupados = cargar_agendas(empleados, inicio_dia(desde), inicio_dia(hasta + timedelta(days=1)))
+    bloques = [_bloques_empleado(emp, horarios, ocupados[emp.id], desde, hasta, duracion_servicio) for emp in empleados]
+    return _por_fecha(empleados, bloques, desde, hasta)
+
+async def aobtener_disponibilidad_rango(empleados, desde, hasta, duracion_servicio):
+    """
+    obtener_disponibilidad_rango para vistas asíncronas: carga las agendas con acargar_agendas y
+    calcula cada profesional en un hilo aparte, así el cálculo no bloquea el event loop.
+    """
+    empleados = list(empleados)
+    horarios, ocupados = await acargar_agendas(empleados, inicio_dia(desde), inicio_dia(hasta + timedelta(days=1)))
+    calcular = sync_to_async(_bloques_empleado, thread_sensitive=False)  # Sin base de datos: cualquier hilo sirve
+    bloques = await asyncio.gather(*(
+        calcular(emp, horarios, ocupados[emp.id], desde, hasta, duracion_servicio) for emp in empleados
+    ))
+    return _por_fecha(empleados, bloques, desde, hasta)
+
+def _bloques_empleado(emp, horarios, ocupados, desde, hasta, duracion_servicio):
+    """[horas de cada día entre desde y hasta] de un profesional, solo con datos ya cargados."""
+    dias = []
+    fecha = desde
+    while fecha <= hasta:
+        horario = horarios.get((emp.id, fecha.weekday()))
+        dias.append(calcular_bloques(horario, fecha, duracion_servicio, ocupados) if horario else [])
+        fecha += timedelta(days=1)
+    return dias
+
+def _por_fecha(empleados, bloques, desde, hasta):
+    """{fecha: {empleado: [horas]}} a partir de la lista por empleado de _bloques_empleado."""
+    fechas = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+    return {fecha: {emp: dias[i] for emp, dias in zip(empleados, bloques)} for i, fecha in enumerate(fechas)}
+
+def obtener_bloques_disponibles_lote(empleados, fecha_date, duracion_servicio):
+    """
+    Versión por lotes de obtener_bloques_disponibles: {empleado: [horas]} para una fecha.
+    Hace 3 consultas en total, sin importar cuántos empleados se pidan.
+    """
+    return obtener_disponibilidad_rango(empleados, fecha_date, fecha_date, duracion_servicio)[fecha_date]
+
+def buscar_proximos_turnos(empleados, duracion_servicio, k=5, desde=None, horizonte_dias=30, dias_por_lote=7):
+    """
+    Los `k` próximos inicios libres con cualquiera de los empleados, a partir de `desde`
+    (por defecto ahora). Trae las agendas de a `dias_por_lote` días (3 consultas por lote)
+    y corta apenas junta `k` resultados: nunca hace más de 3 * ceil(horizonte_dias / dias_por_lote)
+    consultas, por muy llena que esté la agenda.
+    Devuelve [(inicio, empleado), ...] ordenado por hora.
+    """
+    empleados = list(empleados)
+    if not empleados or k <= 0:
+        return []
+
+    desde = localizar(desde or timezone.now())
+    ultima = desde.date() + timedelta(days=horizonte_dias - 1)
+
+    resultados = []
+    lote_inicio = desde.date()
+    while lote_inicio <= ultima and len(resultados) < k:
+        lote_fin = min(lote_inicio + timedelta(days=dias_por_lote - 1), ultima)
+        horarios, ocupados = cargar_agendas(empleados, inicio_dia(lote_inicio), inicio_dia(lote_fin + timedelta(days=1)))
+
+        # Cola de prioridad sobre generadores perezosos: cada día de cada empleado
+        # se calcula solo si la búsqueda llega hasta él.
+        cola = heapq.merge(*(
+            _turnos_libres(orden, emp, lote_inicio, lote_fin, horarios, ocupados[emp.id], duracion_servicio, desde)
+            for orden, emp in enumerate(empleados)
+        ))
+        for inicio, _, emp in cola:
+            resultados.append((inicio, emp))
+            if len(resultados) == k:
+                break
+        lote_inicio = lote_fin + timedelta(days=1)
+    return resultados
+
+def _turnos_libres(orden, empleado, desde_fecha, hasta_fecha, horarios, ocupados, duracion_servicio, desde):
+    """Genera (inicio, orden, empleado) en orden cronológico para los días del lote."""
+    fecha = desde_fecha
+    while fecha <= hasta_fecha:
+        horario = horarios.get((empleado.id, fecha.weekday()))
+        if horario:
+            for inicio in mapa_jornada(horario, fecha, ocupados).inicios_libres(duracion_servicio, INTERVALO_MINUTOS):
+                if inicio >= desde:
+                    yield inicio, orden, empleado
+        fecha += timedelta(days=1)
+
+def verificar_conflicto_atomic(empleado, inicio, fin, excluir_apartado=None):
+    """
+    True si [inicio, fin) choca con una cita activa o con un apartado vigente (salvo `excluir_apartado`).
+    Una sola consulta (UNION ALL ... LIMIT 1).
+    """
+    citas = Cita.objects.filter(
         empleado=empleado, 
-        estado__in=['pendiente', 'confirmada'],
+        estado__in=ESTADOS_ACTIVOS,
         fecha_hora_inicio__lt=fin, 
-        fecha_hora_fin__gt=inicio
-    ).exists()
+        fecha_hora_fin__gt=inicio,
+        fecha_hora_inicio__gt=inicio - DURACION_MAXIMA_CITA
+    ).values('pk')
+    apartados = Apartado.objects.filter(
+        empleado=empleado,
+        expira__gt=timezone.now(),
+        inicio__lt=fin,
+        fin__gt=inicio
+    ).values('pk')
+    if excluir_apartado:
+        apartados = apartados.exclude(pk=excluir_apartado)
+    return citas.union(apartados, all=True).exists()
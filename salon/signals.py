@@ -0,0 +1,180 @@
+# UBICACIÓN: salon/signals.py
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from .models import Tenant, Appointment, Absence, HorarioEmpleado, SlotHold, Service, Professional
+from .services import ESTADOS_ACTIVOS, fechas_locales, localizar
+from .utils import busqueda, cache_disponibilidad, catalogo, cache_tenants, directorio, geo, huecos, resumen_diario
+
+# Campos que definen en qué agenda "cae" cada modelo: (empleado, inicio, fin[, estado])
+CAMPOS_AGENDA = {
+    Appointment: ('empleado_id', 'fecha_hora_inicio', 'fecha_hora_fin', 'estado'),
+    Absence: ('professional_id', 'fecha_inicio', 'fecha_fin'),
+    SlotHold: ('empleado_id', 'inicio', 'fin'),
+}
+
+
+def _agenda(instance):
+    return tuple(getattr(instance, campo) for campo in CAMPOS_AGENDA[type(instance)])
+
+
+def _ocupa(valores):
+    """(empleado_id, inicio, fin) en hora Colombia si el registro bloquea la agenda, si no None."""
+    empleado_id, inicio, fin, *estado = valores
+    if not (empleado_id and inicio and fin) or (estado and estado[0] not in ESTADOS_ACTIVOS):
+        return None
+    return empleado_id, localizar(inicio), localizar(fin)
+
+
+def _tenant_de(instance):
+    """Negocio de una ausencia (no guarda tenant_id): una consulta a través del profesional."""
+    return Tenant.objects.only('huecos_hasta').filter(professionals=instance.professional_id).first()
+
+
+def _huecos_hasta(instance):
+    """Tenant.huecos_hasta del negocio del registro, sin consulta si el negocio ya venía cargado."""
+    if isinstance(instance, Absence):
+        tenant = _tenant_de(instance)
+        return tenant.huecos_hasta if tenant else None
+    if type(instance).tenant.is_cached(instance):
+        return instance.tenant.huecos_hasta
+    return Tenant.objects.filter(pk=instance.tenant_id).values_list('huecos_hasta', flat=True).first()
+
+
+def _borrado_en_cascada(origen):
+    """True si el borrado viene de un negocio o un profesional: sus huecos (FreeSlot) se borran con él."""
+    return getattr(origen, 'model', type(origen)) in (Tenant, Professional)
+
+
+def _invalidar_agenda(empleado_id, inicio, fin, *_):
+    if empleado_id and inicio:
+        cache_disponibilidad.invalidar_dias(empleado_id, fechas_locales(inicio, fin or inicio))
+
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_save, sender=Absence)
+@receiver(pre_save, sender=SlotHold)
+def recordar_agenda_anterior(sender, instance, **kwargs):
+    """Guarda dónde estaba la cita/ausencia/apartado antes de editarla, para invalidar también ese día."""
+    instance._agenda_anterior = instance._resumen_anterior = None
+    if not instance._state.adding and instance.pk:
+        # De las citas se leen además (en la misma consulta) los campos del resumen diario
+        campos = resumen_diario.CAMPOS if sender is Appointment else CAMPOS_AGENDA[sender]
+        fila = sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+        if fila:
+            instance._agenda_anterior = fila[:len(CAMPOS_AGENDA[sender])]
+            instance._resumen_anterior = fila
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=Absence)
+@receiver(post_save, sender=SlotHold)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Absence)
+@receiver(post_delete, sender=SlotHold)
+def invalidar_disponibilidad(sender, instance, **kwargs):
+    anterior = getattr(instance, '_agenda_anterior', None)
+    actual = _agenda(instance)
+    if anterior and anterior[:3] != actual[:3]:
+        _invalidar_agenda(*anterior)
+    _invalidar_agenda(*actual)
+
+    # Tabla materializada de huecos: liberar lo que ocupaba antes, ocupar lo nuevo
+    if kwargs.get('signal') is post_delete:
+        if _borrado_en_cascada(kwargs.get('origin')):
+            return
+        ocupaba, ocupa = _ocupa(actual), None
+    else:
+        ocupaba, ocupa = (_ocupa(anterior) if anterior else None), _ocupa(actual)
+    if ocupaba != ocupa:
+        huecos.actualizar(_huecos_hasta(instance), ocupaba, ocupa)
+
+
+def _valores_resumen(instance):
+    return tuple(getattr(instance, campo) for campo in resumen_diario.CAMPOS)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def actualizar_resumen_diario(sender, instance, **kwargs):
+    """Mueve la cita en DailyRollup: resta lo que aportaba antes (o al borrarse) y suma lo actual."""
+    if kwargs.get('signal') is post_delete:
+        resumen_diario.aplicar(quitar=[_valores_resumen(instance)])
+        return
+    anterior = getattr(instance, '_resumen_anterior', None)
+    resumen_diario.aplicar(quitar=[anterior] if anterior else [], sumar=[_valores_resumen(instance)])
+
+
+def registrar_creadas_en_lote(objetos):
+    """bulk_create no dispara post_save: aplica a mano la invalidación de cada registro nuevo."""
+    for instance in objetos:
+        invalidar_disponibilidad(type(instance), instance, signal=post_save, created=True)
+    # Resumen diario de todo el lote en una sentencia
+    resumen_diario.aplicar(sumar=[_valores_resumen(o) for o in objetos if isinstance(o, Appointment)])
+
+
+@receiver(pre_save, sender=Tenant)
+def calcular_celda_geo(sender, instance, **kwargs):
+    instance.celda_geo = geo.celda(instance.latitud, instance.longitud)
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidar_cache_tenants(sender, instance, **kwargs):
+    # Ya y al confirmar: otra petición pudo recargar el valor viejo antes del COMMIT
+    cache_tenants.invalidar()
+    transaction.on_commit(cache_tenants.invalidar)
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidar_directorio(sender, instance, **kwargs):
+    # Tarjeta del negocio, ciudades y páginas cacheadas de la landing (ver utils/directorio.py)
+    directorio.invalidar(instance.id)
+    transaction.on_commit(lambda: directorio.invalidar(instance.id))
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Professional)
+@receiver(post_delete, sender=Tenant)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Professional)
+def reindexar_busqueda(sender, instance, **kwargs):
+    # Solo ese negocio y al confirmar, para leer los datos ya guardados (ver utils/busqueda.py)
+    tenant_id = instance.id if sender is Tenant else instance.tenant_id
+    transaction.on_commit(lambda: busqueda.reindexar(tenant_id))
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Professional)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Professional)
+def subir_version_catalogo(sender, instance, **kwargs):
+    # En la misma transacción que el cambio: el ETag nuevo nunca sale con datos viejos
+    catalogo.subir_version(instance.tenant_id)
+
+
+@receiver(pre_save, sender=HorarioEmpleado)
+def recordar_empleado_horario(sender, instance, **kwargs):
+    instance._empleado_anterior = None
+    if not instance._state.adding and instance.pk:
+        instance._empleado_anterior = sender.objects.filter(pk=instance.pk).values_list(
+            'empleado_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=HorarioEmpleado)
+@receiver(post_delete, sender=HorarioEmpleado)
+def invalidar_horario(sender, instance, **kwargs):
+    anterior = getattr(instance, '_empleado_anterior', None)
+    empleados = {instance.empleado_id, anterior} - {None}
+    for empleado_id in empleados:
+        cache_disponibilidad.invalidar_empleado(empleado_id)
+
+    if _borrado_en_cascada(kwargs.get('origin')):
+        return
+    tenant = Tenant.objects.only('huecos_hasta').filter(professionals__in=empleados).first()
+    if tenant and tenant.huecos_hasta:
+        huecos.reconstruir(tenant.professionals.filter(id__in=empleados), huecos.hoy(), tenant.huecos_hasta)
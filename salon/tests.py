@@ -1,3 +1,1898 @@
-from django.test import TestCase
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+from io import StringIO
+from time import perf_counter
+from datetime import date, datetime, time, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Tenant, Professional, Service, Appointment, Absence, HorarioEmpleado, FreeSlot, IdempotencyKey, SlotHold,
+    AppointmentArchive, DailyRollup,
+)
+from .utils import archivo, busqueda, cache_disponibilidad, cache_tenants, catalogo, directorio, geo, huecos, particiones, replicas, resumen_diario
+from .services import (
+    ZONA_CO, INTERVALO_MINUTOS, obtener_bloques_disponibles, obtener_bloques_disponibles_lote,
+    aobtener_disponibilidad_rango, obtener_disponibilidad_rango, buscar_proximos_turnos, verificar_conflicto_atomic,
+)
+from .middleware import ReplicaMiddleware, TenantMiddleware
+from .utils import booking_lock
+from .utils.booking_lock import BookingManager
+from .utils.idempotencia import limpiar_vencidas
+
+
+def bloques_referencia(empleado, fecha_date, duracion_servicio):
+    """Implementación original (bucle por bloque) usada como oráculo de equivalencia."""
+    try:
+        horario = HorarioEmpleado.objects.get(empleado=empleado, dia_semana=fecha_date.weekday())
+    except HorarioEmpleado.DoesNotExist:
+        return []
+
+    inicio_turno = timezone.make_aware(datetime.combine(fecha_date, horario.hora_inicio), ZONA_CO)
+    fin_turno = timezone.make_aware(datetime.combine(fecha_date, horario.hora_fin), ZONA_CO)
+    inicio_almuerzo = fin_almuerzo = None
+    if horario.almuerzo_inicio and horario.almuerzo_fin:
+        inicio_almuerzo = timezone.make_aware(datetime.combine(fecha_date, horario.almuerzo_inicio), ZONA_CO)
+        fin_almuerzo = timezone.make_aware(datetime.combine(fecha_date, horario.almuerzo_fin), ZONA_CO)
+
+    citas = Appointment.objects.filter(
+        empleado=empleado, estado__in=['confirmada', 'pendiente'],
+        fecha_hora_fin__gt=inicio_turno, fecha_hora_inicio__lt=fin_turno,
+    )
+    ausencias = Absence.objects.filter(
+        professional=empleado, fecha_fin__gt=inicio_turno, fecha_inicio__lt=fin_turno,
+    )
+
+    bloques = []
+    hora_actual = inicio_turno
+    while hora_actual + timedelta(minutes=duracion_servicio) <= fin_turno:
+        fin_bloque = hora_actual + timedelta(minutes=duracion_servicio)
+        ocupado = bool(inicio_almuerzo and hora_actual < fin_almuerzo and fin_bloque > inicio_almuerzo)
+        ocupado = ocupado or any(hora_actual < c.fecha_hora_fin and fin_bloque > c.fecha_hora_inicio for c in citas)
+        ocupado = ocupado or any(hora_actual < a.fecha_fin and fin_bloque > a.fecha_inicio for a in ausencias)
+        if not ocupado:
+            bloques.append(hora_actual.strftime("%H:%M"))
+        hora_actual += timedelta(minutes=INTERVALO_MINUTOS)
+    return bloques
+
+
+class DatosSalonMixin:
+    """Crea un negocio mínimo con un servicio y helpers para poblar agendas."""
+
+    FECHA = date(2026, 3, 2)  # Lunes
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='dueno', password='x')
+        cls.tenant = Tenant.objects.create(user=cls.user, name='Salón Test', subdomain='salon-test')
+        cls.servicio = Service.objects.create(tenant=cls.tenant, nombre='Corte', precio=20000, duracion=45)
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['disponibilidad'].clear()
+        cache_disponibilidad.metricas.reiniciar()
+        # Negocio ya en la cache de TenantMiddleware: los conteos de consultas no dependen del orden de los tests
+        cache_tenants.invalidar()
+        cache_tenants.obtener(self.tenant.subdomain)
+
+    @classmethod
+    def crear_profesional(cls, nombre='Ana', dias=range(7), **horario):
+        pro = Professional.objects.create(tenant=cls.tenant, nombre=nombre)
+        valores = {'hora_inicio': time(8, 0), 'hora_fin': time(18, 0),
+                   'almuerzo_inicio': time(12, 0), 'almuerzo_fin': time(13, 0)}
+        valores.update(horario)
+        for dia in dias:
+            HorarioEmpleado.objects.create(empleado=pro, dia_semana=dia, **valores)
+        return pro
+
+    @staticmethod
+    def en_bogota(fecha_date, hora, minuto=0):
+        return timezone.make_aware(datetime.combine(fecha_date, time(hora, minuto)), ZONA_CO)
+
+    def crear_cita(self, pro, inicio, minutos, estado='confirmada'):
+        return Appointment.objects.create(
+            tenant=self.tenant, servicio=self.servicio, empleado=pro,
+            fecha_hora_inicio=inicio, fecha_hora_fin=inicio + timedelta(minutes=minutos),
+            cliente_nombre='Cliente', cliente_telefono='300', precio_total=20000, estado=estado,
+        )
+
+
+class BloquesDisponiblesTests(DatosSalonMixin, TestCase):
+
+    def test_jornada_libre_respeta_almuerzo(self):
+        pro = self.crear_profesional()
+        bloques = obtener_bloques_disponibles(pro, self.FECHA, 60)
+        self.assertEqual(bloques[0], '08:00')
+        self.assertIn('11:00', bloques)
+        self.assertNotIn('11:30', bloques)
+        self.assertNotIn('12:30', bloques)
+        self.assertEqual(bloques[-1], '17:00')
+
+    def test_sin_horario_no_hay_bloques(self):
+        pro = self.crear_profesional(dias=[1])
+        self.assertEqual(obtener_bloques_disponibles(pro, self.FECHA, 30), [])
+
+    def test_citas_canceladas_no_ocupan(self):
+        pro = self.crear_profesional()
+        self.crear_cita(pro, self.en_bogota(self.FECHA, 9), 60, estado='cancelada')
+        self.assertIn('09:00', obtener_bloques_disponibles(pro, self.FECHA, 30))
+
+    def test_intervalos_con_segundos_se_redondean_hacia_afuera(self):
+        pro = self.crear_profesional()
+        inicio = self.en_bogota(self.FECHA, 9, 29) + timedelta(seconds=30)
+        self.crear_cita(pro, inicio, 1)
+        bloques = obtener_bloques_disponibles(pro, self.FECHA, 30)
+        self.assertNotIn('09:00', bloques)
+        self.assertNotIn('09:30', bloques)
+        self.assertIn('10:00', bloques)
+
+    def test_equivalencia_con_implementacion_original(self):
+        rnd = random.Random(20260302)
+        profesionales = [
+            self.crear_profesional(nombre=f'Pro {i}', hora_inicio=time(7 + i % 3, 15 * (i % 2)))
+            for i in range(4)
+        ]
+        for pro in profesionales:
+            for dia in range(5):
+                fecha = self.FECHA + timedelta(days=dia)
+                for _ in range(rnd.randint(0, 8)):
+                    inicio = self.en_bogota(fecha, rnd.randint(6, 18), rnd.choice([0, 10, 15, 30, 45, 50]))
+                    self.crear_cita(pro, inicio, rnd.choice([15, 20, 30, 45, 60, 90]),
+                                    estado=rnd.choice(['confirmada', 'pendiente', 'cancelada']))
+                for _ in range(rnd.randint(0, 2)):
+                    inicio = self.en_bogota(fecha, rnd.randint(6, 18), rnd.choice([0, 5, 30]))
+                    Absence.objects.create(professional=pro, fecha_inicio=inicio,
+                                           fecha_fin=inicio + timedelta(minutes=rnd.randint(10, 240)))
+
+        for pro in profesionales:
+            for dia in range(5):
+                fecha = self.FECHA + timedelta(days=dia)
+                for duracion in (15, 30, 45, 60, 95, 180):
+                    with self.subTest(pro=pro.nombre, fecha=fecha, duracion=duracion):
+                        self.assertEqual(
+                            obtener_bloques_disponibles(pro, fecha, duracion),
+                            bloques_referencia(pro, fecha, duracion),
+                        )
+
+
+class DisponibilidadRangoTests(DatosSalonMixin, TestCase):
+
+    def consultar(self, **params):
+        url = reverse('api_disponibilidad', args=[self.tenant.subdomain])
+        params.setdefault('service_id', self.servicio.id)
+        return self.client.get(url, params, HTTP_X_API_KEY=settings.API_SECRET_KEY)
+
+    def test_rango_coincide_con_consulta_por_dia(self):
+        ana = self.crear_profesional('Ana')
+        luis = self.crear_profesional('Luis', dias=range(5))
+        self.crear_cita(ana, self.en_bogota(self.FECHA, 9), 90)
+        self.crear_cita(luis, self.en_bogota(self.FECHA + timedelta(days=1), 17), 60)
+        Absence.objects.create(professional=ana, fecha_inicio=self.en_bogota(self.FECHA + timedelta(days=2), 0),
+                               fecha_fin=self.en_bogota(self.FECHA + timedelta(days=3), 0))
+
+        hasta = self.FECHA + timedelta(days=6)
+        data = self.consultar(desde=self.FECHA.isoformat(), hasta=hasta.isoformat()).json()
+
+        self.assertEqual(len(data['dias']), 7)
+        for dia in range(7):
+            fecha = self.FECHA + timedelta(days=dia)
+            esperado = {
+                pro.nombre: [{'hora_inicio': h} for h in obtener_bloques_disponibles(pro, fecha, 45)]
+                for pro in (ana, luis)
+            }
+            esperado = {nombre: horas for nombre, horas in esperado.items() if horas}
+            self.assertEqual(data['dias'][fecha.isoformat()], esperado)
+            self.assertEqual(data['libres_por_dia'][fecha.isoformat()], sum(map(len, esperado.values())))
+
+    def test_rango_usa_consultas_fijas(self):
+        desde, hasta = self.FECHA.isoformat(), (self.FECHA + timedelta(days=29)).isoformat()
+        self.crear_profesional('Ana')
+        with self.assertNumQueries(6) as ctx:  # + generaciones de la cache compartida
+            self.consultar(desde=desde, hasta=hasta)
+        for i in range(5):
+            self.crear_profesional(f'Pro {i}')
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            self.consultar(desde=desde, hasta=hasta)
+
+    def test_rango_demasiado_largo(self):
+        respuesta = self.consultar(desde='2026-03-01', hasta='2026-05-01')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class DisponibilidadAsyncTests(DatosSalonMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ana = self.crear_profesional('Ana')
+        self.luis = self.crear_profesional('Luis', dias=range(5))
+        self.crear_cita(self.ana, self.en_bogota(self.FECHA, 9), 90)
+        self.crear_cita(self.luis, self.en_bogota(self.FECHA + timedelta(days=1), 17), 60)
+        Absence.objects.create(professional=self.ana, fecha_inicio=self.en_bogota(self.FECHA + timedelta(days=2), 0),
+                               fecha_fin=self.en_bogota(self.FECHA + timedelta(days=3), 0))
+
+    def consultar(self, nombre, **params):
+        params.setdefault('service_id', self.servicio.id)
+        return self.client.get(reverse(nombre, args=[self.tenant.subdomain]), params,
+                               HTTP_X_API_KEY=settings.API_SECRET_KEY)
+
+    def test_misma_respuesta_que_la_version_sync(self):
+        hasta = (self.FECHA + timedelta(days=6)).isoformat()
+        for params in [{'fecha': self.FECHA.isoformat()}, {'desde': self.FECHA.isoformat(), 'hasta': hasta},
+                       {'fecha': self.FECHA.isoformat(), 'empleado_id': self.ana.id},
+                       {'fecha': 'ayer'}, {'desde': '2026-03-01', 'hasta': '2026-05-01'}, {}]:
+            with self.subTest(**params):
+                caches['disponibilidad'].clear()
+                sync = self.consultar('api_disponibilidad', **params)
+                caches['disponibilidad'].clear()
+                asincrona = self.consultar('api_disponibilidad_async', **params)
+                self.assertEqual(asincrona.status_code, sync.status_code)
+                self.assertEqual(asincrona.json(), sync.json())
+
+    def test_mismas_consultas_y_cache_compartida(self):
+        params = {'desde': self.FECHA.isoformat(), 'hasta': (self.FECHA + timedelta(days=6)).isoformat()}
+        with self.assertNumQueries(6):  # servicio, profesionales, generaciones y las 3 de cargar_agendas
+            self.consultar('api_disponibilidad_async', **params)
+        with self.assertNumQueries(3):  # Lo calculado quedó en la misma cache que usa la versión sync
+            self.consultar('api_disponibilidad', **params)
+
+    def test_calculo_por_profesional_igual_al_sync(self):
+        desde, hasta = self.FECHA, self.FECHA + timedelta(days=13)
+        for duracion in (30, 45, 95):
+            with self.subTest(duracion=duracion):
+                self.assertEqual(
+                    async_to_sync(aobtener_disponibilidad_rango)([self.ana, self.luis], desde, hasta, duracion),
+                    obtener_disponibilidad_rango([self.ana, self.luis], desde, hasta, duracion),
+                )
+
+    def test_errores(self):
+        for nombre in ('api_disponibilidad', 'api_disponibilidad_async'):
+            respuesta = self.consultar(nombre, fecha='2026-03-02', service_id=999)
+            self.assertEqual(respuesta.status_code, 404)
+            self.assertEqual(respuesta.json(), {'error': 'Servicio no encontrado'})
+        with self.assertLogs('salon.api', 'ERROR'), \
+                mock.patch('salon.api._adisponibilidad', side_effect=RuntimeError('caída')):
+            self.assertEqual(self.consultar('api_disponibilidad_async', fecha='2026-03-02').status_code, 500)
+        url = reverse('api_disponibilidad_async', args=[self.tenant.subdomain])
+        self.assertEqual(self.client.get(url, {'fecha': '2026-03-02'}).status_code, 403)
+
+    async def test_cliente_asincrono(self):
+        respuesta = await self.async_client.get(
+            reverse('api_disponibilidad_async', args=[self.tenant.subdomain]),
+            {'fecha': self.FECHA.isoformat(), 'service_id': self.servicio.id},
+            headers={'X-API-KEY': settings.API_SECRET_KEY},
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(set(respuesta.json()), {'Ana', 'Luis'})
+
+
+class DisponibilidadLoteTests(DatosSalonMixin, TestCase):
+
+    def test_lote_coincide_con_calculo_individual(self):
+        profesionales = [self.crear_profesional(f'Pro {i}', hora_fin=time(14 + i, 0)) for i in range(3)]
+        self.crear_cita(profesionales[0], self.en_bogota(self.FECHA, 10), 30)
+        self.crear_cita(profesionales[2], self.en_bogota(self.FECHA, 8, 15), 120, estado='pendiente')
+        Absence.objects.create(professional=profesionales[1], fecha_inicio=self.en_bogota(self.FECHA, 14),
+                               fecha_fin=self.en_bogota(self.FECHA, 15))
+
+        lote = obtener_bloques_disponibles_lote(profesionales, self.FECHA, 30)
+        for pro in profesionales:
+            self.assertEqual(lote[pro], obtener_bloques_disponibles(pro, self.FECHA, 30))
+
+    def test_consultas_constantes_al_crecer_el_equipo(self):
+        url = reverse('api_disponibilidad', args=[self.tenant.subdomain])
+        params = {'fecha': self.FECHA.isoformat(), 'service_id': self.servicio.id, 'empleado_id': 'todos'}
+
+        conteos = []
+        for _ in range(3):
+            for i in range(5):
+                pro = self.crear_profesional(f'Pro {i}')
+                self.crear_cita(pro, self.en_bogota(self.FECHA, 9 + i), 30)
+            with CaptureQueriesContext(connection) as ctx:
+                respuesta = self.client.get(url, params, HTTP_X_API_KEY=settings.API_SECRET_KEY)
+            self.assertEqual(respuesta.status_code, 200)
+            conteos.append(len(ctx.captured_queries))
+
+        self.assertEqual(conteos, [6, 6, 6])
+
+
+class CacheDisponibilidadTests(DatosSalonMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ana = self.crear_profesional('Ana')
+        self.luis = self.crear_profesional('Luis')
+        self.manana = self.FECHA + timedelta(days=1)
+
+    def disponibilidad(self, pro, fecha, duracion=30):
+        return cache_disponibilidad.disponibilidad_cacheada([pro], fecha, fecha, duracion)[fecha][pro]
+
+    def test_segunda_lectura_no_consulta_la_base(self):
+        self.disponibilidad(self.ana, self.FECHA)
+        with self.assertNumQueries(1):  # Solo las generaciones (cache compartida en la base)
+            self.disponibilidad(self.ana, self.FECHA)
+        metricas = cache_disponibilidad.metricas.como_dict()
+        self.assertEqual((metricas['aciertos'], metricas['fallos']), (1, 1))
+
+    def test_cita_nueva_invalida_el_dia(self):
+        self.assertIn('09:00', self.disponibilidad(self.ana, self.FECHA))
+        self.assertIn('09:00', self.disponibilidad(self.ana, self.manana))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_cita(self.ana, self.en_bogota(self.FECHA, 9), 30)
+        self.assertNotIn('09:00', self.disponibilidad(self.ana, self.FECHA))
+
+        # El otro día no se tocó: sigue saliendo de cache
+        with self.assertNumQueries(1):
+            self.disponibilidad(self.ana, self.manana)
+
+    def test_mover_cita_invalida_origen_y_destino(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cita = self.crear_cita(self.ana, self.en_bogota(self.FECHA, 9), 30)
+        self.assertNotIn('09:00', self.disponibilidad(self.ana, self.FECHA))
+        self.assertIn('10:00', self.disponibilidad(self.luis, self.manana))
+
+        cita.empleado = self.luis
+        cita.fecha_hora_inicio = self.en_bogota(self.manana, 10)
+        cita.fecha_hora_fin = cita.fecha_hora_inicio + timedelta(minutes=30)
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.save()
+
+        self.assertIn('09:00', self.disponibilidad(self.ana, self.FECHA))
+        self.assertNotIn('10:00', self.disponibilidad(self.luis, self.manana))
+
+    def test_ausencia_borrada_libera_el_dia(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ausencia = Absence.objects.create(professional=self.ana, fecha_inicio=self.en_bogota(self.FECHA, 8),
+                                              fecha_fin=self.en_bogota(self.FECHA, 18))
+        self.assertEqual(self.disponibilidad(self.ana, self.FECHA), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            ausencia.delete()
+        self.assertIn('08:00', self.disponibilidad(self.ana, self.FECHA))
+
+    def test_cambio_de_horario_invalida_todas_las_fechas(self):
+        self.assertIn('08:00', self.disponibilidad(self.ana, self.FECHA))
+        horario = HorarioEmpleado.objects.get(empleado=self.ana, dia_semana=self.FECHA.weekday())
+        horario.hora_inicio = time(10, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            horario.save()
+        self.assertEqual(self.disponibilidad(self.ana, self.FECHA)[0], '10:00')
+
+    def test_invalidar_en_un_proceso_llega_a_los_demas(self):
+        # Dos workers: cada uno con su cache local de valores, la compartida es la misma
+        workers = [LocMemCache(f'worker-{i}', {}) for i in range(2)]
+
+        def disponibilidad_en(worker):
+            with mock.patch.object(cache_disponibilidad, '_cache', return_value=worker):
+                return self.disponibilidad(self.ana, self.FECHA)
+
+        for worker in workers:
+            self.assertIn('09:00', disponibilidad_en(worker))
+        with self.captureOnCommitCallbacks(execute=True):  # La reserva la atiende el worker 0
+            with mock.patch.object(cache_disponibilidad, '_cache', return_value=workers[0]):
+                self.crear_cita(self.ana, self.en_bogota(self.FECHA, 9), 30)
+        self.assertNotIn('09:00', disponibilidad_en(workers[1]))
+
+    def test_sin_confirmar_la_transaccion_no_se_invalida(self):
+        self.disponibilidad(self.ana, self.FECHA)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.crear_cita(self.ana, self.en_bogota(self.FECHA, 9), 30)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(cache_disponibilidad.metricas.como_dict()['invalidaciones'], 0)
+
+
+class HuecosMaterializadosTests(DatosSalonMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ana = self.crear_profesional('Ana')
+        self.luis = self.crear_profesional('Luis', dias=range(6), almuerzo_inicio=None, almuerzo_fin=None)
+        self.hoy = huecos.hoy()
+        self.hasta = self.hoy + timedelta(days=6)
+        call_command('reconstruir_huecos', self.tenant.subdomain, dias=7, stdout=StringIO())
+        self.tenant.refresh_from_db()
+        cache_tenants.obtener(self.tenant.subdomain)
+
+    def assertIgualAlCalculo(self):
+        pros = [self.ana, self.luis]
+        for duracion in (30, 45, 90):
+            self.assertEqual(
+                huecos.disponibilidad_materializada(pros, self.hoy, self.hasta, duracion),
+                obtener_disponibilidad_rango(pros, self.hoy, self.hasta, duracion),
+            )
+
+    def test_reconstruccion_en_bloque(self):
+        self.assertEqual(self.tenant.huecos_hasta, self.hasta)
+        self.assertIgualAlCalculo()
+
+    def test_mantenimiento_incremental(self):
+        manana = self.hoy + timedelta(days=1)
+        cita = self.crear_cita(self.ana, self.en_bogota(manana, 9, 10), 50)
+        otra = self.crear_cita(self.ana, self.en_bogota(manana, 10, 0), 30)
+        self.crear_cita(self.luis, self.en_bogota(manana, 17, 30), 60, estado='pendiente')
+        ausencia = Absence.objects.create(professional=self.luis, fecha_inicio=self.en_bogota(self.hoy, 23),
+                                          fecha_fin=self.en_bogota(manana, 11))
+        self.assertIgualAlCalculo()
+
+        # Mover de día y de profesional, cancelar, borrar
+        cita.empleado = self.luis
+        cita.fecha_hora_inicio = self.en_bogota(self.hoy + timedelta(days=2), 14, 45)
+        cita.fecha_hora_fin = cita.fecha_hora_inicio + timedelta(minutes=50)
+        cita.save()
+        self.assertIgualAlCalculo()
+
+        otra.estado = 'cancelada'
+        otra.save()
+        self.assertIgualAlCalculo()
+
+        ausencia.delete()
+        self.assertIgualAlCalculo()
+
+        # Los huecos vecinos se vuelven a unir: la mañana de Ana queda como un solo tramo
+        self.assertEqual(
+            FreeSlot.objects.filter(empleado=self.ana, fecha=manana).count(),
+            FreeSlot.objects.filter(empleado=self.ana, fecha=self.hoy).count(),
+        )
+
+    def test_senales_no_buscan_el_negocio_de_mas(self):
+        def consultas_al_negocio(funcion):
+            with CaptureQueriesContext(connection) as capturadas:
+                funcion()
+            return sum(1 for c in capturadas if 'FROM "salon_tenant"' in c['sql'])
+
+        manana = self.hoy + timedelta(days=1)
+        self.assertEqual(consultas_al_negocio(lambda: self.crear_cita(self.ana, self.en_bogota(manana, 9), 30)), 0)
+        # Sin el negocio cargado: una consulta por clave primaria (tenant_id)
+        cita = Appointment.objects.get(empleado=self.ana)
+        cita.estado = 'cancelada'
+        self.assertEqual(consultas_al_negocio(cita.save), 1)
+        self.assertIgualAlCalculo()
+
+        for hora in (9, 10, 11):
+            self.crear_cita(self.luis, self.en_bogota(manana, hora), 30)
+        Absence.objects.create(professional=self.luis, fecha_inicio=self.en_bogota(manana, 14),
+                               fecha_fin=self.en_bogota(manana, 15))
+        # En cascada los huecos se van con el profesional: nada que liberar cita por cita
+        self.assertEqual(consultas_al_negocio(self.luis.delete), 0)
+        self.assertEqual(FreeSlot.objects.exclude(empleado=self.ana).count(), 0)
+
+    def test_cambio_de_horario_reconstruye_al_profesional(self):
+        HorarioEmpleado.objects.filter(empleado=self.ana).first().delete()
+        horario = HorarioEmpleado.objects.filter(empleado=self.ana).first()
+        horario.hora_fin = time(15, 0)
+        horario.save()
+        self.assertIgualAlCalculo()
+
+    def test_api_lee_la_tabla_en_una_consulta(self):
+        url = reverse('api_disponibilidad', args=[self.tenant.subdomain])
+        params = {'desde': self.hoy.isoformat(), 'hasta': self.hasta.isoformat(), 'service_id': self.servicio.id}
+        with self.assertNumQueries(4):  # servicio, empleados, huecos_hasta y FreeSlot
+            respuesta = self.client.get(url, params, HTTP_X_API_KEY=settings.API_SECRET_KEY)
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_desactivar_desde_otro_proceso(self):
+        url = reverse('api_disponibilidad', args=[self.tenant.subdomain])
+        params = {'fecha': (self.hoy + timedelta(days=1)).isoformat(), 'service_id': self.servicio.id}
+        antes = self.client.get(url, params, HTTP_X_API_KEY=settings.API_SECRET_KEY).json()
+        self.assertTrue(antes)
+
+        # Como desde cron: la cache de negocios de este proceso sigue con huecos_hasta puesto
+        with mock.patch.object(cache_tenants, 'invalidar'):
+            call_command('reconstruir_huecos', self.tenant.subdomain, desactivar=True, stdout=StringIO())
+        self.assertEqual(cache_tenants.obtener(self.tenant.subdomain).huecos_hasta, self.hasta)
+        self.assertFalse(FreeSlot.objects.exists())
+
+        # La API vuelve al cálculo en vivo en vez de responder una agenda vacía
+        despues = self.client.get(url, params, HTTP_X_API_KEY=settings.API_SECRET_KEY).json()
+        self.assertEqual(despues, antes)
+
+
+class ProximosTurnosTests(DatosSalonMixin, TestCase):
+
+    def test_encuentra_el_primer_hueco_de_cualquier_profesional(self):
+        ana = self.crear_profesional('Ana')
+        luis = self.crear_profesional('Luis', hora_inicio=time(9, 0))
+        desde = self.en_bogota(self.FECHA, 8, 10)
+        self.crear_cita(ana, self.en_bogota(self.FECHA, 8, 30), 60)
+
+        turnos = buscar_proximos_turnos([ana, luis], 30, k=3, desde=desde)
+        self.assertEqual(
+            [(inicio.strftime("%H:%M"), emp) for inicio, emp in turnos],
+            [('09:00', luis), ('09:30', ana), ('09:30', luis)],
+        )
+
+    def test_consultas_acotadas_con_la_agenda_llena(self):
+        pros = [self.crear_profesional(f'Pro {i}') for i in range(3)]
+        for pro in pros:
+            Absence.objects.create(professional=pro, fecha_inicio=self.en_bogota(self.FECHA, 0),
+                                   fecha_fin=self.en_bogota(self.FECHA + timedelta(days=20), 0))
+
+        with self.assertNumQueries(3 * 2):  # dos lotes de 7 días sin resultados
+            self.assertEqual(buscar_proximos_turnos(pros, 30, desde=self.en_bogota(self.FECHA, 0),
+                                                    horizonte_dias=14), [])
+
+        with self.assertNumQueries(3 * 3):  # el tercer lote encuentra los k turnos y corta
+            turnos = buscar_proximos_turnos(pros, 30, k=4, desde=self.en_bogota(self.FECHA, 0))
+        self.assertEqual(turnos[0][0], self.en_bogota(self.FECHA + timedelta(days=20), 8))
+
+    def test_endpoint(self):
+        self.crear_profesional('Ana')
+        url = reverse('api_proximos_turnos', args=[self.tenant.subdomain])
+        respuesta = self.client.get(url, {'service_id': self.servicio.id, 'k': 2},
+                                    HTTP_X_API_KEY=settings.API_SECRET_KEY)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()), 2)
+
+    def test_errores_en_json(self):
+        url = reverse('api_proximos_turnos', args=[self.tenant.subdomain])
+        casos = [
+            ({'service_id': 999}, 404, 'Servicio no encontrado'),
+            ({'service_id': 'x'}, 400, 'Parámetros service_id/empleado_id inválidos'),
+            ({'service_id': self.servicio.id, 'empleado_id': 'x'}, 400, 'Parámetros service_id/empleado_id inválidos'),
+            ({'service_id': self.servicio.id, 'k': 'x'}, 400, 'Parámetros k/dias inválidos'),
+        ]
+        for params, estado, error in casos:
+            respuesta = self.client.get(url, params, HTTP_X_API_KEY=settings.API_SECRET_KEY)
+            self.assertEqual(respuesta.status_code, estado)
+            self.assertEqual(respuesta.json(), {'error': error})
+
+
+class TenantMiddlewareTests(DatosSalonMixin, TestCase):
+
+    def servicios(self, slug=None):
+        return self.client.get(reverse('api_servicios', args=[slug or self.tenant.subdomain]),
+                               HTTP_X_API_KEY=settings.API_SECRET_KEY)
+
+    def test_middlewares_sirven_async_sin_cambiar_de_hilo(self):
+        async def vista(request):
+            return HttpResponse()
+
+        for clase in (TenantMiddleware, ReplicaMiddleware):
+            with self.subTest(middleware=clase.__name__):
+                middleware = clase(vista)
+                self.assertTrue(iscoroutinefunction(middleware))
+                self.assertEqual(async_to_sync(middleware)(RequestFactory().get('/')).status_code, 200)
+        self.assertFalse(iscoroutinefunction(TenantMiddleware(lambda request: HttpResponse())))
+
+    def test_negocio_se_resuelve_desde_la_cache(self):
+        self.servicios()  # Arma el cuerpo del catálogo (ver CacheCatalogoTests)
+        cache_tenants.invalidar()
+        with self.assertNumQueries(2):  # negocio + versión del catálogo (ETag)
+            self.servicios()
+        with self.assertNumQueries(1):  # solo la versión: negocio y cuerpo salen de las caches
+            self.assertEqual(self.servicios().json()[0]['nombre'], 'Corte')
+
+        # Guardar el negocio vacía la cache
+        self.tenant.name = 'Salón Renovado'
+        self.tenant.save()
+        with self.assertNumQueries(2):
+            self.servicios()
+
+    def test_slug_inexistente_es_404(self):
+        self.assertEqual(self.servicios('no-existe').status_code, 404)
+        self.assertEqual(self.client.get(reverse('agendar_cita', args=['no-existe'])).status_code, 404)
+
+    def test_entradas_vencen(self):
+        with self.settings(TENANT_CACHE_SEGUNDOS=0):
+            cache_tenants.invalidar()
+            self.servicios()
+            with self.assertNumQueries(2):  # negocio + versión
+                self.servicios()
+
+    # Plantillas mínimas que usan el negocio varias veces, como base.html + index.html
+    PLANTILLAS = [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'OPTIONS': {
+            'context_processors': settings.TEMPLATES[0]['OPTIONS']['context_processors'],
+            'loaders': [('django.template.loaders.locmem.Loader', {
+                'salon/dashboard.html': '{{ current_tenant.name }}{% if current_tenant.es_dueno %}Mi Negocio{% endif %}'
+                                        '{{ tenant.name }}{% for cita in appointments %}{{ cita.cliente_nombre }}{% endfor %}',
+                'salon/mi_agenda.html': '{{ current_tenant.name }}{% for cita in citas %}{{ cita.cliente_nombre }}{% endfor %}',
+            })],
+        },
+    }]
+
+    def test_panel_resuelve_el_negocio_una_vez(self):
+        pro = self.crear_profesional()
+        self.crear_cita(pro, self.en_bogota(timezone.now().astimezone(ZONA_CO).date(), 9), 45)
+        self.client.force_login(self.user)
+        # sesión + usuario + negocio (una vez, compartido por vista, context processor y plantilla)
+        # + totales del resumen diario + citas de hoy
+        with self.settings(TEMPLATES=self.PLANTILLAS), self.assertNumQueries(5):
+            respuesta = self.client.get(reverse('panel_negocio'))
+        self.assertContains(respuesta, 'Salón TestMi NegocioSalón TestCliente')
+        self.assertTrue(respuesta.context['current_tenant'].es_dueno)
+        self.assertEqual(respuesta.context['tenant'], self.tenant)
+
+    def test_profesional_usa_el_negocio_donde_trabaja(self):
+        pro = self.crear_profesional()
+        pro.user = User.objects.create_user(username='ana', password='x')
+        pro.save()
+        self.client.force_login(pro.user)
+
+        with self.settings(TEMPLATES=self.PLANTILLAS):
+            respuesta = self.client.get(reverse('mi_agenda'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['current_tenant'], self.tenant)
+        self.assertFalse(respuesta.context['current_tenant'].es_dueno)
+        # El panel es solo del dueño
+        self.assertRedirects(self.client.get(reverse('panel_negocio')), reverse('crear_negocio'), fetch_redirect_response=False)
+
+    def test_sin_sesion_no_consulta_negocio(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        TenantMiddleware(lambda r: HttpResponse())(request)
+        with self.assertNumQueries(0):
+            self.assertFalse(request.current_tenant)
+
+
+class CrearCitaApiTests(DatosSalonMixin, TestCase):
+
+    def reservar(self, pro, hora, **cabeceras):
+        url = reverse('api_crear_cita', args=[self.tenant.subdomain])
+        datos = {'empleado_id': pro.id, 'servicio_id': self.servicio.id, 'fecha': self.FECHA.isoformat(),
+                 'hora_inicio': hora, 'cliente_nombre': 'Cliente', 'cliente_telefono': '300'}
+        return self.client.post(url, json.dumps(datos), content_type='application/json',
+                                HTTP_X_API_KEY=settings.API_SECRET_KEY, **cabeceras)
+
+    def test_reserva_y_conflicto(self):
+        pro = self.crear_profesional()
+        self.assertEqual(self.reservar(pro, '09:00').status_code, 201)
+        self.assertEqual(self.reservar(pro, '09:30').status_code, 409)
+        self.assertEqual(self.reservar(pro, '09:45').status_code, 201)
+        self.assertEqual(Appointment.objects.filter(empleado=pro).count(), 2)
+
+    def test_reintento_con_idempotency_key_repite_la_respuesta(self):
+        pro = self.crear_profesional()
+        primera = self.reservar(pro, '09:00', HTTP_IDEMPOTENCY_KEY='abc-123')
+        self.assertEqual(primera.status_code, 201)
+
+        with self.assertNumQueries(1):
+            reintento = self.reservar(pro, '09:00', HTTP_IDEMPOTENCY_KEY='abc-123')
+        self.assertEqual(reintento.status_code, 201)
+        self.assertEqual(reintento.content, primera.content)
+        self.assertEqual(reintento['Idempotent-Replayed'], 'true')
+        self.assertEqual(Appointment.objects.filter(empleado=pro).count(), 1)
+
+        # Misma clave con otros datos: error, no otra reserva
+        self.assertEqual(self.reservar(pro, '11:00', HTTP_IDEMPOTENCY_KEY='abc-123').status_code, 422)
+
+    def test_claves_vencidas_se_limpian_por_lotes(self):
+        pro = self.crear_profesional()
+        for i, hora in enumerate(['09:00', '10:00', '11:00']):
+            self.reservar(pro, hora, HTTP_IDEMPOTENCY_KEY=f'clave-{i}')
+        IdempotencyKey.objects.exclude(clave='clave-2').update(expira=timezone.now())
+
+        self.assertEqual(limpiar_vencidas(lote=1), 2)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('clave', flat=True)), ['clave-2'])
+
+        # Una clave vencida deja de repetir: la petición se procesa otra vez
+        self.assertEqual(self.reservar(pro, '09:00', HTTP_IDEMPOTENCY_KEY='clave-0').status_code, 409)
+
+    def test_presupuesto_de_consultas_por_reserva(self):
+        pro = self.crear_profesional()
+        # Servicio, bloqueo del profesional, choques (UNION), INSERT, resumen diario + savepoint/release
+        with self.assertNumQueries(7):
+            self.assertEqual(self.reservar(pro, '09:00').status_code, 201)
+
+        datos = {'servicio': self.servicio.id, 'profesional': pro.id, 'fecha': self.FECHA.isoformat(),
+                 'hora': '10:00', 'nombre_cliente': 'Cliente', 'telefono_cliente': '300'}
+        url = reverse('agendar_cita', args=[self.tenant.subdomain])
+        with self.assertNumQueries(7):
+            respuesta = self.client.post(url, datos)
+        cita = Appointment.objects.get(empleado=pro, fecha_hora_inicio=self.en_bogota(self.FECHA, 10))
+        self.assertRedirects(respuesta, reverse('confirmacion_reserva', args=[cita.id]), fetch_redirect_response=False)
+        self.assertEqual(cita.fecha_hora_fin, self.en_bogota(self.FECHA, 10, 45))
+
+        # La página pública ahora también rechaza los choques
+        self.client.post(url, dict(datos, hora='10:30'))
+        self.assertEqual(Appointment.objects.filter(empleado=pro).count(), 2)
+
+    def test_lote_valida_contra_la_base_y_contra_el_propio_lote(self):
+        ana, luis = self.crear_profesional('Ana'), self.crear_profesional('Luis')
+        self.crear_cita(ana, self.en_bogota(self.FECHA, 9), 45)
+        cache_disponibilidad.disponibilidad_cacheada([luis], self.FECHA, self.FECHA, 45)
+
+        def item(pro, hora, servicio_id=self.servicio.id):
+            return {'empleado_id': pro.id, 'servicio_id': servicio_id, 'fecha': self.FECHA.isoformat(),
+                    'hora_inicio': hora, 'cliente_nombre': 'Cliente', 'cliente_telefono': '300'}
+
+        citas = [item(ana, '09:00'), item(ana, '10:00'), item(ana, '10:30'), item(luis, '10:00'),
+                 item(luis, '11:00', servicio_id=0), {'empleado_id': luis.id}]
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(reverse('api_crear_citas_lote', args=[self.tenant.subdomain]),
+                                         json.dumps({'citas': citas}), content_type='application/json',
+                                         HTTP_X_API_KEY=settings.API_SECRET_KEY)
+
+        self.assertEqual(respuesta.status_code, 207)
+        cuerpo = respuesta.json()
+        self.assertEqual(cuerpo['creadas'], 2)
+        self.assertEqual([r.get('error') for r in cuerpo['resultados']],
+                         ['HORARIO_OCUPADO', None, 'HORARIO_OCUPADO', None, 'SERVICIO_INVALIDO', 'DATOS_INVALIDOS'])
+        self.assertEqual(Appointment.objects.filter(empleado=ana).count(), 2)
+        self.assertEqual(Appointment.objects.get(pk=cuerpo['resultados'][3]['id']).empleado, luis)
+
+        # bulk_create no dispara señales: la invalidación de cache se aplica igual
+        horas = cache_disponibilidad.disponibilidad_cacheada([luis], self.FECHA, self.FECHA, 45)[self.FECHA][luis]
+        self.assertNotIn('10:00', horas)
+
+    def test_duracion_maxima_de_la_cita(self):
+        pro = self.crear_profesional()
+        inicio = self.en_bogota(self.FECHA, 9)
+        # Exactamente el tope se acepta
+        Appointment.objects.create(tenant=self.tenant, servicio=self.servicio, empleado=pro, fecha_hora_inicio=inicio,
+                                   fecha_hora_fin=inicio + timedelta(hours=24), cliente_nombre='Cliente', precio_total=0)
+        larga = Appointment(tenant=self.tenant, servicio=self.servicio, empleado=pro, fecha_hora_inicio=inicio,
+                            fecha_hora_fin=inicio + timedelta(hours=25), cliente_nombre='Cliente',
+                            cliente_telefono='300', precio_total=0)
+        with self.assertRaisesMessage(ValidationError, 'más de 24 horas'):
+            larga.full_clean()
+        with self.assertRaises(ValidationError):
+            larga.save()
+        self.assertEqual(Appointment.objects.filter(empleado=pro).count(), 1)
+
+        # Por la API: un servicio más largo que el tope se rechaza, sola o en lote
+        maraton = Service.objects.create(tenant=self.tenant, nombre='Maratón', precio=1, duracion=25 * 60)
+        datos = {'empleado_id': pro.id, 'servicio_id': maraton.id, 'fecha': (self.FECHA + timedelta(days=3)).isoformat(),
+                 'hora_inicio': '09:00', 'cliente_nombre': 'Cliente', 'cliente_telefono': '300'}
+        respuesta = self.client.post(reverse('api_crear_cita', args=[self.tenant.subdomain]), json.dumps(datos),
+                                     content_type='application/json', HTTP_X_API_KEY=settings.API_SECRET_KEY)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('más de 24 horas', respuesta.json()['error'])
+        respuesta = self.client.post(reverse('api_crear_citas_lote', args=[self.tenant.subdomain]),
+                                     json.dumps({'citas': [datos]}), content_type='application/json',
+                                     HTTP_X_API_KEY=settings.API_SECRET_KEY)
+        self.assertEqual(respuesta.json()['resultados'][0]['error'], 'DURACION_INVALIDA')
+        self.assertEqual(Appointment.objects.filter(empleado=pro).count(), 1)
+
+    def test_violacion_de_restriccion_es_horario_ocupado(self):
+        pro = self.crear_profesional()
+
+        def crear(empleado):
+            raise IntegrityError('conflicting key value violates exclusion constraint "appointment_sin_solapes"')
+
+        with self.assertRaisesMessage(ValueError, 'HORARIO_OCUPADO'):
+            BookingManager._reserva_con_restriccion(pro.id, crear)
+
+
+class CatalogoCondicionalTests(DatosSalonMixin, TestCase):
+
+    def pedir(self, nombre='api_servicios', **cabeceras):
+        return self.client.get(reverse(nombre, args=[self.tenant.subdomain]),
+                               HTTP_X_API_KEY=settings.API_SECRET_KEY, **cabeceras)
+
+    def test_etag_y_304(self):
+        self.crear_profesional('Ana')
+        for nombre in ('api_servicios', 'api_empleados'):
+            with self.subTest(nombre=nombre):
+                respuesta = self.pedir(nombre)
+                self.assertEqual(respuesta.status_code, 200)
+                etag = respuesta['ETag']
+                self.assertFalse(etag.startswith('W/'))
+                self.assertIn('private', respuesta['Cache-Control'])
+                # Versión del negocio por clave primaria; nada de servicios ni profesionales
+                with CaptureQueriesContext(connection) as consultas:
+                    respuesta = self.pedir(nombre, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(respuesta.status_code, 304)
+                self.assertEqual(respuesta['ETag'], etag)
+                self.assertEqual(len(consultas), 1)
+                self.assertNotIn('salon_service', consultas[0]['sql'])
+                self.assertNotIn('salon_professional', consultas[0]['sql'])
+
+    def test_cambios_del_catalogo_cambian_el_etag(self):
+        etag = self.pedir()['ETag']
+        servicio = Service.objects.create(tenant=self.tenant, nombre='Barba', precio=15000, duracion=30)
+        respuesta = self.pedir(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('Barba', [s['nombre'] for s in respuesta.json()])
+
+        etag = respuesta['ETag']
+        servicio.delete()
+        self.assertNotEqual(self.pedir()['ETag'], etag)
+        # Cada endpoint tiene su ETag; un profesional nuevo también cambia la versión
+        etag_empleados = self.pedir('api_empleados')['ETag']
+        self.assertNotEqual(etag_empleados, self.pedir()['ETag'])
+        self.crear_profesional('Luis')
+        self.assertEqual(self.pedir('api_empleados', HTTP_IF_NONE_MATCH=etag_empleados).status_code, 200)
+
+    def test_guardar_negocio_no_baja_la_version(self):
+        viejo = Tenant.objects.get(pk=self.tenant.pk)  # Copia leída antes del cambio (p. ej. la cache)
+        Service.objects.create(tenant=self.tenant, nombre='Tinte', precio=50000, duracion=60)
+        viejo.telefono = '3001234567'
+        viejo.save()
+        self.tenant.refresh_from_db()
+        self.assertEqual(self.tenant.version_catalogo, viejo.version_catalogo + 1)
+        self.assertEqual(self.tenant.telefono, '3001234567')
+
+
+class CacheCatalogoTests(DatosSalonMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # La compartida es la tabla de la base: los hilos del test no pueden escribirla mientras
+        # la transacción del TestCase está abierta. Una LocMem común a todos hace sus veces.
+        self.compartida = LocMemCache('compartida-catalogo', {})
+        self.compartida.clear()
+        parche = mock.patch.object(catalogo, '_compartida', return_value=self.compartida)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def servicios(self):
+        return self.client.get(reverse('api_servicios', args=[self.tenant.subdomain]),
+                               HTTP_X_API_KEY=settings.API_SECRET_KEY)
+
+    def test_un_armado_por_version(self):
+        self.assertEqual(self.servicios().json(), [{'id': self.servicio.id, 'nombre': 'Corte', 'duracion': 45,
+                                                    'precio': 20000.0}])
+        with CaptureQueriesContext(connection) as consultas:
+            self.servicios()
+        self.assertFalse(any('salon_service' in c['sql'] for c in consultas))
+
+        # La versión nueva tiene su propia clave; la vieja no se borra, vence sola
+        version = Tenant.objects.get(pk=self.tenant.pk).version_catalogo
+        Service.objects.create(tenant=self.tenant, nombre='Barba', precio=15000, duracion=30)
+        self.assertEqual(len(self.servicios().json()), 2)
+        self.assertIsNotNone(caches['default'].get(catalogo._clave('servicios', self.tenant.id, version)))
+
+    def test_un_solo_worker_reconstruye(self):
+        llamadas = []
+
+        def construir():
+            llamadas.append(1)
+            threading.Event().wait(0.1)  # Consulta lenta
+            return [{'id': 1}]
+
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(catalogo.cuerpo('prueba', 1, 1, construir)))
+                 for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(llamadas), 1)  # Los demás esperaron la entrada del primero
+        self.assertEqual(set(resultados), {(b'[{"id": 1}]', 1)})
+
+    def test_sirve_la_copia_anterior_mientras_otro_reconstruye(self):
+        self.servicios()
+        version = Tenant.objects.get(pk=self.tenant.pk).version_catalogo
+        Service.objects.create(tenant=self.tenant, nombre='Barba', precio=15000, duracion=30)
+        self.compartida.add(catalogo._clave('servicios', self.tenant.id, version + 1) + ':candado', 1)
+
+        respuesta = self.servicios()
+        self.assertEqual(len(respuesta.json()), 1)
+        self.assertEqual(respuesta['ETag'], catalogo.formato_etag('servicios', self.tenant.id, version))
+
+    def test_sin_copia_anterior_espera_y_arma_sin_guardar(self):
+        self.compartida.add(catalogo._clave('prueba', 1, 1) + ':candado', 1)
+        with mock.patch.object(catalogo, 'ESPERA_SEGUNDOS', 0.05):
+            self.assertEqual(catalogo.cuerpo('prueba', 1, 1, lambda: []), (b'[]', 1))
+        self.assertIsNone(self.compartida.get(catalogo._clave('prueba', 1, 1)))
+        self.assertIsNone(caches['default'].get(catalogo._clave('prueba', 1, 1)))
+
+    def test_otro_worker_copia_el_cuerpo_sin_armarlo(self):
+        workers = [LocMemCache(f'catalogo-worker-{i}', {}) for i in range(2)]
+        llamadas = []
+
+        def construir():
+            llamadas.append(1)
+            return [{'id': 1}]
+
+        for worker in workers:
+            with mock.patch.object(catalogo, 'cache', worker):
+                self.assertEqual(catalogo.cuerpo('prueba', 1, 1, construir), (b'[{"id": 1}]', 1))
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(workers[1].get(catalogo._clave('prueba', 1, 1)), b'[{"id": 1}]')
+
+
+class ApartadosTests(DatosSalonMixin, TestCase):
+
+    def post(self, nombre, datos):
+        return self.client.post(reverse(nombre, args=[self.tenant.subdomain]), json.dumps(datos),
+                                content_type='application/json', HTTP_X_API_KEY=settings.API_SECRET_KEY)
+
+    def apartar(self, pro, hora):
+        return self.post('api_crear_apartado', {'empleado_id': pro.id, 'servicio_id': self.servicio.id,
+                                                'fecha': self.FECHA.isoformat(), 'hora_inicio': hora})
+
+    def confirmar(self, token):
+        return self.post('api_crear_cita', {'apartado': token, 'cliente_nombre': 'Cliente', 'cliente_telefono': '300'})
+
+    def test_apartado_ocupa_y_se_confirma(self):
+        pro = self.crear_profesional()
+        respuesta = self.apartar(pro, '09:00')
+        self.assertEqual(respuesta.status_code, 201)
+        token = respuesta.json()['apartado']
+
+        # Mientras está vigente, nadie más puede tomar ese horario
+        self.assertNotIn('09:00', obtener_bloques_disponibles(pro, self.FECHA, 45))
+        self.assertEqual(self.apartar(pro, '09:30').status_code, 409)
+        self.assertTrue(verificar_conflicto_atomic(pro, self.en_bogota(self.FECHA, 9), self.en_bogota(self.FECHA, 10)))
+
+        with self.assertNumQueries(8):  # Presupuesto de reserva + DELETE del apartado
+            confirmada = self.confirmar(token)
+        self.assertEqual(confirmada.status_code, 201)
+        cita = Appointment.objects.get(pk=confirmada.json()['id'])
+        self.assertEqual(cita.fecha_hora_inicio, self.en_bogota(self.FECHA, 9))
+        self.assertFalse(SlotHold.objects.exists())
+        self.assertEqual(self.confirmar(token).status_code, 410)
+
+    def test_error_interno_no_expone_detalles(self):
+        pro = self.crear_profesional()
+        with self.assertLogs('salon.api', 'ERROR'), \
+                mock.patch.object(BookingManager, 'ejecutar_apartado_seguro', side_effect=RuntimeError('secreto')):
+            respuesta = self.apartar(pro, '09:00')
+        self.assertEqual(respuesta.status_code, 500)
+        self.assertEqual(respuesta.json(), {'error': 'Error interno del servidor'})
+
+    def test_apartado_vencido_se_ignora_y_se_limpia(self):
+        pro = self.crear_profesional()
+        token = self.apartar(pro, '09:00').json()['apartado']
+        SlotHold.objects.update(expira=timezone.now())
+
+        self.assertIn('09:00', obtener_bloques_disponibles(pro, self.FECHA, 45))
+        self.assertEqual(self.confirmar(token).status_code, 410)
+        self.assertEqual(self.apartar(pro, '09:00').status_code, 201)
+
+        call_command('limpiar_apartados', stdout=StringIO())
+        self.assertEqual(SlotHold.objects.count(), 1)
+
+    def test_liberar_apartado(self):
+        pro = self.crear_profesional()
+        token = self.apartar(pro, '09:00').json()['apartado']
+        url = reverse('api_liberar_apartado', args=[self.tenant.subdomain, token])
+        self.assertEqual(self.client.delete(url, HTTP_X_API_KEY=settings.API_SECRET_KEY).status_code, 204)
+        self.assertIn('09:00', obtener_bloques_disponibles(pro, self.FECHA, 45))
+
+
+class ArchivoCitasTests(DatosSalonMixin, TestCase):
+
+    def test_archiva_solo_terminadas_antiguas(self):
+        pro = self.crear_profesional()
+        hace = lambda dias: timezone.now() - timedelta(days=dias)
+        viejas = [self.crear_cita(pro, hace(400), 45, estado='completada'),
+                  self.crear_cita(pro, hace(300), 45, estado='cancelada')]
+        vieja_activa = self.crear_cita(pro, hace(300), 45, estado='pendiente')
+        reciente = self.crear_cita(pro, hace(5), 45, estado='completada')
+
+        call_command('archivar_citas', dias=180, lote=1, stdout=StringIO())
+
+        self.assertEqual(set(Appointment.objects.values_list('id', flat=True)), {vieja_activa.id, reciente.id})
+        archivadas = AppointmentArchive.objects.order_by('fecha_hora_inicio')
+        self.assertEqual([(c.id, c.estado) for c in archivadas], [(c.id, c.estado) for c in viejas])
+
+        # Los reportes siguen viendo todo el histórico
+        historial = archivo.historial_citas(self.tenant, hace(500), timezone.now())
+        self.assertEqual(sorted(fila[0] for fila in historial), sorted(c.id for c in viejas + [vieja_activa, reciente]))
+
+
+class DirectorioTests(DatosSalonMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        for i, ciudad in enumerate(['Bogotá', 'Bogotá', 'Bogotá', 'Duitama']):
+            Tenant.objects.create(user=self.user, name=f'Negocio {i}', subdomain=f'negocio-{i}', ciudad=ciudad)
+
+    def landing(self, **parametros):
+        return self.client.get(reverse('landing_negocio'), parametros)
+
+    def test_anonimos_reciben_la_pagina_cacheada(self):
+        with self.assertNumQueries(5):  # versión, ciudades, conteo, página de negocios y versiones de tarjetas
+            primera = self.landing()
+        self.assertIn('Cookie', primera['Vary'])
+        with self.assertNumQueries(1):  # Solo la versión (cache compartida en la base)
+            segunda = self.landing()
+        self.assertEqual(segunda.content, primera.content)
+        self.assertIn('Cookie', segunda['Vary'])
+
+        # Guardar un negocio invalida tarjetas, ciudades y páginas
+        self.tenant.name = 'Salón Renovado'
+        self.tenant.ciudad = 'Paipa'
+        self.tenant.save()
+        respuesta = self.landing()
+        self.assertContains(respuesta, 'Salón Renovado')
+        self.assertEqual(respuesta.context['ciudades'], ['Bogotá', 'Duitama', 'Paipa'])
+
+        # Con sesión no se usa la página de los anónimos
+        self.client.force_login(self.user)
+        self.assertContains(self.landing(), 'Mi Negocio')
+
+    def test_filtro_por_ciudad_y_paginas(self):
+        with mock.patch.object(directorio, 'POR_PAGINA', 2):
+            pagina = self.landing(ciudad='Bogotá', pagina='2').context['pagina']
+            self.assertEqual([t.name for t in pagina], ['Negocio 2'])
+            self.assertEqual(pagina.paginator.num_pages, 2)
+            # Parámetros inválidos se corrigen y no se guardan en la cache
+            self.landing(pagina='abc')
+            with self.assertNumQueries(4):  # Solo las ciudades salen de la cache
+                self.landing(pagina='abc')
+
+    def test_tarjeta_cacheada_hasta_guardar_el_negocio(self):
+        def clave():
+            return make_template_fragment_key(directorio.FRAGMENTO_TARJETA,
+                                              [self.tenant.id, directorio.marcar_tarjetas([self.tenant])[0].version_tarjeta])
+        self.landing()
+        anterior = clave()
+        self.assertIn(self.tenant.subdomain, caches['default'].get(anterior))
+        self.tenant.save()
+        self.assertNotEqual(clave(), anterior)
+        self.assertIsNone(caches['default'].get(clave()))
+
+    def test_invalidar_en_un_proceso_llega_a_los_demas(self):
+        workers = [LocMemCache(f'directorio-worker-{i}', {}) for i in range(2)]
+
+        def landing_en(worker):
+            with mock.patch.object(directorio, 'cache', worker):
+                return self.landing()
+
+        for worker in workers:
+            self.assertNotIn('Paipa', landing_en(worker).context['ciudades'])
+        with mock.patch.object(directorio, 'cache', workers[0]):
+            self.tenant.ciudad = 'Paipa'
+            self.tenant.save()
+        self.assertIn('Paipa', landing_en(workers[1]).context['ciudades'])
+
+
+class NegociosCercanosTests(DatosSalonMixin, TestCase):
+    TUNJA = (5.5353, -73.3678)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        azar = random.Random(21)
+        for i in range(80):
+            # Alrededor de Tunja (~±30 km) y unos pocos en Bogotá (~120 km)
+            lejos = i % 10 == 0
+            lat = (4.711 if lejos else cls.TUNJA[0]) + azar.uniform(-0.3, 0.3)
+            lon = (-74.072 if lejos else cls.TUNJA[1]) + azar.uniform(-0.3, 0.3)
+            Tenant.objects.create(user=cls.user, name=f'Negocio {i}', subdomain=f'geo-{i}', latitud=lat,
+                                  longitud=lon, ciudad='Bogotá' if lejos else ('Tunja' if i % 3 else 'Paipa'))
+
+    def fuerza_bruta(self, lat, lon, k, ciudad=None, radio=geo.RADIO_MAX_KM):
+        distancias = sorted(
+            (geo.haversine_km(lat, lon, t.latitud, t.longitud), t.id)
+            for t in Tenant.objects.filter(latitud__isnull=False) if not ciudad or t.ciudad == ciudad
+        )
+        return [tenant_id for distancia, tenant_id in distancias if distancia <= radio][:k]
+
+    def test_celda_se_calcula_al_guardar(self):
+        self.assertIsNone(self.tenant.celda_geo)
+        self.tenant.latitud, self.tenant.longitud = self.TUNJA
+        self.tenant.save()
+        self.tenant.refresh_from_db()
+        self.assertEqual(self.tenant.celda_geo, geo.celda(*self.TUNJA))
+
+    def test_mismos_resultados_que_la_fuerza_bruta(self):
+        for lat, lon in [self.TUNJA, (5.8, -73.1), (5.2, -73.6)]:
+            for k, ciudad in [(1, None), (10, None), (5, 'Paipa')]:
+                resultado = [t.id for _, t in geo.cercanos(lat, lon, k=k, ciudad=ciudad)]
+                self.assertEqual(resultado, self.fuerza_bruta(lat, lon, k, ciudad))
+        # Bogotá queda a más de RADIO_MAX_KM de Tunja
+        self.assertEqual(geo.cercanos(*self.TUNJA, k=5, ciudad='Bogotá'), [])
+
+    def test_endpoint(self):
+        url = reverse('negocios_cercanos')
+        with self.assertNumQueries(2):  # Bloque de 3x3 celdas y un anillo más, no toda la tabla
+            datos = self.client.get(url, {'lat': self.TUNJA[0], 'lon': self.TUNJA[1], 'k': 3}).json()
+        distancias = [n['distancia_km'] for n in datos['negocios']]
+        self.assertEqual(len(distancias), 3)
+        self.assertEqual(distancias, sorted(distancias))
+        self.assertTrue(datos['negocios'][0]['url'].startswith('/reservar/geo-'))
+        self.assertEqual(self.client.get(url, {'lat': 'x', 'lon': 1}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'lat': 100, 'lon': 1}).status_code, 400)
+
+    def test_cerca_de_los_polos_la_busqueda_es_acotada(self):
+        url = reverse('negocios_cercanos')
+        for lat in (89, 90, -90):
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url, {'lat': lat, 'lon': 0}).status_code, 400)
+
+        # Llamada directa: ANILLO_MAX acota las consultas y las celdas de cada una
+        for lat in (geo.LATITUD_MAX, 85, 89, 90):
+            inicio = perf_counter()
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(geo.cercanos(lat, 0, k=5), [])
+            self.assertLessEqual(len(consultas), math.ceil(math.log2(geo.ANILLO_MAX)) + 1)
+            self.assertLess(perf_counter() - inicio, 2)
+
+
+class BusquedaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='dueno', password='x')
+        datos = [
+            ('Peluquería Ñuñoa', 'Tunja', ['Corte de cabello', 'Arreglo de barba'], 'Barbería clásica'),
+            ('Barbería Central', 'Tunja', ['Corte', 'Barbas'], ''),
+            ('Estética Rosa', 'Tunja', ['Uñas acrílicas', 'Corte'], 'Manicurista'),
+            ('Barbería del Norte', 'Bogotá', ['Corte', 'Barba'], ''),
+        ]
+        cls.negocios = {}
+        for i, (nombre, ciudad, servicios, especialidad) in enumerate(datos):
+            negocio = Tenant.objects.create(user=user, name=nombre, subdomain=f'buscar-{i}', ciudad=ciudad)
+            for servicio in servicios:
+                Service.objects.create(tenant=negocio, nombre=servicio, precio=20000, duracion=30)
+            Professional.objects.create(tenant=negocio, nombre='Pro', especialidad=especialidad)
+            cls.negocios[nombre] = negocio
+
+    def setUp(self):
+        # LocMem en vez de la tabla: así buscar no hace ninguna consulta SQL, como con Redis
+        compartida = LocMemCache('compartida-busqueda', {})
+        compartida.clear()
+        parche = mock.patch.object(busqueda, '_compartida', return_value=compartida)
+        parche.start()
+        self.addCleanup(parche.stop)
+        busqueda.invalidar()
+        self.addCleanup(busqueda.invalidar)
+
+    def nombres(self, texto):
+        return [n['name'] for n in busqueda.buscar(texto)]
+
+    def test_sin_tildes_ni_mayusculas(self):
+        self.assertEqual(self.nombres('PELUQUERIA'), ['Peluquería Ñuñoa'])
+        self.assertEqual(self.nombres('nunoa'), ['Peluquería Ñuñoa'])
+        self.assertEqual(self.nombres('bogota'), ['Barbería del Norte'])
+        self.assertEqual(self.nombres('uñas'), ['Estética Rosa'])  # Plural y singular coinciden
+
+    def test_todas_las_palabras_y_orden_por_puntaje(self):
+        # "de" es palabra vacía; Bogotá no está en Tunja y Estética Rosa no hace barba
+        resultado = self.nombres('corte de barba Tunja')
+        self.assertEqual(set(resultado), {'Peluquería Ñuñoa', 'Barbería Central'})
+        # Los dos tienen corte y barba como servicios ("Barbas" cuenta como "barba"): desempata el nombre
+        self.assertEqual(resultado, sorted(resultado))
+        self.assertEqual(self.nombres('barberia'), ['Barbería Central', 'Barbería del Norte', 'Peluquería Ñuñoa'])
+        self.assertEqual(self.nombres('manicura'), [])
+        self.assertEqual(self.nombres('de la'), [])
+
+    def test_autocompletar_ultima_palabra(self):
+        self.assertEqual(set(self.nombres('tunja barb')), {'Peluquería Ñuñoa', 'Barbería Central'})
+        self.assertEqual(self.nombres('esteti'), ['Estética Rosa'])
+        self.assertEqual(busqueda.sugerir('corte barb'), ['barba', 'barbería'])  # Empate: orden alfabético
+        # La palabra exacta vale más que la que solo empieza igual
+        exacta, prefijo = busqueda.buscar('barba')[0], busqueda.buscar('barb')[0]
+        self.assertGreater(exacta['puntaje'], prefijo['puntaje'])
+
+    def test_reindexa_solo_el_negocio_que_cambia(self):
+        indice = busqueda.indice()
+        rosa = self.negocios['Estética Rosa']
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.create(tenant=rosa, nombre='Keratina', precio=90000, duracion=90)
+        self.assertEqual(self.nombres('keratina'), ['Estética Rosa'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rosa.name = 'Spa Rosa'
+            rosa.save()
+        self.assertEqual(self.nombres('spa'), ['Spa Rosa'])
+        self.assertEqual(self.nombres('estetica'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rosa.services.filter(nombre='Keratina').delete()
+        self.assertEqual(self.nombres('keratina'), [])
+        self.assertEqual(busqueda.sugerir('kera'), [])
+        self.assertEqual(busqueda.indice().creado, indice.creado)  # Copias del mismo índice, sin reconstruir
+
+    def test_indice_publicado_no_cambia(self):
+        indice = busqueda.indice()
+        rosa = self.negocios['Estética Rosa']
+        with self.captureOnCommitCallbacks(execute=True):
+            rosa.delete()
+        # Quien ya tenía el índice (p. ej. una búsqueda en otro hilo) sigue viendo el anterior entero
+        self.assertEqual([n['name'] for n in indice.buscar('esteti', 5)], ['Estética Rosa'])
+        self.assertEqual(indice.sugerir('unas manicur', 5), ['manicurista'])
+        self.assertEqual(self.nombres('esteti'), [])
+
+    def test_cambios_de_otro_proceso(self):
+        indice = busqueda.indice()
+        central = self.negocios['Barbería Central']
+        # El cambio ocurre en otro worker: este proceso no tiene índice mientras tanto
+        busqueda.invalidar()
+        with self.captureOnCommitCallbacks(execute=True):
+            central.name = 'Barbería Plaza'
+            central.save()
+        busqueda._indice = indice
+
+        with self.assertNumQueries(3):  # Solo los datos de ese negocio
+            self.assertEqual(self.nombres('plaza'), ['Barbería Plaza'])
+        self.assertEqual(busqueda.indice().creado, indice.creado)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.nombres('central'), [])
+
+        # Si falta un enlace (venció), se reconstruye completo
+        busqueda._indice = indice
+        busqueda._compartida().delete(busqueda._clave_cambio(indice.version))
+        self.assertEqual(self.nombres('plaza'), ['Barbería Plaza'])
+        self.assertNotEqual(busqueda.indice().creado, indice.creado)
+
+    def test_buscar_no_consulta_la_base(self):
+        busqueda.indice()
+        with self.assertNumQueries(0):
+            busqueda.buscar('corte tunja')
+            busqueda.sugerir('cor')
+
+    def test_reconstruye_al_vencer(self):
+        indice = busqueda.indice()
+        with self.settings(BUSQUEDA_INDICE_SEGUNDOS=0):
+            self.assertIsNot(busqueda.indice(), indice)
+
+    def test_endpoint(self):
+        url = reverse('buscar_negocios')
+        datos = self.client.get(url, {'q': 'barberia tun', 'limite': 1}).json()
+        self.assertEqual(len(datos['resultados']), 1)
+        self.assertEqual(datos['resultados'][0]['nombre'], 'Barbería Central')
+        self.assertTrue(datos['resultados'][0]['url'].startswith('/reservar/buscar-'))
+        self.assertEqual(datos['sugerencias'], ['tunja'])
+        self.assertEqual(self.client.get(url, {'q': ''}).json(), {'resultados': [], 'sugerencias': []})
+        self.assertEqual(self.client.get(url, {'q': 'x', 'limite': 'y'}).status_code, 400)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Trigramas solo en PostgreSQL')
+    def test_motor_trigramas(self):
+        with self.settings(BUSQUEDA_MOTOR='trigramas'):
+            self.assertIn('Barbería Central', self.nombres('barbería tunja'))
+
+
+class AgendaPaginadaTests(DatosSalonMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.hoy = timezone.now().astimezone(ZONA_CO).date()
+        self.ana, self.luis = self.crear_profesional('Ana'), self.crear_profesional('Luis')
+        # Mismas horas para los dos: el id desempata el orden entre páginas
+        for dia in (-1, 0, 2):
+            for hora in (9, 10, 11):
+                for pro in (self.ana, self.luis):
+                    self.crear_cita(pro, self.en_bogota(self.hoy + timedelta(days=dia), hora), 45)
+        self.client.force_login(self.user)
+
+    def json(self, **parametros):
+        return self.client.get(reverse('mi_agenda_json'), parametros)
+
+    def recorrer(self, **parametros):
+        ids, cursor = [], None
+        while True:
+            datos = self.json(**parametros, **({'cursor': cursor} if cursor else {})).json()
+            ids += [cita['id'] for cita in datos['citas']]
+            cursor = datos['siguiente']
+            if not cursor:
+                return ids
+
+    def test_cursor_recorre_la_ventana_sin_repetir(self):
+        ids = self.recorrer(limite=4)
+        esperados = list(Appointment.objects.order_by('fecha_hora_inicio', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, esperados)
+
+        self.assertEqual(len(self.recorrer(limite=4, profesional=self.ana.id)), 9)
+        Appointment.objects.filter(empleado=self.luis).update(estado='cancelada')
+        self.assertEqual(len(self.recorrer(estado='cancelada')), 9)
+        self.assertEqual(self.json(cursor='no-es-un-cursor').status_code, 400)
+
+    def test_costo_no_depende_del_historial(self):
+        with self.assertNumQueries(4):  # sesión, usuario, negocio, página (con servicio y profesional)
+            primera = self.json(limite=4).json()
+        self.assertEqual(primera['citas'][0]['servicio'], 'Corte')
+
+        # Años de historial fuera de la ventana no cambian nada
+        viejas = [Appointment(tenant=self.tenant, servicio=self.servicio, empleado=self.ana,
+                              fecha_hora_inicio=self.en_bogota(self.hoy - timedelta(days=30 + i), 9),
+                              fecha_hora_fin=self.en_bogota(self.hoy - timedelta(days=30 + i), 10),
+                              cliente_nombre='Viejo', cliente_telefono='1', precio_total=1, estado='completada')
+                  for i in range(300)]
+        Appointment.objects.bulk_create(viejas)
+        with self.assertNumQueries(4):
+            segunda = self.json(limite=4, cursor=primera['siguiente']).json()
+        self.assertNotIn('Viejo', [cita['cliente_nombre'] for cita in segunda['citas']])
+        self.assertEqual(len(self.recorrer()), 18)  # hoy ± agenda.DIAS_VENTANA
+
+        desde = (self.hoy - timedelta(days=31)).isoformat()
+        self.assertEqual(len(self.recorrer(desde=desde, hasta=desde)), 1)
+
+    def test_profesional_ve_solo_sus_citas(self):
+        self.luis.user = User.objects.create_user(username='luis', password='x')
+        self.luis.save()
+        self.client.force_login(self.luis.user)
+        respuesta = self.client.get(reverse('mi_agenda'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTemplateUsed(respuesta, 'salon/base.html')
+        self.assertContains(respuesta, reverse('logout'))
+        self.assertContains(respuesta, reverse('agendar_cita', args=[self.tenant.subdomain]))
+        self.assertEqual({cita.empleado_id for cita in respuesta.context['citas']}, {self.luis.id})
+        self.assertEqual(len(self.recorrer(profesional=self.ana.id)), 0)
+
+
+class ResumenDiarioTests(DatosSalonMixin, TestCase):
+
+    def resumen(self):
+        return {(r.fecha, r.estado): (r.citas, r.ingresos, r.minutos)
+                for r in DailyRollup.objects.filter(tenant=self.tenant) if r.citas}
+
+    def test_se_mantiene_al_crear_cambiar_y_borrar(self):
+        pro = self.crear_profesional()
+        a = self.crear_cita(pro, self.en_bogota(self.FECHA, 9), 45)
+        self.crear_cita(pro, self.en_bogota(self.FECHA, 10), 60)
+        self.assertEqual(self.resumen(), {(self.FECHA, 'confirmada'): (2, 40000, 105)})
+
+        a.estado = 'cancelada'
+        a.save()
+        self.assertEqual(self.resumen(), {(self.FECHA, 'confirmada'): (1, 20000, 60),
+                                          (self.FECHA, 'cancelada'): (1, 20000, 45)})
+        # Guardar sin cambios no toca el resumen
+        with self.assertNumQueries(2):  # snapshot previo + UPDATE
+            a.save()
+
+        # Se cuenta en el día de Colombia, no en UTC (20:00 Bogotá = 01:00 UTC del día siguiente)
+        a.fecha_hora_inicio, a.fecha_hora_fin = self.en_bogota(self.FECHA, 20), self.en_bogota(self.FECHA, 20, 45)
+        a.save()
+        a.delete()
+        self.assertEqual(self.resumen(), {(self.FECHA, 'confirmada'): (1, 20000, 60)})
+
+    def test_borrar_en_cascada_no_recrea_filas(self):
+        # Las llaves foráneas se verifican al confirmar: check_constraints hace esa verificación aquí
+        ana, luis = self.crear_profesional('Ana'), self.crear_profesional('Luis')
+        self.crear_cita(ana, self.en_bogota(self.FECHA, 9), 45)
+        self.crear_cita(luis, self.en_bogota(self.FECHA, 9), 45)
+        self.crear_cita(luis, self.en_bogota(self.FECHA, 11), 45, estado='cancelada')
+
+        ana.delete()
+        connection.check_constraints()
+        self.assertFalse(DailyRollup.objects.filter(empleado_id=ana.id).exists())
+        self.assertEqual(self.resumen(), {(self.FECHA, 'confirmada'): (1, 20000, 45),
+                                          (self.FECHA, 'cancelada'): (1, 20000, 45)})
+
+        self.tenant.delete()
+        connection.check_constraints()
+        self.assertFalse(DailyRollup.objects.exists())
+
+    def test_lote_archivo_y_reconstruccion(self):
+        pro = self.crear_profesional()
+        hace = lambda dias: timezone.now() - timedelta(days=dias)
+        self.crear_cita(pro, hace(400), 45, estado='completada')
+        self.crear_cita(pro, hace(300), 30, estado='cancelada')
+        url = reverse('api_crear_citas_lote', args=[self.tenant.subdomain])
+        citas = [{'servicio_id': self.servicio.id, 'empleado_id': pro.id, 'fecha': self.FECHA.isoformat(),
+                  'hora_inicio': hora} for hora in ('09:00', '10:00')]
+        self.client.post(url, json.dumps({'citas': citas}), content_type='application/json',
+                         HTTP_X_API_KEY=settings.API_SECRET_KEY)
+        incremental = self.resumen()
+        self.assertEqual(incremental[(self.FECHA, 'confirmada')], (2, 40000, 90))
+
+        # Archivar no resta: el resumen conserva la historia
+        call_command('archivar_citas', dias=180, stdout=StringIO())
+        self.assertEqual(self.resumen(), incremental)
+
+        DailyRollup.objects.all().delete()
+        call_command('reconstruir_resumen', dias_por_lote=7, stdout=StringIO())
+        self.assertEqual(self.resumen(), incremental)
+
+    def test_panel_lee_totales_en_una_consulta(self):
+        pro = self.crear_profesional()
+        lunes = self.FECHA  # 2 de marzo de 2026
+        self.crear_cita(pro, self.en_bogota(lunes, 9), 45)
+        self.crear_cita(pro, self.en_bogota(lunes + timedelta(days=3), 9), 45)
+        self.crear_cita(pro, self.en_bogota(lunes + timedelta(days=10), 9), 45, estado='cancelada')
+        self.crear_cita(pro, self.en_bogota(date(2026, 2, 27), 9), 45)  # Mes anterior
+
+        with self.assertNumQueries(1):
+            totales = resumen_diario.totales_panel(self.tenant, lunes)
+        self.assertEqual(totales['hoy'], {'citas': 1, 'ingresos': 20000, 'minutos': 45, 'canceladas': 0})
+        self.assertEqual(totales['semana']['citas'], 2)
+        self.assertEqual(totales['mes'], {'citas': 2, 'ingresos': 40000, 'minutos': 90, 'canceladas': 1})
+
+
+class ParticionesTests(SimpleTestCase):
+
+    def test_meses_cruzan_el_anio(self):
+        self.assertEqual(particiones.meses(date(2026, 11, 18), 3), [date(2026, 11, 1), date(2026, 12, 1), date(2027, 1, 1)])
+        self.assertEqual(particiones.nombre_particion(date(2027, 1, 1)), 'salon_appointment_p202701')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requiere PostgreSQL (particionado declarativo)')
+class ParticionadoPostgresTests(DatosSalonMixin, TestCase):
+
+    def test_convierte_sin_perder_citas_y_poda_particiones(self):
+        pro = self.crear_profesional()
+        ahora = timezone.now().astimezone(ZONA_CO).replace(minute=0, second=0, microsecond=0)
+        antigua = self.crear_cita(pro, ahora - timedelta(days=400), 45)
+        proxima = self.crear_cita(pro, ahora + timedelta(days=1), 45)
+
+        call_command('particionar_citas', meses=3, stdout=StringIO())
+        with connection.cursor() as cursor:
+            self.assertTrue(particiones.esta_particionada(cursor))
+            cursor.execute('SELECT tableoid::regclass::text FROM salon_appointment WHERE id = %s', [proxima.id])
+            self.assertEqual(cursor.fetchone()[0], particiones.nombre_particion((ahora + timedelta(days=1)).date()))
+
+        self.assertEqual(set(Appointment.objects.values_list('id', flat=True)), {antigua.id, proxima.id})
+        nueva = self.crear_cita(pro, ahora + timedelta(days=2), 45)
+        self.assertGreater(nueva.id, proxima.id)
+        with self.assertRaisesMessage(ValueError, 'HORARIO_OCUPADO'):
+            BookingManager.ejecutar_reserva_segura(
+                pro.id, lambda empleado: self.crear_cita(empleado, ahora + timedelta(days=2, minutes=15), 45))
+
+        # El chequeo de choques solo abre la partición del mes consultado
+        with CaptureQueriesContext(connection) as capturadas:
+            verificar_conflicto_atomic(pro, ahora + timedelta(days=1), ahora + timedelta(days=1, hours=1))
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {capturadas.captured_queries[0]['sql']}")
+            plan = '\n'.join(fila[0] for fila in cursor.fetchall())
+        self.assertNotIn(particiones.HISTORICO, plan)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requiere PostgreSQL (restricción de exclusión)')
+class ReservasConcurrentesTests(DatosSalonMixin, TransactionTestCase):
+
+    def setUp(self):
+        type(self).setUpTestData()  # antes del setUp del mixin, que ya usa self.tenant
+        super().setUp()
+        self.pro = self.crear_profesional()
+
+    def en_hilo(self, funcion, *args):
+        def correr():
+            try:
+                funcion(*args)
+            finally:
+                connection.close()
+        hilo = threading.Thread(target=correr)
+        hilo.start()
+        return hilo
+
+    def reservar(self, hora, antes_de_confirmar=None, al_empezar=None, fecha=None):
+        inicio = self.en_bogota(fecha or self.FECHA, hora)
+
+        def crear(empleado):
+            if al_empezar:
+                al_empezar()
+            if verificar_conflicto_atomic(empleado, inicio, inicio + timedelta(minutes=45)):
+                raise ValueError('HORARIO_OCUPADO')
+            cita = self.crear_cita(empleado, inicio, 45)
+            if antes_de_confirmar:
+                antes_de_confirmar()
+            return cita
+
+        return BookingManager.ejecutar_reserva_segura(self.pro.id, crear)
+
+    def test_reservas_paralelas_sin_doble_reserva(self):
+        # Todos pasan la verificación previa a la vez: solo la restricción puede frenarlos
+        barrera = threading.Barrier(8, timeout=10)
+        resultados = []
+
+        def intentar():
+            try:
+                resultados.append(self.reservar(10, al_empezar=barrera.wait))
+            except (ValueError, threading.BrokenBarrierError):
+                resultados.append(None)
+
+        hilos = [self.en_hilo(intentar) for _ in range(8)]
+        for hilo in hilos:
+            hilo.join(timeout=10)
+
+        self.assertEqual(Appointment.objects.filter(empleado=self.pro).count(), 1)
+        self.assertEqual(sum(1 for r in resultados if r), 1)
+
+    def test_horarios_distintos_no_se_esperan(self):
+        retenida, liberar = threading.Event(), threading.Event()
+
+        def retener():
+            retenida.set()
+            liberar.wait(timeout=10)
+
+        primera = self.en_hilo(self.reservar, 9, retener)
+        self.assertTrue(retenida.wait(timeout=5))
+        try:
+            # Con bloqueo de fila esta reserva quedaría esperando a que confirme la primera
+            segunda = self.en_hilo(self.reservar, 14)
+            segunda.join(timeout=3)
+            self.assertFalse(segunda.is_alive())
+        finally:
+            liberar.set()
+            primera.join(timeout=10)
+        self.assertEqual(Appointment.objects.filter(empleado=self.pro).count(), 2)
+
+    def test_lote_espera_a_la_reserva_individual(self):
+        retenida, liberar = threading.Event(), threading.Event()
+        resultado = {}
+
+        def retener():
+            retenida.set()
+            liberar.wait(timeout=10)
+
+        def lote():
+            def crear(empleados):
+                inicio = self.en_bogota(self.FECHA, 9)
+                if verificar_conflicto_atomic(empleados[self.pro.id], inicio, inicio + timedelta(minutes=45)):
+                    raise ValueError('HORARIO_OCUPADO')
+                return self.crear_cita(empleados[self.pro.id], inicio, 45)
+            try:
+                resultado['lote'] = BookingManager.ejecutar_reservas_en_lote([self.pro.id], crear)
+            except ValueError as e:
+                resultado['lote'] = str(e)
+
+        # La reserva individual ya tiene al profesional y aún no verifica
+        primera = self.en_hilo(self.reservar, 9, None, retener)
+        self.assertTrue(retenida.wait(timeout=5))
+        try:
+            segundo = self.en_hilo(lote)
+            segundo.join(timeout=1)
+            self.assertTrue(segundo.is_alive())
+        finally:
+            liberar.set()
+            primera.join(timeout=10)
+        segundo.join(timeout=10)
+        # El lote verificó después de la reserva: la ve y no choca con la restricción
+        self.assertEqual(resultado['lote'], 'HORARIO_OCUPADO')
+        self.assertEqual(Appointment.objects.filter(empleado=self.pro).count(), 1)
+
+    def apartar(self, hora, al_empezar=None):
+        inicio = self.en_bogota(self.FECHA, hora)
+
+        def crear(empleado):
+            if al_empezar:
+                al_empezar()
+            if verificar_conflicto_atomic(empleado, inicio, inicio + timedelta(minutes=45)):
+                raise ValueError('HORARIO_OCUPADO')
+            return SlotHold.objects.create(tenant=self.tenant, empleado=empleado, servicio=self.servicio, inicio=inicio,
+                                           fin=inicio + timedelta(minutes=45), expira=timezone.now() + timedelta(minutes=5))
+
+        return BookingManager.ejecutar_apartado_seguro(self.pro.id, crear)
+
+    def test_apartados_y_reservas_se_esperan(self):
+        # La restricción no cubre apartados: sin bloqueo los tres pasarían la verificación
+        retenido, liberar = threading.Event(), threading.Event()
+        rechazados = []
+
+        def retener():
+            retenido.set()
+            liberar.wait(timeout=10)
+
+        def intentar(funcion):
+            try:
+                funcion(10)
+            except ValueError:
+                rechazados.append(funcion.__name__)
+
+        primero = self.en_hilo(self.apartar, 10, retener)
+        self.assertTrue(retenido.wait(timeout=5))
+        try:
+            otros = [self.en_hilo(intentar, self.apartar), self.en_hilo(intentar, self.reservar)]
+            for hilo in otros:
+                hilo.join(timeout=1)
+                self.assertTrue(hilo.is_alive())
+        finally:
+            liberar.set()
+            primero.join(timeout=10)
+        for hilo in otros:
+            hilo.join(timeout=10)
+
+        self.assertEqual(sorted(rechazados), ['apartar', 'reservar'])
+        self.assertEqual(SlotHold.objects.filter(empleado=self.pro).count(), 1)
+        self.assertFalse(Appointment.objects.filter(empleado=self.pro).exists())
+
+    def test_huecos_no_pierden_escrituras_concurrentes(self):
+        call_command('reconstruir_huecos', self.tenant.subdomain, dias=3, stdout=StringIO())
+        self.tenant.refresh_from_db()
+        manana = huecos.hoy() + timedelta(days=1)
+        # Todas parten el mismo hueco de la mañana o de la tarde a la vez
+        barrera = threading.Barrier(6, timeout=10)
+
+        def intentar(hora):
+            try:
+                self.reservar(hora, al_empezar=barrera.wait, fecha=manana)
+            except threading.BrokenBarrierError:
+                pass
+
+        hilos = [self.en_hilo(intentar, hora) for hora in (8, 9, 10, 14, 15, 16)]
+        for hilo in hilos:
+            hilo.join(timeout=10)
+
+        self.assertEqual(Appointment.objects.filter(empleado=self.pro).count(), 6)
+        for duracion in (30, 45):
+            self.assertEqual(
+                huecos.disponibilidad_materializada([self.pro], manana, manana, duracion),
+                obtener_disponibilidad_rango([self.pro], manana, manana, duracion),
+            )
+
+
+SCRIPT_ESTRES_SQLITE = """
+import json, os, random, sys
+from datetime import datetime, timedelta
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'salon_project.settings')
+django.setup()
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
+from salon.models import Tenant, Professional, Service, Appointment
+from salon.services import ZONA_CO, verificar_conflicto_atomic
+from salon.utils.booking_lock import BookingManager
+
+if sys.argv[1] == 'preparar':
+    user = User.objects.create_user(username='estres')
+    tenant = Tenant.objects.create(user=user, name='Estrés', subdomain='estres')
+    Service.objects.create(tenant=tenant, nombre='Corte', precio=1, duracion=60)
+    Professional.objects.create(tenant=tenant, nombre='Ana')
+    print(json.dumps({'journal_mode': connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]}))
+
+elif sys.argv[1] == 'reservar':
+    servicio, pro = Service.objects.get(), Professional.objects.get()
+    base = datetime(2026, 3, 2, 8, tzinfo=ZONA_CO)
+    inicios = [base + timedelta(minutes=30 * i) for i in range(16)]
+    random.Random(sys.argv[2]).shuffle(inicios)
+    conteo = {'ok': 0, 'ocupado': 0, 'error': 0}
+    for inicio in inicios:
+        fin = inicio + timedelta(minutes=servicio.duracion)
+        def crear(empleado):
+            if verificar_conflicto_atomic(empleado, inicio, fin):
+                raise ValueError('HORARIO_OCUPADO')
+            return Appointment.objects.create(
+                tenant=servicio.tenant, servicio=servicio, empleado=empleado, fecha_hora_inicio=inicio,
+                fecha_hora_fin=fin, cliente_nombre='x', cliente_telefono='1', precio_total=1, estado='confirmada')
+        try:
+            BookingManager.ejecutar_reserva_segura(pro.id, crear)
+            conteo['ok'] += 1
+        except ValueError:
+            conteo['ocupado'] += 1
+        except Exception as e:
+            conteo['error'] += 1
+            print(repr(e), file=sys.stderr)
+    print(json.dumps(conteo))
+
+elif sys.argv[1] == 'verificar':
+    citas = list(Appointment.objects.order_by('fecha_hora_inicio').values_list('fecha_hora_inicio', 'fecha_hora_fin'))
+    solapes = sum(1 for a, b in zip(citas, citas[1:]) if b[0] < a[1])
+    print(json.dumps({'citas': len(citas), 'solapes': solapes}))
+"""
+
+
+class SQLiteConcurrenciaTests(SimpleTestCase):
+    """Varios procesos reservando contra el mismo archivo SQLite (modo WAL + BEGIN IMMEDIATE)."""
+
+    PROCESOS = 6
+
+    def correr(self, env, *args):
+        salida = subprocess.run([sys.executable, '-c', SCRIPT_ESTRES_SQLITE, *args], cwd=settings.BASE_DIR,
+                                env=env, check=True, capture_output=True, text=True)
+        return json.loads(salida.stdout.strip().splitlines()[-1])
+
+    def test_estres_multiproceso_sin_dobles_reservas(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, 'DATABASE_URL': f'sqlite:///{tmp}/estres.sqlite3'}
+            subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=settings.BASE_DIR,
+                           env=env, check=True)
+            self.assertEqual(self.correr(env, 'preparar')['journal_mode'], 'wal')
+
+            procesos = [
+                subprocess.Popen([sys.executable, '-c', SCRIPT_ESTRES_SQLITE, 'reservar', str(i)],
+                                 cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, text=True)
+                for i in range(self.PROCESOS)
+            ]
+            conteos = [json.loads(p.communicate(timeout=120)[0].strip().splitlines()[-1]) for p in procesos]
+
+            self.assertEqual(sum(c['error'] for c in conteos), 0)  # ningún "database is locked"
+            self.assertEqual(sum(c['ok'] + c['ocupado'] for c in conteos), 16 * self.PROCESOS)
+            final = self.correr(env, 'verificar')
+            self.assertEqual(final['solapes'], 0)
+            self.assertEqual(final['citas'], sum(c['ok'] for c in conteos))
+
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Espera de bloqueo de SQLite')
+class SQLiteEsperaReservasTests(DatosSalonMixin, TransactionTestCase):
+
+    def setUp(self):
+        type(self).setUpTestData()
+        super().setUp()
+        self.pro = self.crear_profesional()
+
+    def test_sqlite_reserva_con_espera_corta(self):
+        def busy_timeout():
+            with connection.cursor() as cursor:
+                return cursor.execute('PRAGMA busy_timeout').fetchone()[0]
+
+        general = busy_timeout()
+        with self.settings(SQLITE_TIMEOUT_RESERVAS=0.5):
+            self.assertEqual(BookingManager.ejecutar_reserva_segura(self.pro.id, lambda empleado: busy_timeout()), 500)
+        self.assertEqual(busy_timeout(), general)
+        # Los reintentos completos caben en el timeout del worker
+        self.assertLess(booking_lock.REINTENTOS_SQLITE * settings.SQLITE_TIMEOUT_RESERVAS, 30)
+
+SCRIPT_REPLICA = """
+import json, os
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'salon_project.settings')
+django.setup()
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import Client
+from salon.models import Tenant, Professional, Service
+from salon.utils import cache_tenants
+
+# Fuera de una petición todo va a la primaria: la réplica (otro archivo) queda vacía
+tenant = Tenant.objects.create(user=User.objects.create_user(username='replica'), name='Réplica', subdomain='replica')
+servicio = Service.objects.create(tenant=tenant, nombre='Corte', precio=1, duracion=60)
+pro = Professional.objects.create(tenant=tenant, nombre='Ana')
+
+api = {'HTTP_X_API_KEY': settings.API_SECRET_KEY}
+# El negocio (cache_tenants) y el catálogo (cuerpo cacheado) se llenan desde la primaria
+resultado = {'catalogo': Client().get('/api/v1/replica/servicios/', **api).json()[0]['nombre']}
+# El servicio de proximos no se cachea: se lee de la réplica
+url = f'/api/v1/replica/proximos/?service_id={servicio.id}'
+resultado['get_antes'] = Client().get(url, **api).status_code
+
+cliente = Client()
+respuesta = cliente.post('/api/v1/replica/apartados/', json.dumps(
+    {'servicio_id': servicio.id, 'empleado_id': pro.id, 'fecha': '2030-03-04', 'hora_inicio': '09:00'}
+), content_type='application/json', **api)
+resultado['post'] = respuesta.status_code
+resultado['cookie'] = 'fijar_primaria' in respuesta.cookies
+
+cache_tenants.invalidar()
+resultado['get_mismo_cliente'] = cliente.get(url, **api).status_code
+cache_tenants.invalidar()
+resultado['get_otro_cliente'] = Client().get(url, **api).status_code
+print(json.dumps(resultado))
+"""
+
+
+class ReplicaLecturaTests(SimpleTestCase):
+    """RouterReplica: reglas de enrutamiento y una prueba completa con dos archivos SQLite."""
+
+    def setUp(self):
+        self.router = replicas.RouterReplica()
+        patcher = mock.patch.object(replicas, 'alias_replica', return_value='replica')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(replicas._estado.reset, replicas._estado.set(None))
+
+    def en_peticion(self, metodo, **cookies):
+        request = getattr(RequestFactory(), metodo.lower())('/')
+        request.COOKIES.update(cookies)
+        return replicas.iniciar_peticion(request)
+
+    def test_get_lee_de_la_replica_hasta_que_escribe(self):
+        token = self.en_peticion('GET')
+        self.assertEqual(self.router.db_for_read(Tenant), 'replica')
+        self.assertEqual(self.router.db_for_write(Tenant), 'default')
+        # Read-your-writes: lo que sigue en la petición ya no lee de la réplica
+        self.assertEqual(self.router.db_for_read(Tenant), 'default')
+        self.assertTrue(replicas.terminar_peticion(token))
+
+    def test_escrituras_y_transacciones_en_la_primaria(self):
+        self.en_peticion('POST')
+        self.assertEqual(self.router.db_for_read(Tenant), 'default')
+        self.en_peticion('GET')
+        with mock.patch.object(connection, 'in_atomic_block', True):  # reserva en curso
+            self.assertEqual(self.router.db_for_read(Tenant), 'default')
+
+    def test_llenar_caches_lee_de_la_primaria(self):
+        self.en_peticion('GET')
+        with replicas.primaria():
+            self.assertEqual(self.router.db_for_read(Tenant), 'default')
+        self.assertEqual(self.router.db_for_read(Tenant), 'replica')
+
+    def test_cliente_fijado_y_fuera_de_peticion(self):
+        self.assertEqual(self.router.db_for_read(Tenant), 'default')  # comandos, shell
+        self.en_peticion('GET', **{replicas.REPLICA_COOKIE: '1'})
+        self.assertEqual(self.router.db_for_read(Tenant), 'default')
+
+    def test_dos_archivos_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, 'DATABASE_URL': f'sqlite:///{tmp}/primaria.sqlite3',
+                   'REPLICA_DATABASE_URL': f'sqlite:///{tmp}/replica.sqlite3'}
+            for alias in ('default', 'replica'):
+                subprocess.run([sys.executable, 'manage.py', 'migrate', '--database', alias, '-v', '0'],
+                               cwd=settings.BASE_DIR, env=env, check=True)
+            salida = subprocess.run([sys.executable, '-c', SCRIPT_REPLICA], cwd=settings.BASE_DIR,
+                                    env=env, check=True, capture_output=True, text=True)
+        resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+        self.assertEqual(resultado, {
+            'catalogo': 'Corte',
+            'get_antes': 404,          # el GET leyó de la réplica, que no tiene el servicio
+            'post': 201, 'cookie': True,
+            'get_mismo_cliente': 200,  # quien escribió lee de la primaria unos segundos
+            'get_otro_cliente': 404,
+        })
+
+
+class PlanesDeConsultaTests(DatosSalonMixin, TestCase):
+    """
+    Corre las consultas calientes reales, captura su SQL y revisa el EXPLAIN: ninguna
+    puede recorrer completa una tabla de agenda. En PostgreSQL se desactiva el seq scan
+    para que el plan muestre si existe un índice utilizable aun con pocos datos.
+    """
+
+    TABLAS_AGENDA = ('salon_appointment', 'salon_absence', 'salon_slothold', 'salon_freeslot', 'salon_dailyrollup')
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.pros = [cls.crear_profesional(f'Pro {i}') for i in range(5)]
+        estados = ['confirmada', 'pendiente', 'cancelada', 'completada']
+        citas, ausencias = [], []
+        for dia in range(60):
+            fecha = cls.FECHA + timedelta(days=dia - 30)
+            for i, pro in enumerate(cls.pros):
+                for hora in range(8, 18):
+                    inicio = cls.en_bogota(fecha, hora)
+                    citas.append(Appointment(
+                        tenant=cls.tenant, servicio=cls.servicio, empleado=pro, fecha_hora_inicio=inicio,
+                        fecha_hora_fin=inicio + timedelta(minutes=45), cliente_nombre='Cliente',
+                        cliente_telefono='300', precio_total=20000, estado=estados[(dia + i + hora) % 4],
+                    ))
+                ausencias.append(Absence(professional=pro, fecha_inicio=cls.en_bogota(fecha, 12),
+                                         fecha_fin=cls.en_bogota(fecha, 13), motivo='Almuerzo'))
+        Appointment.objects.bulk_create(citas)
+        Absence.objects.bulk_create(ausencias)
+        resumen_diario.reconstruir(cls.FECHA - timedelta(days=30), cls.FECHA + timedelta(days=30))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def planes(self, funcion):
+        """[(sql, plan)] de cada SELECT sobre tablas de agenda que ejecuta `funcion`."""
+        with CaptureQueriesContext(connection) as capturadas:
+            funcion()
+        resultado = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            for consulta in capturadas.captured_queries:
+                sql = consulta['sql']
+                if not sql.startswith('SELECT') or not any(f'FROM "{t}"' in sql for t in self.TABLAS_AGENDA):
+                    continue
+                if connection.vendor == 'postgresql':
+                    cursor.execute(f'EXPLAIN {sql}')
+                    plan = '\n'.join(fila[0] for fila in cursor.fetchall())
+                else:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plan = '\n'.join(fila[-1] for fila in cursor.fetchall())
+                resultado.append((sql, plan))
+        return resultado
+
+    def assertSinRecorridoCompleto(self, funcion):
+        planes = self.planes(funcion)
+        self.assertTrue(planes, 'No se capturó ninguna consulta de agenda')
+        for sql, plan in planes:
+            recorridos = [linea for linea in plan.splitlines()
+                          if ('Seq Scan' in linea or linea.strip().startswith('SCAN '))
+                          and any(t in linea for t in self.TABLAS_AGENDA)]
+            self.assertFalse(recorridos, f'Recorrido completo en:\n{sql}\n{plan}')
+
+    def test_verificar_conflicto(self):
+        pro = self.pros[0]
+        self.assertSinRecorridoCompleto(lambda: verificar_conflicto_atomic(
+            pro, self.en_bogota(self.FECHA, 9), self.en_bogota(self.FECHA, 10), excluir_apartado=1))
+
+    def test_disponibilidad_y_bloques(self):
+        self.assertSinRecorridoCompleto(lambda: obtener_bloques_disponibles(self.pros[0], self.FECHA, 45))
+        self.assertSinRecorridoCompleto(
+            lambda: obtener_disponibilidad_rango(self.pros, self.FECHA, self.FECHA + timedelta(days=6), 45))
+
+    def test_panel_y_agenda_del_negocio(self):
+        def solo_evaluar(request, plantilla, contexto):
+            # Sin plantillas: solo importan las consultas que arma la vista
+            return HttpResponse(len(list(contexto.get('appointments', contexto.get('citas')))))
+
+        self.client.force_login(self.user)
+        with mock.patch('salon.views.render', solo_evaluar):
+            self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('panel_negocio')))
+            self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('mi_agenda')))
+        self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('mi_agenda_json'), {
+            'desde': self.FECHA.isoformat(), 'hasta': self.FECHA.isoformat(), 'profesional': self.pros[0].id}))
+
+    def test_huecos_y_limpieza_de_apartados(self):
+        self.assertSinRecorridoCompleto(
+            lambda: huecos.disponibilidad_materializada(self.pros, self.FECHA, self.FECHA + timedelta(days=6), 45))
+        self.assertSinRecorridoCompleto(lambda: call_command('limpiar_apartados', stdout=StringIO()))
@@ -1,10 +1,12 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 urlpatterns = [
     # --- Landing y Accesos Públicos ---
     path('', views.landing_saas_view, name='landing_negocio'),
     path('negocios/', views.landing_saas_view, name='landing_negocio_alt'),
+    path('negocios/cerca/', views.negocios_cercanos, name='negocios_cercanos'),
+    path('negocios/buscar/', views.buscar_negocios, name='buscar_negocios'),
     path('reservar/<slug:slug>/', views.booking_page, name='agendar_cita'),
     path('confirmacion/<int:cita_id>/', views.confirmation_view, name='confirmacion_reserva'),
 
@@ -16,6 +18,7 @@ urlpatterns = [
 
     # --- Gestión de Agenda y Empleados ---
     path('mi-agenda/', views.client_agenda, name='mi_agenda'),
+    path('mi-agenda/json/', views.client_agenda_json, name='mi_agenda_json'),
     path('ausencias/', views.manage_absences, name='mis_ausencias'),
     path('eliminar-ausencia/<int:absence_id>/', views.delete_absence, name='eliminar_ausencia'),
 
@@ -25,4 +28,15 @@ urlpatterns = [
     
     # --- Crear Negocio (Onboarding) ---
     path('crear-negocio/', views.create_tenant_view, name='crear_negocio'),
+
+    # --- API para la app móvil ---
+    path('api/v1/<slug:slug_peluqueria>/servicios/', api.listar_servicios, name='api_servicios'),
+    path('api/v1/<slug:slug_peluqueria>/empleados/', api.listar_empleados, name='api_empleados'),
+    path('api/v1/<slug:slug_peluqueria>/disponibilidad/', api.consultar_disponibilidad, name='api_disponibilidad'),
+    path('api/v1/<slug:slug_peluqueria>/disponibilidad/async/', api.consultar_disponibilidad_async, name='api_disponibilidad_async'),
+    path('api/v1/<slug:slug_peluqueria>/proximos/', api.proximos_turnos, name='api_proximos_turnos'),
+    path('api/v1/<slug:slug_peluqueria>/citas/crear/', api.crear_cita_api, name='api_crear_cita'),
+    path('api/v1/<slug:slug_peluqueria>/citas/lote/', api.crear_citas_lote_api, name='api_crear_citas_lote'),
+    path('api/v1/<slug:slug_peluqueria>/apartados/', api.crear_apartado_api, name='api_crear_apartado'),
+    path('api/v1/<slug:slug_peluqueria>/apartados/<uuid:token>/', api.liberar_apartado_api, name='api_liberar_apartado'),
 ]
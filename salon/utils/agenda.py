@@ -0,0 +1,67 @@
+# UBICACIÓN: salon/utils/agenda.py
+"""
+Agenda del negocio por ventanas de fechas y páginas por cursor (keyset).
+
+Cada página es una sola consulta sobre el índice (tenant, fecha_hora_inicio, id), con
+servicio y profesional en el mismo JOIN: pide las citas *después* de la última que
+vio el cliente en vez de usar OFFSET, así el costo es el mismo en la primera página
+que en la décima, y no depende de cuántos años de historial tenga el negocio.
+"""
+import base64
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+
+from salon.models import Appointment as Cita
+from salon.services import inicio_dia, localizar
+
+DIAS_VENTANA = 7  # Sin fechas: hoy ± DIAS_VENTANA
+POR_PAGINA = 50
+MAX_POR_PAGINA = 200
+
+
+def ventana_por_defecto(hoy):
+    return hoy - timedelta(days=DIAS_VENTANA), hoy + timedelta(days=DIAS_VENTANA)
+
+
+def codificar_cursor(cita):
+    """Cursor opaco con la posición (fecha_hora_inicio, id) de la última cita de la página."""
+    crudo = f'{cita.fecha_hora_inicio.isoformat()}|{cita.id}'
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def leer_cursor(cursor):
+    """(fecha_hora_inicio, id) de un cursor. Lanza ValueError si no es válido."""
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        inicio, cita_id = crudo.split('|')
+        return localizar(datetime.fromisoformat(inicio)), int(cita_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Cursor inválido') from e
+
+
+def pagina(tenant, desde, hasta, cursor=None, empleado_id=None, estado=None, usuario=None, limite=POR_PAGINA):
+    """
+    Citas del negocio entre los días `desde` y `hasta` (inclusive, hora Colombia) en orden
+    cronológico, a partir de `cursor`. Con `usuario`, solo las del profesional de ese usuario.
+    Devuelve (citas, cursor de la página siguiente o None).
+    """
+    citas = Cita.objects.filter(
+        tenant=tenant,
+        fecha_hora_inicio__gte=inicio_dia(desde),
+        fecha_hora_inicio__lt=inicio_dia(hasta + timedelta(days=1)),
+    ).select_related('servicio', 'empleado').order_by('fecha_hora_inicio', 'id')
+    if empleado_id:
+        citas = citas.filter(empleado_id=empleado_id)
+    if estado:
+        citas = citas.filter(estado=estado)
+    if usuario is not None:
+        citas = citas.filter(empleado__user=usuario)
+    if cursor:
+        inicio, cita_id = leer_cursor(cursor)
+        citas = citas.filter(Q(fecha_hora_inicio__gt=inicio) | Q(fecha_hora_inicio=inicio, id__gt=cita_id))
+
+    # Una de más para saber si hay otra página
+    filas = list(citas[:limite + 1])
+    siguiente = codificar_cursor(filas[limite - 1]) if len(filas) > limite else None
+    return filas[:limite], siguiente
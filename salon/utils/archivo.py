@@ -0,0 +1,52 @@
+# UBICACIÓN: salon/utils/archivo.py
+"""
+Archivo de citas antiguas.
+
+Las citas completadas o canceladas con más de CITAS_ARCHIVAR_DIAS días se mueven
+de Appointment a AppointmentArchive (mismo id y mismos campos), así la tabla que
+usan la agenda, el panel y las verificaciones de choque solo guarda lo reciente.
+Los reportes que necesitan el histórico completo usan historial_citas() o el
+resumen diario (salon/utils/resumen_diario.py), que no resta las archivadas.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from salon.models import Appointment as Cita, AppointmentArchive as CitaArchivada
+from salon.utils import resumen_diario
+
+ESTADOS_ARCHIVABLES = ['completada', 'cancelada']
+
+# Columnas compartidas por las dos tablas (todas las de Appointment)
+CAMPOS = [campo.attname for campo in Cita._meta.concrete_fields]
+
+
+def archivar(antes_de, lote=1000):
+    """
+    Mueve por lotes las citas completadas/canceladas que empiezan antes de `antes_de`.
+    Cada lote es una transacción: copia y borra juntas, sin perder ni duplicar citas.
+    Devuelve cuántas se archivaron.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            citas = list(Cita.objects.filter(
+                estado__in=ESTADOS_ARCHIVABLES, fecha_hora_inicio__lt=antes_de
+            ).order_by('fecha_hora_inicio')[:lote])
+            if not citas:
+                return total
+            ahora = timezone.now()
+            CitaArchivada.objects.bulk_create(
+                [CitaArchivada(archivada_en=ahora, **{c: getattr(cita, c) for c in CAMPOS}) for cita in citas],
+                ignore_conflicts=True,  # Un lote que se cortó a medias y se reintenta
+            )
+            with resumen_diario.sin_actualizar():  # El resumen diario conserva las archivadas
+                Cita.objects.filter(pk__in=[cita.pk for cita in citas]).delete()
+        total += len(citas)
+
+
+def historial_citas(tenant, desde, hasta, campos=('id', 'empleado_id', 'servicio_id', 'fecha_hora_inicio', 'estado', 'precio_total')):
+    """Citas del negocio en [desde, hasta), vivas y archivadas, en una consulta (UNION ALL)."""
+    filtro = {'tenant': tenant, 'fecha_hora_inicio__gte': desde, 'fecha_hora_inicio__lt': hasta}
+    return Cita.objects.filter(**filtro).values_list(*campos).union(
+        CitaArchivada.objects.filter(**filtro).values_list(*campos), all=True
+    )
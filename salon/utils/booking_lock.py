@@ -1,44 +1,185 @@
 # UBICACIÓN: salon/utils/booking_lock.py
-from django.db import transaction
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction, connection, IntegrityError, OperationalError
 from django.core.exceptions import ValidationError
-from salon.models import Empleado
+from salon.models import Professional as Empleado
+
+# Restricción de exclusión creada en la migración 0006 (solo PostgreSQL)
+RESTRICCION_SIN_SOLAPES = 'appointment_sin_solapes'
+
+# SQLite: reintentos ante "database is locked" (backoff exponencial con jitter)
+REINTENTOS_SQLITE = 5
+ESPERA_BASE_SEGUNDOS = 0.05
+
+
+@contextmanager
+def _espera_sqlite(segundos):
+    """Cambia cuánto espera la conexión un bloqueo (PRAGMA busy_timeout) mientras dura el bloque."""
+    anterior = connection.settings_dict['OPTIONS'].get('timeout', 5)
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA busy_timeout = {int(segundos * 1000)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA busy_timeout = {int(anterior * 1000)}')
+
 
 class BookingManager:
     """
     🛡️ EL GUARDIA DEL SISTEMA
-    Clase utilitaria para manejar reservas de forma atómica y segura
-    utilizando bloqueo de filas a nivel de base de datos (Row Locking).
+    Clase utilitaria para manejar reservas de forma atómica y segura.
     Evita que dos personas reserven el mismo hueco al mismo tiempo.
+
+    - PostgreSQL: la base de datos rechaza los solapes con una restricción de exclusión
+      (tstzrange por profesional), así que reservas en horarios distintos no se esperan entre sí.
+      Cada reserva toma la fila del profesional FOR KEY SHARE: no choca con otras reservas
+      (ni con el bloqueo de huecos.actualizar), pero sí espera a los lotes, que la toman FOR UPDATE.
+    - SQLite: select_for_update no hace nada, así que la reserva corre en una transacción
+      BEGIN IMMEDIATE (ver settings) que serializa a los que escriben, con reintentos acotados.
+    - Otros motores: bloqueo de la fila del profesional (Row Locking).
     """
 
+    @staticmethod
+    def usa_restriccion_exclusion():
+        return connection.vendor == 'postgresql'
+
     @staticmethod
     def ejecutar_reserva_segura(empleado_id, funcion_creacion_cita, *args, **kwargs):
         """
-        Ejecuta una función de creación de cita dentro de un bloqueo estricto.
+        Ejecuta una función de creación de cita de forma segura frente a reservas concurrentes.
         
         :param empleado_id: ID del empleado que se va a reservar.
         :param funcion_creacion_cita: La función que crea la cita (debe recibir el objeto empleado como primer arg).
         :return: El resultado de la función de creación.
+        :raises ValueError: 'HORARIO_OCUPADO' si otra reserva ganó el hueco.
+        """
+        if BookingManager.usa_restriccion_exclusion():
+            return BookingManager._reserva_con_restriccion(empleado_id, funcion_creacion_cita, *args, **kwargs)
+        if connection.vendor == 'sqlite':
+            return BookingManager._reserva_sqlite(empleado_id, funcion_creacion_cita, *args, **kwargs)
+        return BookingManager._reserva_con_bloqueo(empleado_id, funcion_creacion_cita, *args, **kwargs)
+
+    @staticmethod
+    def ejecutar_apartado_seguro(empleado_id, funcion_creacion_apartado, *args, **kwargs):
+        """
+        Como ejecutar_reserva_segura, para apartados (SlotHold).
+
+        La restricción de exclusión solo cubre citas (un apartado vencido no puede ocupar el
+        hueco para siempre), así que en PostgreSQL los apartados bloquean la fila del
+        profesional FOR UPDATE: se esperan entre sí y con las reservas, que la toman FOR KEY SHARE.
+        """
+        if BookingManager.usa_restriccion_exclusion():
+            return BookingManager._reserva_con_bloqueo(empleado_id, funcion_creacion_apartado, *args, **kwargs)
+        return BookingManager.ejecutar_reserva_segura(empleado_id, funcion_creacion_apartado, *args, **kwargs)
+
+    @staticmethod
+    def ejecutar_reservas_en_lote(empleado_ids, funcion_creacion_citas, *args, **kwargs):
+        """
+        Como ejecutar_reserva_segura, pero para un lote que toca varios profesionales.
+
+        Bloquea las filas de todos los profesionales en orden de id, en una sola consulta.
+        Como todos los lotes bloquean en el mismo orden, dos lotes que comparten profesionales
+        se esperan en vez de bloquearse mutuamente (sin deadlocks).
+
+        :param empleado_ids: IDs de los profesionales del lote (se ignoran repetidos).
+        :param funcion_creacion_citas: Recibe {id: empleado bloqueado}; los ids que no existen no vienen.
+        :raises ValueError: 'HORARIO_OCUPADO' si en PostgreSQL la restricción de exclusión rechaza
+            el lote. Las reservas individuales esperan al lote (y el lote a ellas), así que solo
+            pasa con citas creadas por fuera de BookingManager.
+        """
+        if connection.vendor == 'sqlite':
+            return BookingManager._con_reintentos_sqlite(
+                BookingManager._lote_con_bloqueo, empleado_ids, funcion_creacion_citas, *args, **kwargs
+            )
+        return BookingManager._lote_con_bloqueo(empleado_ids, funcion_creacion_citas, *args, **kwargs)
+
+    @staticmethod
+    def _lote_con_bloqueo(empleado_ids, funcion_creacion_citas, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                empleados = Empleado.objects.select_for_update().filter(id__in=set(empleado_ids)).order_by('id')
+                return funcion_creacion_citas({e.id: e for e in empleados}, *args, **kwargs)
+        except IntegrityError as e:
+            if BookingManager.es_solape(e):
+                raise ValueError('HORARIO_OCUPADO') from e
+            raise
+
+    @staticmethod
+    def _reserva_sqlite(empleado_id, funcion_creacion_cita, *args, **kwargs):
+        return BookingManager._con_reintentos_sqlite(
+            BookingManager._reserva_con_bloqueo, empleado_id, funcion_creacion_cita, *args, **kwargs
+        )
+
+    @staticmethod
+    def _con_reintentos_sqlite(reserva, *args, **kwargs):
+        # Dentro de una transacción externa no se puede reintentar: el error sube tal cual
+        if connection.in_atomic_block:
+            return reserva(*args, **kwargs)
+        # Cada intento espera el bloqueo poco (no el timeout general de la conexión), así los
+        # reintentos con backoff sí ocurren y el total queda bajo el timeout del worker
+        with _espera_sqlite(getattr(settings, 'SQLITE_TIMEOUT_RESERVAS', 2)):
+            for intento in range(REINTENTOS_SQLITE):
+                try:
+                    return reserva(*args, **kwargs)
+                except OperationalError as e:
+                    if 'locked' not in str(e) or intento == REINTENTOS_SQLITE - 1:
+                        raise
+                    time.sleep(ESPERA_BASE_SEGUNDOS * (2 ** intento) * (1 + random.random()))
+
+    @staticmethod
+    def _reserva_con_restriccion(empleado_id, funcion_creacion_cita, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                empleado = BookingManager._empleado_compartido(empleado_id)
+                # La verificación previa de la función evita la mayoría de choques;
+                # si dos reservas se cruzan, la restricción rechaza la segunda.
+                return funcion_creacion_cita(empleado, *args, **kwargs)
+        except Empleado.DoesNotExist:
+            raise ValidationError("El empleado especificado no existe.")
+        except IntegrityError as e:
+            if BookingManager.es_solape(e):
+                raise ValueError('HORARIO_OCUPADO') from e
+            raise
+
+    @staticmethod
+    def _empleado_compartido(empleado_id):
         """
+        Lee al profesional con FOR KEY SHARE (Django solo ofrece FOR UPDATE / FOR NO KEY UPDATE).
+        Es el mismo bloqueo que toma la llave foránea al insertar la cita, pero tomado antes de
+        verificar: si un lote tiene al profesional, la reserva verifica después de que confirme.
+        """
+        if connection.vendor != 'postgresql':
+            return Empleado.objects.get(id=empleado_id)
+        tabla = connection.ops.quote_name(Empleado._meta.db_table)
+        empleados = list(Empleado.objects.raw(f'SELECT * FROM {tabla} WHERE id = %s FOR KEY SHARE', [empleado_id]))
+        if not empleados:
+            raise Empleado.DoesNotExist
+        return empleados[0]
+
+    @staticmethod
+    def _reserva_con_bloqueo(empleado_id, funcion_creacion_cita, *args, **kwargs):
         try:
             with transaction.atomic():
                 # PASO CRÍTICO: Bloqueamos la fila del Empleado (select_for_update).
                 # El sistema "congela" este empleado para esta transacción hasta que termine.
                 # Cualquier otra petición tendrá que esperar en la fila (el "Guardia" los detiene).
                 empleado = Empleado.objects.select_for_update().get(id=empleado_id)
-                
-                # Verificamos que el empleado siga activo tras el bloqueo
-                if not empleado.activo:
-                    raise ValidationError("El empleado no está activo o disponible.")
 
                 # Ejecutamos la lógica de negocio (verificar fechas, crear cita, etc.)
                 # Pasamos el empleado bloqueado a la función para asegurar que se use esa instancia segura
-                resultado = funcion_creacion_cita(empleado, *args, **kwargs)
-                
-                return resultado
+                return funcion_creacion_cita(empleado, *args, **kwargs)
 
         except Empleado.DoesNotExist:
             raise ValidationError("El empleado especificado no existe.")
-        except Exception as e:
-            # Re-lanzamos la excepción para que la vista o la API la manejen y muestren el error
-            raise e
+
+    @staticmethod
+    def es_solape(error):
+        """True si el IntegrityError viene de la restricción de exclusión de citas (o la de una partición)."""
+        diag = getattr(error.__cause__, 'diag', None)
+        nombre = getattr(diag, 'constraint_name', None) or ''
+        return nombre.startswith(RESTRICCION_SIN_SOLAPES) or RESTRICCION_SIN_SOLAPES in str(error)
@@ -0,0 +1,326 @@
+# UBICACIÓN: salon/utils/busqueda.py
+"""
+Búsqueda de negocios entre todos los tenants ("corte barba Tunja").
+
+Motor 'memoria' (por defecto): índice invertido en memoria del proceso con las
+palabras del nombre del negocio, su ciudad, sus servicios y las especialidades de
+sus profesionales; sin tildes, en minúsculas, sin palabras vacías y sin la 's'
+del plural. Todas las palabras de la consulta deben aparecer (en cualquier campo);
+la última vale como prefijo, así sirve para autocompletar mientras se escribe.
+Guardar o borrar un negocio, servicio o profesional reindexa solo ese negocio al
+confirmar la transacción (ver salon/signals.py) y lo publica en la cache compartida
+('compartida', como las versiones de utils/directorio.py): una versión nueva enlazada a
+la anterior con el id del negocio. Antes de responder, cada proceso compara la versión
+de su índice con la compartida y reindexa los negocios de los enlaces que le faltan;
+si falta alguno, lo reconstruye completo. Igual se reconstruye a los
+BUSQUEDA_INDICE_SEGUNDOS.
+
+Motor 'trigramas' (BUSQUEDA_MOTOR=trigramas, solo PostgreSQL): la misma búsqueda
+con el operador de similitud de pg_trgm sobre índices GIN (migración 0015), sin
+índice en memoria; tolera errores de tipeo pero no sugiere palabras.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Exists, OuterRef, Q
+
+from salon.models import Tenant, Service, Professional
+from salon.utils import replicas
+
+PALABRAS_VACIAS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los', 'para', 'por', 'un', 'una', 'y',
+}
+# Peso de cada campo en el puntaje (si una palabra está en varios, cuenta el mayor)
+PESOS = {'nombre': 3, 'servicio': 2, 'especialidad': 2, 'ciudad': 1}
+PESO_PREFIJO = 0.5  # La palabra incompleta vale la mitad que una exacta
+MAX_RESULTADOS = 50
+CLAVE_VERSION = 'busqueda:version'
+ALIAS_VERSIONES = 'compartida'
+MAX_CAMBIOS = 50  # Con más cambios pendientes que estos se reconstruye completo
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes ('Peluquería Ñuñoa' -> 'peluqueria nunoa')."""
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def _raiz(palabra):
+    return palabra[:-1] if len(palabra) > 3 and palabra.endswith('s') else palabra
+
+
+def tokens(texto):
+    return [_raiz(p) for p in re.findall(r'[a-z0-9]+', normalizar(texto or '')) if p not in PALABRAS_VACIAS]
+
+
+class Indice:
+    """
+    postings: palabra -> {tenant_id: peso}; vocabulario: palabras ordenadas (prefijos).
+    Un índice ya publicado no se modifica: los cambios se aplican a una copia (copia()) que
+    lo reemplaza, así quien busca mientras otro hilo reindexa nunca ve uno a medio cambiar.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.documentos = {}  # tenant_id -> (datos para la respuesta, {palabra: peso})
+        self.formas = {}      # palabra -> como se escribió la primera vez (sugerencias)
+        self.vocabulario = []
+        self.creado = time.monotonic()
+        self.version = '0'    # Versión compartida con la que está al día
+
+    def copia(self):
+        """Índice con los mismos datos; agregar/quitar en él no cambian este."""
+        nuevo = Indice()
+        nuevo.postings = dict(self.postings)
+        nuevo.documentos = dict(self.documentos)
+        nuevo.formas = dict(self.formas)
+        nuevo.vocabulario = self.vocabulario
+        nuevo.creado, nuevo.version = self.creado, self.version
+        return nuevo
+
+    @classmethod
+    def construir(cls, documentos):
+        """Índice completo desde [(negocio, campos)] (ver _cargar)."""
+        indice = cls()
+        for negocio, campos in documentos:
+            pesos = indice._pesos(campos)
+            indice.documentos[negocio['id']] = (negocio, pesos)
+            for palabra, peso in pesos.items():
+                indice.postings.setdefault(palabra, {})[negocio['id']] = peso
+        indice.vocabulario = sorted(indice.postings)
+        return indice
+
+    def _pesos(self, campos):
+        """{palabra: peso} de un negocio. `campos`: [(campo de PESOS, texto)]."""
+        pesos = {}
+        for campo, texto in campos:
+            for original in re.findall(r'\w+', texto or ''):
+                for palabra in tokens(original):
+                    pesos[palabra] = max(pesos.get(palabra, 0), PESOS[campo])
+                    self.formas.setdefault(palabra, original.lower())
+        return pesos
+
+    def agregar(self, negocio, campos):
+        pesos = self._pesos(campos)
+        self.documentos = {**self.documentos, negocio['id']: (negocio, pesos)}
+        nuevas = []
+        for palabra, peso in pesos.items():
+            if palabra not in self.postings:
+                nuevas.append(palabra)
+            self.postings[palabra] = {**self.postings.get(palabra, {}), negocio['id']: peso}
+        if nuevas:
+            self.vocabulario = sorted(self.vocabulario + nuevas)
+
+    def quitar(self, tenant_id):
+        _, pesos = self.documentos.get(tenant_id, (None, {}))
+        self.documentos = {k: v for k, v in self.documentos.items() if k != tenant_id}
+        for palabra in pesos:
+            restantes = {k: v for k, v in self.postings.get(palabra, {}).items() if k != tenant_id}
+            if restantes:
+                self.postings[palabra] = restantes
+            else:
+                self.postings.pop(palabra, None)
+        # Las palabras sin negocios quedan en el vocabulario hasta la próxima reconstrucción;
+        # al buscar se ignoran porque no tienen postings
+
+    def con_prefijo(self, prefijo):
+        inicio = bisect.bisect_left(self.vocabulario, prefijo)
+        fin = bisect.bisect_left(self.vocabulario, prefijo + '\uffff')
+        return [p for p in self.vocabulario[inicio:fin] if p in self.postings]
+
+    def buscar(self, texto, limite):
+        terminos = tokens(texto)
+        if not terminos:
+            return []
+        documentos = self.documentos
+        puntajes = None
+        for i, termino in enumerate(terminos):
+            encontrados = dict(self.postings.get(termino, {}))
+            if i == len(terminos) - 1:
+                for palabra in self.con_prefijo(termino):
+                    for tenant_id, peso in self.postings[palabra].items():
+                        encontrados.setdefault(tenant_id, peso * PESO_PREFIJO)
+            # Todas las palabras deben aparecer: intersección acumulando puntaje
+            if puntajes is None:
+                puntajes = encontrados
+            else:
+                puntajes = {k: v + encontrados[k] for k, v in puntajes.items() if k in encontrados}
+            if not puntajes:
+                return []
+        puntajes = {k: v for k, v in puntajes.items() if k in documentos}
+        mejores = sorted(puntajes.items(), key=lambda par: (-par[1], documentos[par[0]][0]['name']))
+        return [dict(documentos[tenant_id][0], puntaje=puntaje) for tenant_id, puntaje in mejores[:limite]]
+
+    def sugerir(self, texto, limite):
+        """Palabras del índice que completan la última de `texto`, las más usadas primero."""
+        terminos = tokens(texto)
+        if not terminos:
+            return []
+        palabras = sorted(self.con_prefijo(terminos[-1]), key=lambda p: (-len(self.postings[p]), p))
+        return [self.formas[p] for p in palabras[:limite]]
+
+
+_lock = threading.Lock()
+_indice = None
+
+
+def _compartida():
+    return caches[ALIAS_VERSIONES]
+
+
+def _clave_cambio(version):
+    return f'busqueda:cambio:{version}'
+
+
+def _vigencia():
+    # Un índice más viejo que BUSQUEDA_INDICE_SEGUNDOS se reconstruye: no necesita enlaces anteriores
+    return 2 * settings.BUSQUEDA_INDICE_SEGUNDOS
+
+
+def _cargar(tenant_ids=None):
+    """[(negocio, campos)] en tres consultas (a la primaria): negocios, servicios y especialidades."""
+    with replicas.primaria():
+        return _cargar_documentos(tenant_ids)
+
+
+def _cargar_documentos(tenant_ids):
+    negocios = Tenant.objects.values('id', 'name', 'subdomain', 'ciudad')
+    servicios = Service.objects.values_list('tenant_id', 'nombre')
+    especialidades = Professional.objects.exclude(especialidad='').values_list('tenant_id', 'especialidad')
+    if tenant_ids is not None:
+        negocios = negocios.filter(id__in=tenant_ids)
+        servicios = servicios.filter(tenant_id__in=tenant_ids)
+        especialidades = especialidades.filter(tenant_id__in=tenant_ids)
+
+    negocios = {n['id']: n for n in negocios}
+    campos = {n_id: [('nombre', n['name']), ('ciudad', n['ciudad'])] for n_id, n in negocios.items()}
+    for campo, filas in (('servicio', servicios), ('especialidad', especialidades)):
+        for tenant_id, texto in filas:
+            if tenant_id in campos:
+                campos[tenant_id].append((campo, texto))
+    return [(negocios[n_id], c) for n_id, c in campos.items()]
+
+
+def _construir():
+    # La versión se lee antes que los datos: un cambio confirmado después la cambia
+    version = _compartida().get(CLAVE_VERSION, '0')
+    nuevo = Indice.construir(_cargar())
+    nuevo.version = version
+    return nuevo
+
+
+def _cambios(desde, hasta):
+    """Negocios cambiados entre dos versiones, siguiendo los enlaces; None si falta alguno."""
+    tenant_ids = set()
+    for _ in range(MAX_CAMBIOS):
+        if desde == hasta:
+            return tenant_ids
+        enlace = _compartida().get(_clave_cambio(desde))
+        if enlace is None:
+            return None
+        desde, tenant_id = enlace
+        tenant_ids.add(tenant_id)
+    return tenant_ids if desde == hasta else None
+
+
+def _ponerse_al_dia(actual, tenant_ids, version):
+    nuevo = actual.copia()
+    for tenant_id in tenant_ids:
+        nuevo.quitar(tenant_id)
+    for negocio, campos in _cargar(tenant_ids):
+        nuevo.agregar(negocio, campos)
+    nuevo.version = version
+    return nuevo
+
+
+def indice():
+    """
+    Índice del proceso al día con la versión compartida (una lectura a la compartida). Lo
+    construye la primera vez o cuando venció; si otro proceso publicó cambios, reindexa esos
+    negocios en una copia.
+    """
+    global _indice
+    actual = _indice
+    if actual is None or time.monotonic() - actual.creado >= settings.BUSQUEDA_INDICE_SEGUNDOS:
+        nuevo = _construir()
+    else:
+        version = _compartida().get(CLAVE_VERSION, '0')
+        if version == actual.version:
+            return actual
+        tenant_ids = _cambios(actual.version, version)
+        nuevo = _construir() if tenant_ids is None else _ponerse_al_dia(actual, tenant_ids, version)
+    with _lock:
+        _indice = nuevo
+    return nuevo
+
+
+def _publicar(tenant_id):
+    """Nueva versión compartida, enlazada a la actual con el negocio que cambió."""
+    compartida = _compartida()
+    for _ in range(MAX_CAMBIOS):
+        anterior = compartida.get(CLAVE_VERSION, '0')
+        nueva = uuid.uuid4().hex
+        # add es atómico (Redis y la tabla): cada versión tiene un solo enlace a la siguiente
+        if compartida.add(_clave_cambio(anterior), (nueva, tenant_id), _vigencia()):
+            compartida.set(CLAVE_VERSION, nueva, _vigencia())
+            return
+        time.sleep(0.005)  # Otro proceso está publicando la suya
+    # Versión sin enlace: todos los procesos reconstruyen completo
+    compartida.set(CLAVE_VERSION, uuid.uuid4().hex, _vigencia())
+
+
+def reindexar(tenant_id):
+    """
+    Publica el cambio de un negocio para todos los procesos y, si este ya tiene índice, lo
+    aplica de una vez. Los demás lo aplican en su próxima búsqueda (ver indice()).
+    """
+    _publicar(tenant_id)
+    if _indice is not None:
+        indice()
+
+
+def invalidar():
+    global _indice
+    with _lock:
+        _indice = None
+
+
+def _buscar_trigramas(texto, limite):
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    # Sin quitar tildes: las columnas las guardan y la similitud tolera la diferencia
+    terminos = [t for t in texto.lower().split() if t not in PALABRAS_VACIAS]
+    if not terminos:
+        return []
+    negocios = Tenant.objects.all()
+    for termino in terminos:
+        # %> de pg_trgm: cada uno puede usar su índice GIN
+        negocios = negocios.filter(
+            Q(name__trigram_word_similar=termino) | Q(ciudad__trigram_word_similar=termino)
+            | Exists(Service.objects.filter(tenant=OuterRef('pk'), nombre__trigram_word_similar=termino))
+            | Exists(Professional.objects.filter(tenant=OuterRef('pk'), especialidad__trigram_word_similar=termino))
+        )
+    puntaje = sum((TrigramWordSimilarity(termino, 'name') for termino in terminos[1:]),
+                  TrigramWordSimilarity(terminos[0], 'name'))
+    return list(negocios.annotate(puntaje=puntaje).order_by('-puntaje', 'name')
+                .values('id', 'name', 'subdomain', 'ciudad', 'puntaje')[:limite])
+
+
+def buscar(texto, limite=20):
+    """Negocios que coinciden con `texto`, mejor puntaje primero: [{id, name, subdomain, ciudad, puntaje}]."""
+    if settings.BUSQUEDA_MOTOR == 'trigramas':
+        return _buscar_trigramas(texto, limite)
+    return indice().buscar(texto, limite)
+
+
+def sugerir(texto, limite=8):
+    """Autocompletado de la última palabra (solo con el motor en memoria)."""
+    if settings.BUSQUEDA_MOTOR == 'trigramas':
+        return []
+    return indice().sugerir(texto, limite)
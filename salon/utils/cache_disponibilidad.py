@@ -0,0 +1,185 @@
+# UBICACIÓN: salon/utils/cache_disponibilidad.py
+"""
+Cache de disponibilidad en dos niveles. Los bloques calculados viven en la cache local
+de cada proceso ('disponibilidad'), bajo claves que llevan los tokens de generación del
+profesional y del día. Esos tokens viven en la cache compartida ('compartida': Redis o la
+tabla de la base), así una reserva hecha en un worker invalida los bloques guardados en
+todos los demás, no solo en el suyo. Cada lectura cuesta una consulta a la compartida
+(todas las generaciones en un get_many) en vez de las 3 de cargar_agendas.
+"""
+import threading
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from salon.services import aobtener_disponibilidad_rango, obtener_disponibilidad_rango
+from salon.utils import replicas
+
+PREFIJO = 'disponibilidad'
+ALIAS_CACHE = 'disponibilidad'      # Valores calculados: cache local del proceso
+ALIAS_GENERACIONES = 'compartida'   # Tokens de generación: los ven todos los workers
+
+
+class MetricasCache:
+    """Contadores de aciertos/fallos del proceso actual (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.aciertos = 0
+            self.fallos = 0
+            self.invalidaciones = 0
+
+    def registrar(self, aciertos=0, fallos=0, invalidaciones=0):
+        with self._lock:
+            self.aciertos += aciertos
+            self.fallos += fallos
+            self.invalidaciones += invalidaciones
+
+    def como_dict(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'invalidaciones': self.invalidaciones,
+                'tasa_aciertos': (self.aciertos / total) if total else 0.0,
+            }
+
+
+metricas = MetricasCache()
+
+
+def _cache():
+    return caches[ALIAS_CACHE]
+
+
+def _compartida():
+    return caches[ALIAS_GENERACIONES]
+
+
+def _clave_gen_empleado(empleado_id):
+    return f'{PREFIJO}:gen:{empleado_id}'
+
+
+def _clave_gen_dia(empleado_id, fecha):
+    return f'{PREFIJO}:gen:{empleado_id}:{fecha.isoformat()}'
+
+
+def _vigencia_generacion():
+    # Más que la de los valores: cuando una generación vence y vuelve a '0', ya no queda
+    # ningún valor guardado con ese '0' de antes de la invalidación
+    return 2 * getattr(settings, 'DISPONIBILIDAD_CACHE_TIMEOUT', 300)
+
+
+def _generaciones(claves):
+    """
+    Lee el token de generación de cada clave ('0' si nunca se invalidó o ya venció), en una
+    sola lectura a la cache compartida. Cambiar el token invalida todo lo guardado bajo la
+    generación anterior en las caches locales de todos los procesos, sin tener que borrarlo:
+    las entradas huérfanas simplemente salen por LRU o por expiración.
+    """
+    encontradas = _compartida().get_many(claves)
+    return {clave: encontradas.get(clave, '0') for clave in claves}
+
+
+def disponibilidad_cacheada(empleados, desde, hasta, duracion_servicio):
+    """
+    Igual que services.obtener_disponibilidad_rango pero sirviendo desde cache.
+    La clave es (empleado, fecha, duración) y se versiona con dos generaciones:
+    una por empleado (cambios de horario) y otra por empleado y día (citas/ausencias).
+    Solo los pares (empleado, fecha) que fallan se recalculan, en un único lote.
+    """
+    empleados = list(empleados)
+    claves, resultado, faltantes = _buscar(empleados, desde, hasta, duracion_servicio)
+    calculado = {}
+    if faltantes:
+        # Se guarda bajo la generación ya leída: de la primaria, no de una réplica atrasada
+        with replicas.primaria():
+            calculado = obtener_disponibilidad_rango(*_rango_faltante(faltantes), duracion_servicio)
+    return _completar(empleados, claves, resultado, faltantes, calculado)
+
+
+async def adisponibilidad_cacheada(empleados, desde, hasta, duracion_servicio):
+    """disponibilidad_cacheada para vistas asíncronas (calcula con aobtener_disponibilidad_rango)."""
+    empleados = list(empleados)
+    # La cache puede ser de red (Redis, Memcached): fuera del event loop
+    claves, resultado, faltantes = await sync_to_async(_buscar)(empleados, desde, hasta, duracion_servicio)
+    calculado = {}
+    if faltantes:
+        with replicas.primaria():
+            calculado = await aobtener_disponibilidad_rango(*_rango_faltante(faltantes), duracion_servicio)
+    return await sync_to_async(_completar)(empleados, claves, resultado, faltantes, calculado)
+
+
+def _buscar(empleados, desde, hasta, duracion_servicio):
+    """Lee la cache: (claves por (empleado, fecha), resultado parcial por fecha, pares faltantes)."""
+    fechas = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+
+    gens = _generaciones(
+        [_clave_gen_empleado(emp.id) for emp in empleados]
+        + [_clave_gen_dia(emp.id, fecha) for emp in empleados for fecha in fechas]
+    )
+
+    claves = {}
+    for emp in empleados:
+        gen_emp = gens[_clave_gen_empleado(emp.id)]
+        for fecha in fechas:
+            gen_dia = gens[_clave_gen_dia(emp.id, fecha)]
+            claves[(emp, fecha)] = f'{PREFIJO}:{emp.id}:{fecha.isoformat()}:{gen_emp}:{gen_dia}:{duracion_servicio}'
+
+    guardadas = _cache().get_many(list(claves.values()))
+    faltantes = [par for par, clave in claves.items() if clave not in guardadas]
+    metricas.registrar(aciertos=len(claves) - len(faltantes), fallos=len(faltantes))
+
+    resultado = {fecha: {} for fecha in fechas}
+    for (emp, fecha), clave in claves.items():
+        if clave in guardadas:
+            resultado[fecha][emp] = guardadas[clave]
+    return claves, resultado, faltantes
+
+
+def _rango_faltante(faltantes):
+    """(empleados, desde, hasta) del único lote que cubre todos los pares faltantes."""
+    emps_faltantes = list({emp.id: emp for emp, _ in faltantes}.values())
+    fechas_faltantes = [fecha for _, fecha in faltantes]
+    return emps_faltantes, min(fechas_faltantes), max(fechas_faltantes)
+
+
+def _completar(empleados, claves, resultado, faltantes, calculado):
+    """Guarda lo recalculado y arma la respuesta final."""
+    if faltantes:
+        timeout = getattr(settings, 'DISPONIBILIDAD_CACHE_TIMEOUT', 300)
+        nuevas = {}
+        for emp, fecha in faltantes:
+            horas = calculado[fecha][emp]
+            resultado[fecha][emp] = horas
+            nuevas[claves[(emp, fecha)]] = horas
+        _cache().set_many(nuevas, timeout=timeout)
+
+    # Respetar el orden de empleados de la consulta original
+    return {fecha: {emp: dia[emp] for emp in empleados} for fecha, dia in resultado.items()}
+
+
+def invalidar_dias(empleado_id, fechas):
+    """Invalida la disponibilidad de un empleado en esas fechas cuando la transacción confirme."""
+    claves = [_clave_gen_dia(empleado_id, fecha) for fecha in fechas]
+    if claves:
+        transaction.on_commit(lambda: _renovar(claves))
+
+
+def invalidar_empleado(empleado_id):
+    """Invalida todas las fechas de un empleado (p. ej. cambió su horario)."""
+    transaction.on_commit(lambda: _renovar([_clave_gen_empleado(empleado_id)]))
+
+
+def _renovar(claves):
+    _compartida().set_many({clave: uuid.uuid4().hex for clave in claves}, timeout=_vigencia_generacion())
+    metricas.registrar(invalidaciones=len(claves))
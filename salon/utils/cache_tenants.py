@@ -0,0 +1,43 @@
+# UBICACIÓN: salon/utils/cache_tenants.py
+"""
+Cache en memoria del proceso: subdominio (slug) -> Tenant.
+
+TenantMiddleware lo consulta en cada petición pública, así la mayoría no tocan la
+tabla de negocios. Guardar o borrar un Tenant lo vacía (ver salon/signals.py); como
+cada proceso tiene su propia copia, las entradas además vencen a los
+TENANT_CACHE_SEGUNDOS para que los cambios hechos desde otro proceso (admin, comandos)
+se vean enseguida.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+
+from salon.models import Tenant
+from salon.utils import replicas
+
+_lock = threading.Lock()
+_tenants = {}  # slug -> (tenant, vence)
+
+
+def obtener(slug):
+    """Tenant de ese subdominio o None. Cada llamada recibe su propia copia del objeto."""
+    ahora = time.monotonic()
+    entrada = _tenants.get(slug)
+    if entrada and entrada[1] > ahora:
+        return copy.copy(entrada[0])
+
+    with replicas.primaria():
+        tenant = Tenant.objects.filter(subdomain=slug).first()
+    if tenant is not None:  # Los slugs inexistentes no se guardan: el negocio puede crearse ya mismo
+        with _lock:
+            _tenants[slug] = (tenant, ahora + getattr(settings, 'TENANT_CACHE_SEGUNDOS', 60))
+        return copy.copy(tenant)
+    return None
+
+
+def invalidar():
+    """Vacía la cache (también cubre cambios de subdominio)."""
+    with _lock:
+        _tenants.clear()
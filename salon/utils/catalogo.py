@@ -0,0 +1,115 @@
+# UBICACIÓN: salon/utils/catalogo.py
+"""
+Versión del catálogo (servicios y profesionales) de cada negocio, para GET condicionales.
+
+Guardar o borrar un Service o un Professional sube `Tenant.version_catalogo` en la misma
+transacción (ver salon/signals.py). Las respuestas de listar_servicios y listar_empleados
+llevan un ETag con esa versión; si el cliente la manda en If-None-Match y sigue igual, se
+responde 304 con una sola consulta por clave primaria a la tabla de negocios, sin leer
+servicios ni profesionales. Los cambios masivos (QuerySet.update, bulk_create) no disparan
+señales: quien los haga debe llamar a subir_version.
+
+El cuerpo JSON de cada respuesta se guarda bajo una clave con la versión, en dos niveles:
+la cache local del proceso ('default') y la compartida ('compartida', Redis o la tabla de la
+base). Se arma (consulta y conversión de precios) una vez por versión entre todos los
+workers; los demás la copian de la compartida a su cache local la primera vez que la piden.
+Las entradas de versiones viejas nadie las borra, vencen solas a los CATALOGO_CACHE_SEGUNDOS.
+Para que un cambio no haga que todos los workers reconstruyan a la vez, solo el que toma el
+candado (add en la compartida, atómico en Redis y en la tabla) arma la entrada; los demás
+sirven la última versión guardada con su propio ETag o, si no hay, esperan un momento.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from salon.models import Tenant
+from salon.utils import replicas
+
+CANDADO_SEGUNDOS = 10  # Si el que reconstruye muere, el candado se suelta solo
+ESPERA_SEGUNDOS = 0.5  # Lo que espera un worker sin copia vieja antes de armarla él mismo
+INTERVALO_ESPERA = 0.02
+ALIAS_COMPARTIDA = 'compartida'
+
+
+def _compartida():
+    return caches[ALIAS_COMPARTIDA]
+
+
+def version(tenant_id):
+    """Versión actual del catálogo. No usa la cache de negocios: otro proceso pudo subirla."""
+    return Tenant.objects.filter(pk=tenant_id).values_list('version_catalogo', flat=True).first()
+
+
+def subir_version(tenant_id):
+    Tenant.objects.filter(pk=tenant_id).update(version_catalogo=F('version_catalogo') + 1)
+
+
+def formato_etag(nombre, tenant_id, version_catalogo):
+    return f'"{nombre}-{tenant_id}-{version_catalogo}"'
+
+
+def etag(nombre):
+    """
+    etag_func para django.views.decorators.http.condition. Deja la versión leída en
+    `request.version_catalogo` para que la vista no vuelva a consultarla.
+    """
+    def _etag(request, *args, **kwargs):
+        request.version_catalogo = version(request.tenant.id)
+        return formato_etag(nombre, request.tenant.id, request.version_catalogo)
+    return _etag
+
+
+def _clave(nombre, tenant_id, version_catalogo):
+    return f'catalogo:{nombre}:{tenant_id}:{version_catalogo}'
+
+
+def _armar(construir):
+    with replicas.primaria():  # Queda en la cache: nada de una réplica atrasada
+        return json.dumps(construir(), cls=DjangoJSONEncoder).encode()
+
+
+def cuerpo(nombre, tenant_id, version_catalogo, construir):
+    """
+    JSON (bytes) de la respuesta `nombre` del negocio en esa versión; `construir()` devuelve
+    los datos y solo se llama si no están en la cache. Devuelve (cuerpo, versión del cuerpo):
+    la versión es otra si se sirvió la copia anterior mientras otro worker reconstruye.
+    """
+    clave = _clave(nombre, tenant_id, version_catalogo)
+    guardado = cache.get(clave)
+    if guardado is not None:
+        return guardado, version_catalogo
+
+    compartida = _compartida()
+    guardado = compartida.get(clave)
+    if guardado is not None:  # La armó otro worker
+        cache.set(clave, guardado, settings.CATALOGO_CACHE_SEGUNDOS)
+        return guardado, version_catalogo
+
+    clave_ultima = f'catalogo:{nombre}:{tenant_id}:ultima'
+    if compartida.add(f'{clave}:candado', 1, CANDADO_SEGUNDOS):
+        try:
+            guardado = _armar(construir)
+            compartida.set_many({clave: guardado, clave_ultima: (version_catalogo, guardado)},
+                                settings.CATALOGO_CACHE_SEGUNDOS)
+            cache.set(clave, guardado, settings.CATALOGO_CACHE_SEGUNDOS)
+        finally:
+            compartida.delete(f'{clave}:candado')
+        return guardado, version_catalogo
+
+    # Otro worker la está armando
+    anterior = compartida.get(clave_ultima)
+    if anterior is not None:
+        return anterior[1], anterior[0]
+    limite = time.monotonic() + ESPERA_SEGUNDOS
+    while time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        guardado = compartida.get(clave)
+        if guardado is not None:
+            cache.set(clave, guardado, settings.CATALOGO_CACHE_SEGUNDOS)
+            return guardado, version_catalogo
+    # Tarda demasiado: la arma sin guardarla (la guarda el que tiene el candado)
+    return _armar(construir), version_catalogo
@@ -0,0 +1,80 @@
+# UBICACIÓN: salon/utils/directorio.py
+"""
+Cache del directorio público de negocios (landing_saas_view, salon/index.html).
+
+Tres niveles, guardados en la cache local de cada proceso ('default'):
+  - Lista de ciudades (una consulta DISTINCT menos por visita).
+  - Tarjeta de cada negocio ya renderizada ({% cache %} 'tarjeta_negocio' <id> <versión>).
+  - Página completa para visitantes anónimos, por ciudad y número de página.
+Las claves llevan versiones que viven en la cache compartida ('compartida', igual que las
+generaciones de utils/cache_disponibilidad.py): una del directorio (ciudades y páginas) y
+una por tarjeta. Guardar o borrar un Tenant (ver salon/signals.py) cambia la del directorio
+y la de su tarjeta, y lo guardado con las anteriores deja de usarse en todos los workers.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from salon.models import Tenant
+
+POR_PAGINA = 24
+FRAGMENTO_TARJETA = 'tarjeta_negocio'
+CLAVE_CIUDADES = 'directorio:ciudades'
+CLAVE_VERSION = 'directorio:version'
+ALIAS_VERSIONES = 'compartida'
+
+
+def _compartida():
+    return caches[ALIAS_VERSIONES]
+
+
+def _clave_version_tarjeta(tenant_id):
+    return f'directorio:tarjeta:{tenant_id}'
+
+
+def version():
+    """Versión actual del directorio ('0' si nunca se invalidó o ya venció): una lectura a la compartida."""
+    return _compartida().get(CLAVE_VERSION, '0')
+
+
+def marcar_tarjetas(negocios):
+    """Pone en cada negocio `version_tarjeta` (la clave de su {% cache %}), en una sola lectura."""
+    negocios = list(negocios)
+    versiones = _compartida().get_many([_clave_version_tarjeta(n.id) for n in negocios])
+    for negocio in negocios:
+        negocio.version_tarjeta = versiones.get(_clave_version_tarjeta(negocio.id), '0')
+    return negocios
+
+
+def ciudades(version):
+    """Ciudades con al menos un negocio, en orden alfabético."""
+    clave = f'{CLAVE_CIUDADES}:{version}'
+    lista = cache.get(clave)
+    if lista is None:
+        lista = list(Tenant.objects.order_by('ciudad').values_list('ciudad', flat=True).distinct())
+        cache.set(clave, lista, settings.DIRECTORIO_CACHE_SEGUNDOS)
+    return lista
+
+
+def _clave_pagina(version, ciudad, numero):
+    ciudad = hashlib.md5(ciudad.encode()).hexdigest()
+    return f'directorio:pagina:{version}:{ciudad}:{numero}'
+
+
+def pagina_cacheada(version, ciudad, numero):
+    """Respuesta guardada para visitantes anónimos, o None."""
+    return cache.get(_clave_pagina(version, ciudad, numero))
+
+
+def guardar_pagina(version, ciudad, numero, respuesta):
+    cache.set(_clave_pagina(version, ciudad, numero), respuesta, settings.DIRECTORIO_CACHE_SEGUNDOS)
+
+
+def invalidar(tenant_id):
+    """El negocio cambió: su tarjeta, la lista de ciudades y todas las páginas quedan viejas."""
+    nueva = uuid.uuid4().hex
+    # Más vigencia que lo guardado: cuando una versión vence y vuelve a '0' ya no queda nada con ese '0'
+    _compartida().set_many({CLAVE_VERSION: nueva, _clave_version_tarjeta(tenant_id): nueva},
+                           2 * settings.DIRECTORIO_CACHE_SEGUNDOS)
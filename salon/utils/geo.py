@@ -0,0 +1,83 @@
+# UBICACIÓN: salon/utils/geo.py
+"""
+Búsqueda de negocios cercanos sobre una grilla de celdas precalculada.
+
+Cada Tenant con coordenadas guarda en `celda_geo` la celda de TAMANO_CELDA grados
+(~5,5 km) donde cae (se calcula al guardarlo, ver salon/signals.py). Para buscar
+los k más cercanos se consultan por índice las celdas alrededor del punto, en
+anillos cada vez más anchos, y solo a esos candidatos se les calcula la distancia
+(haversine); se deja de ampliar cuando los k mejores ya están dentro del radio que
+los anillos consultados cubren por completo.
+"""
+import heapq
+import math
+
+from salon.models import Tenant
+
+TAMANO_CELDA = 0.05  # grados
+RADIO_TIERRA_KM = 6371.0
+KM_POR_GRADO = 111.32
+RADIO_MAX_KM = 50
+MAX_RESULTADOS = 50
+# Cerca de los polos las celdas se angostan (cos(lat)) y harían falta cada vez más anillos:
+# el endpoint solo atiende hasta LATITUD_MAX y ANILLO_MAX acota cualquier otra llamada.
+LATITUD_MAX = 60
+ANILLO_MAX = math.ceil(RADIO_MAX_KM / (TAMANO_CELDA * KM_POR_GRADO * math.cos(math.radians(LATITUD_MAX)))) + 1
+
+
+def _indices(lat, lon):
+    return math.floor(lat / TAMANO_CELDA), math.floor(lon / TAMANO_CELDA)
+
+
+def celda(lat, lon):
+    """Celda de la grilla de un punto, p. ej. '110:-1468'. None sin coordenadas."""
+    if lat is None or lon is None:
+        return None
+    return '%d:%d' % _indices(lat, lon)
+
+
+def _anillos(fila, columna, desde, hasta):
+    """Celdas a distancia (en celdas, Chebyshev) entre desde y hasta, inclusive."""
+    return [
+        f'{fila + i}:{columna + j}'
+        for i in range(-hasta, hasta + 1)
+        for j in range(-hasta, hasta + 1)
+        if max(abs(i), abs(j)) >= desde
+    ]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+
+def cercanos(lat, lon, k=10, ciudad=None, radio_max_km=RADIO_MAX_KM):
+    """
+    Hasta k negocios a menos de radio_max_km de (lat, lon), del más cercano al más lejano,
+    como lista de (distancia_km, tenant). Con `ciudad`, solo los de esa ciudad. Más allá de
+    LATITUD_MAX solo se revisan ANILLO_MAX anillos (un radio menor que radio_max_km).
+    """
+    fila, columna = _indices(lat, lon)
+    # Lado mínimo de una celda en km a esta latitud: lo que cubre con seguridad cada anillo
+    km_celda = TAMANO_CELDA * KM_POR_GRADO * min(1.0, math.cos(math.radians(lat)))
+    anillo_max = min(math.ceil(radio_max_km / km_celda) + 1, ANILLO_MAX)
+
+    candidatos = []
+    consultado, anillo = -1, 1
+    while True:
+        negocios = Tenant.objects.filter(celda_geo__in=_anillos(fila, columna, consultado + 1, anillo))
+        if ciudad:
+            negocios = negocios.filter(ciudad=ciudad)
+        for negocio in negocios:
+            distancia = haversine_km(lat, lon, negocio.latitud, negocio.longitud)
+            if distancia <= radio_max_km:
+                candidatos.append((distancia, negocio.id, negocio))
+        consultado = anillo
+
+        # Todo negocio a menos de `cubierto` km está en las celdas ya consultadas
+        cubierto = consultado * km_celda
+        mejores = heapq.nsmallest(k, candidatos)
+        if consultado >= anillo_max or (len(mejores) == k and mejores[-1][0] <= cubierto):
+            return [(distancia, negocio) for distancia, _, negocio in mejores]
+        anillo = min(anillo * 2, anillo_max)
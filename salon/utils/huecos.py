@@ -0,0 +1,193 @@
+# UBICACIÓN: salon/utils/huecos.py
+"""
+Tabla materializada de huecos libres (FreeSlot).
+
+Para los negocios con `Tenant.huecos_hasta` definido, cada profesional tiene
+guardados sus tramos libres desde hoy hasta esa fecha. Las citas, apartados y
+ausencias los parten o los vuelven a unir al guardarse (ver salon/signals.py) y
+la API responde la disponibilidad con una sola consulta por rango sobre el
+índice (empleado, fecha). `manage.py reconstruir_huecos` los recalcula en bloque.
+
+ocupar y liberar leen, parten y reescriben filas: dos transacciones que tocan
+al mismo profesional pisarían los cambios de la otra (y bloquear las filas de
+FreeSlot no basta, las piezas nuevas no las ve la otra transacción). Por eso
+actualizar() bloquea antes la fila del profesional.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from salon.models import FreeSlot, Professional, Tenant
+from salon.services import (
+    ZONA_CO, INTERVALO_MINUTOS, cargar_agendas, fechas_locales, inicio_dia, limites_jornada, mapa_jornada,
+)
+from salon.utils.ocupacion import MapaOcupacion
+
+
+def hoy():
+    return timezone.now().astimezone(ZONA_CO).date()
+
+
+def usa_huecos(tenant, desde, hasta):
+    """
+    True si el rango pedido está cubierto por la tabla materializada del negocio. huecos_hasta
+    se lee de la base y no de la cache de negocios: reconstruir_huecos --desactivar corre en
+    otro proceso y borra los huecos sin que los workers se enteren.
+    """
+    if not tenant or desde < hoy():
+        return False
+    huecos_hasta = Tenant.objects.filter(pk=tenant.pk).values_list('huecos_hasta', flat=True).first()
+    return bool(huecos_hasta and hasta <= huecos_hasta)
+
+
+def _tramos_a_filas(mapa, empleado_id, fecha):
+    return [
+        FreeSlot(
+            empleado_id=empleado_id, fecha=fecha, inicio_turno=mapa.inicio,
+            inicio=mapa.inicio + timedelta(minutes=desde), fin=mapa.inicio + timedelta(minutes=hasta),
+        )
+        for desde, hasta in mapa.tramos_libres()
+    ]
+
+
+def reconstruir(empleados, desde, hasta):
+    """Recalcula desde cero los huecos de esos empleados entre `desde` y `hasta` (inclusive)."""
+    empleados = list(empleados)
+    horarios, ocupados = cargar_agendas(empleados, inicio_dia(desde), inicio_dia(hasta + timedelta(days=1)))
+
+    filas = []
+    fecha = desde
+    while fecha <= hasta:
+        for emp in empleados:
+            horario = horarios.get((emp.id, fecha.weekday()))
+            if horario:
+                filas.extend(_tramos_a_filas(mapa_jornada(horario, fecha, ocupados[emp.id]), emp.id, fecha))
+        fecha += timedelta(days=1)
+
+    with transaction.atomic():
+        FreeSlot.objects.filter(empleado__in=empleados, fecha__range=(desde, hasta)).delete()
+        FreeSlot.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def ocupar(empleado_id, inicio, fin):
+    """Parte (o elimina) los huecos que se cruzan con [inicio, fin)."""
+    for hueco in FreeSlot.objects.filter(empleado_id=empleado_id, inicio__lt=fin, fin__gt=inicio):
+        # Mismo redondeo al minuto (relativo al inicio del turno) que usa el cálculo en vivo
+        mapa = MapaOcupacion(hueco.inicio_turno, hueco.fin)
+        mapa.marcar(hueco.inicio_turno, hueco.inicio)
+        mapa.marcar(inicio, fin)
+        piezas = _tramos_a_filas(mapa, empleado_id, hueco.fecha)
+
+        if not piezas:
+            hueco.delete()
+            continue
+        hueco.inicio, hueco.fin = piezas[0].inicio, piezas[0].fin
+        hueco.save(update_fields=['inicio', 'fin'])
+        FreeSlot.objects.bulk_create(piezas[1:])
+
+
+def liberar(empleado_id, inicio, fin, hasta):
+    """
+    Devuelve [inicio, fin) a los huecos libres (solo días entre hoy y `hasta`), respetando
+    turno, almuerzo y lo que siga ocupado en ese rango, y lo une con los huecos vecinos.
+    """
+    desde = hoy()
+    fechas = [f for f in fechas_locales(inicio, fin) if desde <= f <= hasta]
+    if not fechas:
+        return
+
+    # Lo que sigue ocupado dentro del rango (citas, apartados, ausencias)
+    horarios, ocupados = cargar_agendas([empleado_id], inicio, fin)
+    ocupados = ocupados[empleado_id]
+
+    existentes = {}
+    for hueco in FreeSlot.objects.filter(empleado_id=empleado_id, fecha__in=fechas):
+        existentes.setdefault(hueco.fecha, []).append(hueco)
+
+    borrar, crear = [], []
+    for fecha in fechas:
+        horario = horarios.get((empleado_id, fecha.weekday()))
+        if not horario:
+            continue
+        inicio_turno, fin_turno, _ = limites_jornada(horario, fecha)
+
+        # Libre = (lo que ya estaba libre) ∪ ([inicio, fin) − almuerzo − lo que sigue ocupado)
+        liberado = mapa_jornada(horario, fecha, ocupados)
+        rango = MapaOcupacion(inicio_turno, fin_turno)
+        rango.marcar(inicio, fin)
+        libre = rango.ocupado & ~liberado.ocupado
+        for hueco in existentes.get(fecha, []):
+            previo = MapaOcupacion(inicio_turno, fin_turno)
+            previo.marcar(hueco.inicio, hueco.fin)
+            libre |= previo.ocupado
+
+        resultado = MapaOcupacion(inicio_turno, fin_turno)
+        resultado.ocupado = ~libre
+        nuevos = {(f.inicio, f.fin): f for f in _tramos_a_filas(resultado, empleado_id, fecha)}
+
+        # Escribir solo la diferencia
+        for hueco in existentes.get(fecha, []):
+            if nuevos.pop((hueco.inicio, hueco.fin), None) is None:
+                borrar.append(hueco.pk)
+        crear.extend(nuevos.values())
+
+    if borrar:
+        FreeSlot.objects.filter(pk__in=borrar).delete()
+    if crear:
+        FreeSlot.objects.bulk_create(crear)
+
+
+def actualizar(huecos_hasta, anterior, actual):
+    """
+    Aplica un cambio de agenda a los huecos. `huecos_hasta` es el del negocio (None: no
+    materializa); `anterior` y `actual` son tuplas (empleado_id, inicio, fin) de lo que
+    ocupaba el registro antes y después, o None.
+    """
+    if not huecos_hasta or anterior == actual:
+        return
+    with transaction.atomic(savepoint=False):
+        _bloquear_empleados({tramo[0] for tramo in (anterior, actual) if tramo})
+        if anterior:
+            liberar(*anterior, hasta=huecos_hasta)
+        if actual:
+            ocupar(*actual)
+
+
+def _bloquear_empleados(empleado_ids):
+    """
+    Serializa por profesional las escrituras de huecos hasta el fin de la transacción.
+    FOR NO KEY UPDATE no choca con el FOR KEY SHARE de las reservas (ver BookingManager),
+    así que una reserva que ya tiene al profesional puede pedirlo sin bloqueo mutuo.
+    """
+    if connection.features.has_select_for_update:
+        list(Professional.objects.select_for_update(no_key=True)
+             .filter(id__in=empleado_ids).order_by('id').values_list('id', flat=True))
+
+
+def disponibilidad_materializada(empleados, desde, hasta, duracion_servicio):
+    """Misma respuesta que services.obtener_disponibilidad_rango, con una sola consulta a FreeSlot."""
+    empleados = list(empleados)
+    por_id = {emp.id: emp for emp in empleados}
+    resultado = {}
+    fecha = desde
+    while fecha <= hasta:
+        resultado[fecha] = {emp: [] for emp in empleados}
+        fecha += timedelta(days=1)
+
+    huecos = FreeSlot.objects.filter(
+        empleado_id__in=por_id, fecha__range=(desde, hasta)
+    ).order_by('inicio').values_list('empleado_id', 'fecha', 'inicio_turno', 'inicio', 'fin')
+
+    minuto = timedelta(minutes=1)
+    for empleado_id, fecha, ancla, inicio, fin in huecos:
+        ancla = ancla.astimezone(ZONA_CO)
+        # Primer bloque de la grilla (cada INTERVALO_MINUTOS desde el inicio del turno) dentro del hueco
+        actual = -(-((inicio - ancla) // minuto) // INTERVALO_MINUTOS) * INTERVALO_MINUTOS
+        ultimo = (fin - ancla) // minuto - duracion_servicio
+        horas = resultado[fecha][por_id[empleado_id]]
+        while actual <= ultimo:
+            horas.append((ancla + timedelta(minutes=actual)).strftime("%H:%M"))
+            actual += INTERVALO_MINUTOS
+    return resultado
@@ -0,0 +1,79 @@
+# UBICACIÓN: salon/utils/idempotencia.py
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from salon.models import IdempotencyKey
+
+CABECERA = 'Idempotency-Key'
+
+
+def _ttl():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCIA_TTL_HORAS', 24))
+
+
+def _repetir(guardada):
+    respuesta = HttpResponse(guardada.cuerpo, status=guardada.estado_http, content_type='application/json')
+    respuesta['Idempotent-Replayed'] = 'true'
+    return respuesta
+
+
+def idempotente(vista_func):
+    """
+    Decorador para POST de la API: si llega la cabecera Idempotency-Key, la primera
+    respuesta (código y cuerpo) se guarda por negocio y clave durante IDEMPOTENCIA_TTL_HORAS.
+    Los reintentos con la misma clave reciben esa respuesta sin volver a ejecutar la vista
+    (ni el bloqueo de reserva ni las consultas de conflicto). Los errores 5xx no se guardan.
+    """
+    @wraps(vista_func)
+    def _wrapped_view(request, slug_peluqueria, *args, **kwargs):
+        clave = request.headers.get(CABECERA)
+        if not clave or request.method != 'POST':
+            return vista_func(request, slug_peluqueria, *args, **kwargs)
+        if len(clave) > 255:
+            return JsonResponse({'error': f'{CABECERA} demasiado larga (máx. 255)'}, status=400)
+
+        huella = hashlib.sha256(request.body).hexdigest()
+        tenant_id = request.tenant.id  # TenantMiddleware ya respondió 404 si no existe
+        guardada = IdempotencyKey.objects.filter(
+            tenant_id=tenant_id, clave=clave, expira__gt=timezone.now()
+        ).first()
+        if guardada:
+            if guardada.huella != huella:
+                return JsonResponse({'error': f'{CABECERA} ya usada con otros datos'}, status=422)
+            return _repetir(guardada)
+
+        respuesta = vista_func(request, slug_peluqueria, *args, **kwargs)
+        if respuesta.status_code >= 500:
+            return respuesta
+
+        try:
+            with transaction.atomic():
+                # Una clave vencida que aún no barrió la limpieza se reemplaza
+                IdempotencyKey.objects.filter(tenant_id=tenant_id, clave=clave, expira__lte=timezone.now()).delete()
+                IdempotencyKey.objects.create(
+                    tenant_id=tenant_id, clave=clave, huella=huella, estado_http=respuesta.status_code,
+                    cuerpo=respuesta.content.decode(), expira=timezone.now() + _ttl(),
+                )
+        except IntegrityError:
+            # Otro reintento concurrente guardó primero: todos responden lo mismo
+            ganadora = IdempotencyKey.objects.filter(tenant_id=tenant_id, clave=clave).first()
+            if ganadora and ganadora.huella == huella:
+                return _repetir(ganadora)
+        return respuesta
+    return _wrapped_view
+
+
+def limpiar_vencidas(lote=1000):
+    """Borra las claves vencidas de a `lote` filas (usa el índice de `expira`). Devuelve cuántas borró."""
+    total = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expira__lte=timezone.now()).values_list('id', flat=True)[:lote])
+        if not ids:
+            return total
+        total += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
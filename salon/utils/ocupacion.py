@@ -0,0 +1,70 @@
+# UBICACIÓN: salon/utils/ocupacion.py
+from datetime import timedelta
+
+_MICRO_POR_MINUTO = 60 * 1000 * 1000
+
+
+def _minutos(delta, redondear_arriba=False):
+    """Convierte un timedelta a minutos enteros (piso o techo) sin pasar por float."""
+    micro = delta // timedelta(microseconds=1)
+    if redondear_arriba:
+        return -((-micro) // _MICRO_POR_MINUTO)
+    return micro // _MICRO_POR_MINUTO
+
+
+class MapaOcupacion:
+    """
+    Mapa de ocupación de una jornada con resolución de un minuto.
+
+    La jornada se guarda como un entero de Python usado como bitset: el bit ``i``
+    representa el minuto ``i`` contado desde el inicio del turno y vale 1 si está
+    ocupado. Almuerzo, citas y ausencias se "estampan" una sola vez y luego todos
+    los inicios libres para una duración salen de unas pocas operaciones de bits,
+    en lugar de recorrer todas las citas por cada bloque candidato.
+    """
+
+    def __init__(self, inicio, fin):
+        self.inicio = inicio
+        self.total_minutos = max(_minutos(fin - inicio), 0)
+        self.ocupado = 0
+
+    def marcar(self, desde, hasta):
+        """Marca como ocupado el intervalo [desde, hasta). Se recorta a la jornada."""
+        primero = max(_minutos(desde - self.inicio), 0)
+        ultimo = min(_minutos(hasta - self.inicio, redondear_arriba=True), self.total_minutos)
+        if ultimo > primero:
+            self.ocupado |= ((1 << (ultimo - primero)) - 1) << primero
+
+    def inicios_libres(self, duracion, intervalo):
+        """
+        Devuelve los datetimes de inicio (cada ``intervalo`` minutos desde el inicio
+        del turno) en los que caben ``duracion`` minutos seguidos sin ocupación.
+        """
+        completo = (1 << self.total_minutos) - 1
+        libres = completo & ~self.ocupado
+
+        # Tras el bucle, el bit i sigue encendido solo si los minutos i..i+duracion-1
+        # están libres. Se usa doblado de desplazamientos: O(log duracion) operaciones.
+        cubiertos = 1
+        while cubiertos < duracion:
+            paso = min(cubiertos, duracion - cubiertos)
+            libres &= libres >> paso
+            cubiertos += paso
+
+        return [
+            self.inicio + timedelta(minutes=minuto)
+            for minuto in range(0, self.total_minutos - duracion + 1, intervalo)
+            if (libres >> minuto) & 1
+        ]
+
+    def tramos_libres(self):
+        """Tramos libres como pares (minuto_inicio, minuto_fin) contados desde el inicio del turno."""
+        libres = ((1 << self.total_minutos) - 1) & ~self.ocupado
+        tramos = []
+        while libres:
+            inicio = (libres & -libres).bit_length() - 1
+            corrido = libres >> inicio
+            largo = (corrido ^ (corrido + 1)).bit_length() - 1
+            tramos.append((inicio, inicio + largo))
+            libres &= ~(((1 << largo) - 1) << inicio)
+        return tramos
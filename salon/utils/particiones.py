@@ -0,0 +1,153 @@
+# UBICACIÓN: salon/utils/particiones.py
+"""
+Particionado mensual de salon_appointment por fecha_hora_inicio (solo PostgreSQL).
+
+Estructura tras `manage.py particionar_citas`:
+  - salon_appointment_historico: la tabla original, con todo lo anterior al mes en que se convirtió.
+  - salon_appointment_pAAAAMM: una partición por mes (límites a medianoche hora Colombia).
+  - salon_appointment_pdefault: lo que caiga fuera de las particiones creadas (reservas muy lejanas).
+
+Las consultas de agenda filtran fecha_hora_inicio por rango (ver services.DURACION_MAXIMA_CITA),
+así PostgreSQL solo abre las particiones del mes consultado.
+
+La restricción de exclusión contra solapes se crea en cada partición (PostgreSQL no permite una
+global sin incluir la clave de partición). Una cita que cruce la medianoche de fin de mes no se
+compara con las de la partición siguiente; la verificación de choques de la app sí la cubre.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from salon.services import inicio_dia, localizar
+from salon.utils.booking_lock import RESTRICCION_SIN_SOLAPES
+
+TABLA = 'salon_appointment'
+HISTORICO = f'{TABLA}_historico'
+DEFECTO = f'{TABLA}_pdefault'
+
+
+def mes_de(fecha):
+    return fecha.replace(day=1)
+
+
+def mes_siguiente(mes):
+    return (mes.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def meses(desde, cantidad):
+    """Primer día de cada uno de los `cantidad` meses que empiezan en el mes de `desde`."""
+    resultado = [mes_de(desde)]
+    while len(resultado) < cantidad:
+        resultado.append(mes_siguiente(resultado[-1]))
+    return resultado[:cantidad]
+
+
+def nombre_particion(mes):
+    return f'{TABLA}_p{mes:%Y%m}'
+
+
+def _limite(mes):
+    """Literal timestamptz de la medianoche (hora Colombia) del primer día del mes."""
+    return f"'{inicio_dia(mes).isoformat()}'"
+
+
+def _existe(cursor, tabla):
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [tabla])
+    return cursor.fetchone()[0]
+
+
+def esta_particionada(cursor):
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))', [TABLA])
+    return cursor.fetchone()[0]
+
+
+def _restriccion_solapes(cursor, tabla, sufijo):
+    cursor.execute(f"""
+        ALTER TABLE {tabla} ADD CONSTRAINT {RESTRICCION_SIN_SOLAPES}_{sufijo}
+        EXCLUDE USING gist (
+            empleado_id WITH =,
+            tstzrange(fecha_hora_inicio, fecha_hora_fin, '[)') WITH &&
+        ) WHERE (estado IN ('pendiente', 'confirmada') AND fecha_hora_fin IS NOT NULL)
+    """)
+
+
+def crear_particion(cursor, mes):
+    """
+    Crea la partición del mes si no existe. Lo que ya hubiera caído en la partición por
+    defecto para ese mes se mueve a la nueva antes de adjuntarla. Devuelve True si la creó.
+    """
+    nombre = nombre_particion(mes)
+    if _existe(cursor, nombre):
+        return False
+    desde, hasta = _limite(mes), _limite(mes_siguiente(mes))
+
+    cursor.execute(f'CREATE TABLE {nombre} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(f"""
+        WITH movidas AS (
+            DELETE FROM {DEFECTO} WHERE fecha_hora_inicio >= {desde} AND fecha_hora_inicio < {hasta} RETURNING *
+        )
+        INSERT INTO {nombre} SELECT * FROM movidas
+    """)
+    _restriccion_solapes(cursor, nombre, nombre[-7:])
+    # Al adjuntarla hereda PK, índices y llaves foráneas de la tabla padre
+    cursor.execute(f'ALTER TABLE {TABLA} ATTACH PARTITION {nombre} FOR VALUES FROM ({desde}) TO ({hasta})')
+    return True
+
+
+def convertir(cursor):
+    """
+    Convierte salon_appointment en tabla particionada. La tabla actual no se copia: queda
+    como partición histórica (todo lo anterior al mes en curso); solo las citas del mes en
+    curso en adelante se mueven (a la partición por defecto, de donde crear_particion las
+    reparte). Debe correr en una transacción.
+    """
+    cursor.execute(f'LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE')
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {TABLA}')
+    siguiente_id = cursor.fetchone()[0]
+    corte = mes_de(localizar(timezone.now()).date())
+
+    # Índices propios (no los de PK ni exclusión) para recrearlos con el mismo nombre en la tabla nueva:
+    # las migraciones futuras de Django los siguen encontrando donde esperan.
+    cursor.execute("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+    """, [TABLA])
+    indices = cursor.fetchall()
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [TABLA])
+    foraneas = cursor.fetchall()
+
+    cursor.execute(f'ALTER TABLE {TABLA} RENAME TO {HISTORICO}')
+    # El id pasa a una secuencia propia de la tabla nueva (identity/serial no se comparten con particiones)
+    cursor.execute(f'ALTER TABLE {HISTORICO} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+    cursor.execute(f'ALTER TABLE {HISTORICO} ALTER COLUMN id DROP DEFAULT')
+    cursor.execute(f'DROP SEQUENCE IF EXISTS {TABLA}_id_seq')
+    for nombre, _ in indices:
+        cursor.execute(f'ALTER INDEX {nombre} RENAME TO {("h_" + nombre)[:63]}')
+
+    cursor.execute(f'CREATE TABLE {TABLA} (LIKE {HISTORICO} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (fecha_hora_inicio)')
+    cursor.execute(f'CREATE SEQUENCE {TABLA}_id_seq START WITH {siguiente_id} OWNED BY {TABLA}.id')
+    cursor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN id SET DEFAULT nextval('{TABLA}_id_seq')")
+    # La clave de partición tiene que ser parte de la PK
+    cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_part_pkey PRIMARY KEY (id, fecha_hora_inicio)')
+    for _, definicion in indices:
+        cursor.execute(definicion)
+    for nombre, definicion in foraneas:
+        cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {nombre} {definicion}')
+
+    cursor.execute(f'CREATE TABLE {DEFECTO} PARTITION OF {TABLA} DEFAULT')
+    _restriccion_solapes(cursor, DEFECTO, 'pdefault')
+
+    # Citas del mes en curso en adelante: salen de la histórica. El resto se queda donde está.
+    cursor.execute(f"""
+        WITH movidas AS (DELETE FROM {HISTORICO} WHERE fecha_hora_inicio >= {_limite(corte)} RETURNING *)
+        INSERT INTO {TABLA} SELECT * FROM movidas
+    """)
+    cursor.execute(f'ALTER TABLE {TABLA} ATTACH PARTITION {HISTORICO} FOR VALUES FROM (MINVALUE) TO ({_limite(corte)})')
+
+
+def asegurar_particiones(cursor, meses_adelante):
+    """Particiona la tabla si hace falta y crea las del mes en curso y los siguientes. Devuelve las creadas."""
+    if not esta_particionada(cursor):
+        convertir(cursor)
+    hoy = localizar(timezone.now()).date()
+    return [nombre_particion(mes) for mes in meses(hoy, meses_adelante) if crear_particion(cursor, mes)]
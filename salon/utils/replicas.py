@@ -0,0 +1,108 @@
+# UBICACIÓN: salon/utils/replicas.py
+"""
+Lecturas contra una réplica de solo lectura (REPLICA_DATABASE_URL).
+
+Reglas del router (activas solo si settings.REPLICA_DB apunta a un alias configurado):
+  - Las peticiones GET/HEAD/OPTIONS leen de la réplica: landing, catálogo,
+    disponibilidad, agenda y panel.
+  - Toda escritura va a la primaria, y también las lecturas dentro de una transacción
+    de la primaria (la reserva corre en una: bloqueo + verificación de choques + INSERT).
+  - Una vez que la petición escribió, el resto de sus lecturas van a la primaria.
+  - La respuesta de una petición que escribió deja la cookie REPLICA_COOKIE: ese cliente
+    lee de la primaria durante REPLICA_FIJAR_SEGUNDOS, lo que tarde la réplica en alcanzarla.
+  - Fuera de una petición (comandos, shell, tareas) todo va a la primaria.
+  - La cache compartida en la base (tabla de createcachetable) siempre usa la primaria.
+  - Lo que se va a guardar en una cache (negocios, disponibilidad, catálogo, directorio,
+    índice de búsqueda) se lee dentro de `primaria()`, desde la primaria.
+
+El estado de la petición vive en un ContextVar que fija ReplicaMiddleware, así sirve
+igual con WSGI (un hilo por petición) y con ASGI.
+
+Las caches se invalidan cuando la primaria confirma: si se llenaran desde una réplica
+atrasada guardarían, ya con la versión nueva, datos de antes del cambio, y nada las
+volvería a invalidar. Por eso se llenan desde la primaria; un acierto de cache no toca
+ninguna base, y el resto de las lecturas (agenda, panel, consultas sin cache) sí van a
+la réplica.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+REPLICA_COOKIE = 'fijar_primaria'
+# Cache compartida en la base (DatabaseCache): siempre en la primaria, y escribir en ella no
+# fija al cliente a la primaria
+APP_CACHE = 'django_cache'
+
+
+@dataclass
+class EstadoPeticion:
+    usar_replica: bool
+    escribio: bool = False
+
+
+_estado = ContextVar('salon_replica_estado', default=None)
+_forzar_primaria = ContextVar('salon_replica_forzar_primaria', default=False)
+
+
+def alias_replica():
+    """Alias de la réplica, o None si no hay ninguna configurada."""
+    alias = getattr(settings, 'REPLICA_DB', None)
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def primaria():
+    """Las lecturas dentro del bloque van a la primaria (también en hilos de sync_to_async)."""
+    token = _forzar_primaria.set(True)
+    try:
+        yield
+    finally:
+        _forzar_primaria.reset(token)
+
+
+def iniciar_peticion(request):
+    """Marca la petición como de lectura (réplica) o no. Devuelve el token para terminar_peticion."""
+    usar = request.method in METODOS_LECTURA and REPLICA_COOKIE not in request.COOKIES
+    return _estado.set(EstadoPeticion(usar_replica=usar))
+
+
+def terminar_peticion(token):
+    """Cierra el estado de la petición y devuelve True si escribió en la primaria."""
+    estado = _estado.get()
+    _estado.reset(token)
+    return bool(estado and estado.escribio)
+
+
+class RouterReplica:
+    """Router de salon_project/settings.py (DATABASE_ROUTERS). Ver reglas en el módulo."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == APP_CACHE or _forzar_primaria.get():
+            return DEFAULT_DB_ALIAS
+        replica = alias_replica()
+        estado = _estado.get()
+        if not (replica and estado and estado.usar_replica) or estado.escribio:
+            return DEFAULT_DB_ALIAS
+        # Objetos ya cargados (o recién escritos) en la primaria siguen leyendo sus relaciones de ahí
+        instancia = hints.get('instance')
+        if instancia is not None and instancia._state.db:
+            return instancia._state.db
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado and model._meta.app_label != APP_CACHE:
+            estado.escribio = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, alias_replica()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
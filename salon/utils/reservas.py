@@ -0,0 +1,78 @@
+# UBICACIÓN: salon/utils/reservas.py
+"""
+Creación de citas, compartida por la página pública (views.booking_page) y la API.
+
+Presupuesto de consultas por reserva (sin contar SAVEPOINT/RELEASE de la transacción):
+  1. Servicio del negocio (o apartado + servicio, si se confirma un apartado); el negocio
+     ya viene resuelto por TenantMiddleware (request.tenant)
+  2. Bloqueo del profesional (BookingManager)
+  3. Conflictos: citas activas y apartados vigentes en una sola consulta (UNION ALL)
+  4. INSERT de la cita (fecha_hora_fin ya calculada, sin volver a leer el servicio)
+  5. Resumen diario del profesional (un INSERT ... ON CONFLICT, ver utils/resumen_diario.py)
+  (+1 DELETE del apartado confirmado)
+Los tests de salon/tests.py fijan estos números.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from salon.models import Service as Servicio, Appointment as Cita, SlotHold as Apartado
+from salon.services import localizar, verificar_conflicto_atomic
+from salon.utils.booking_lock import BookingManager
+
+
+def resolver_servicio(tenant, servicio_id):
+    """Servicio del negocio (una consulta, sin JOIN: el negocio ya viene de request.tenant). Lanza Servicio.DoesNotExist."""
+    servicio = Servicio.objects.get(id=servicio_id, tenant_id=tenant.id)
+    servicio.tenant = tenant
+    return servicio
+
+
+def resolver_apartado(tenant, token):
+    """Apartado vigente del negocio con su servicio (una consulta), o None si no existe o venció."""
+    apartado = Apartado.objects.select_related('servicio').filter(
+        token=token, tenant_id=tenant.id, expira__gt=timezone.now()
+    ).first()
+    if apartado:
+        apartado.tenant = apartado.servicio.tenant = tenant
+    return apartado
+
+
+def crear_cita(servicio, empleado_id, inicio, cliente_nombre, cliente_telefono, cliente_email=None, apartado=None):
+    """
+    Reserva `servicio` (resuelto con resolver_servicio) con el profesional desde `inicio`.
+    Si viene `apartado`, su horario no cuenta como choque y se borra al crear la cita.
+
+    :raises ValueError: 'HORARIO_OCUPADO' si el horario ya no está libre, u otro mensaje
+        si el profesional no es del negocio.
+    :raises ValidationError: si el profesional no existe.
+    """
+    tenant = servicio.tenant
+    inicio = localizar(inicio)
+    fin = inicio + timedelta(minutes=servicio.duracion)
+
+    def _logica_crear_cita(empleado_bloqueado):
+        # Validar pertenencia
+        if empleado_bloqueado.tenant_id != tenant.id:
+            raise ValueError('El empleado no pertenece a esta peluquería')
+
+        if verificar_conflicto_atomic(empleado_bloqueado, inicio, fin, excluir_apartado=apartado and apartado.pk):
+            raise ValueError('HORARIO_OCUPADO')
+
+        cita = Cita.objects.create(
+            tenant=tenant,
+            empleado=empleado_bloqueado,
+            servicio=servicio,
+            cliente_nombre=cliente_nombre,
+            cliente_telefono=cliente_telefono,
+            cliente_email=cliente_email,
+            fecha_hora_inicio=inicio,
+            fecha_hora_fin=fin,
+            precio_total=servicio.precio,
+            estado='confirmada',
+        )
+        if apartado:
+            apartado.delete()
+        return cita
+
+    return BookingManager.ejecutar_reserva_segura(empleado_id, _logica_crear_cita)
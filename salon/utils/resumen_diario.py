@@ -0,0 +1,165 @@
+# UBICACIÓN: salon/utils/resumen_diario.py
+"""
+Resumen diario de citas (DailyRollup): por negocio, profesional, día (hora Colombia) y
+estado guarda cuántas citas hay, cuánto suman (precio_total) y cuántos minutos ocupan.
+
+Se mantiene al guardar o borrar cada cita (ver salon/signals.py), dentro de la misma
+transacción y sin leer antes la fila (INSERT ... ON CONFLICT DO UPDATE para sumar, UPDATE
+para restar), así dos reservas simultáneas del mismo día no se pisan. El panel lee de aquí los totales
+del día, la semana y el mes en una consulta en vez de recorrer el historial de citas.
+
+Archivar citas no las resta: el resumen conserva la historia. `manage.py reconstruir_resumen`
+lo recalcula por tramos de fechas desde las citas vivas y las archivadas.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+
+from salon.models import Appointment as Cita, AppointmentArchive as CitaArchivada, DailyRollup as Resumen
+from salon.services import inicio_dia, localizar
+
+# Campos de la cita que cuentan en el resumen (los cuatro primeros son los de agenda de signals.py)
+CAMPOS = ('empleado_id', 'fecha_hora_inicio', 'fecha_hora_fin', 'estado', 'tenant_id', 'precio_total')
+
+# Las canceladas se cuentan aparte: no suman citas, ingresos ni minutos en el panel
+ESTADOS_SIN_INGRESO = ['cancelada']
+
+_pausado = ContextVar('salon_resumen_pausado', default=False)
+
+
+@contextmanager
+def sin_actualizar():
+    """Borrados que no deben restar del resumen (las citas que se mueven al archivo)."""
+    token = _pausado.set(True)
+    try:
+        yield
+    finally:
+        _pausado.reset(token)
+
+
+def _aporte(valores):
+    """(clave de la fila, (citas, ingresos, minutos)) con que una cita suma al resumen, o None."""
+    empleado_id, inicio, fin, estado, tenant_id, precio = valores
+    if not (empleado_id and inicio and tenant_id):
+        return None
+    minutos = int((fin - inicio).total_seconds() // 60) if fin else 0
+    return (tenant_id, empleado_id, localizar(inicio).date(), estado), (1, Decimal(precio or 0), minutos)
+
+
+def _acumular(totales, valores, signo=1):
+    aporte = _aporte(valores)
+    if aporte:
+        clave, (citas, ingresos, minutos) = aporte
+        total = totales.setdefault(clave, [0, Decimal(0), 0])
+        total[0] += signo * citas
+        total[1] += signo * ingresos
+        total[2] += signo * minutos
+
+
+def aplicar(quitar=(), sumar=()):
+    """
+    Resta del resumen las citas de `quitar` y suma las de `sumar` (tuplas con CAMPOS).
+    Las filas que ganan citas van en un upsert; las que solo pierden (o no cambian de
+    cantidad) ya existen, y van en UPDATE sin INSERT: así borrar en cascada un profesional
+    o un negocio no vuelve a crear filas que apuntan al registro que se está borrando.
+    Sin cambios netos no consulta nada.
+    """
+    if _pausado.get():
+        return
+    deltas = {}
+    for valores in quitar:
+        _acumular(deltas, valores, -1)
+    for valores in sumar:
+        _acumular(deltas, valores)
+    deltas = {clave: total for clave, total in deltas.items() if any(total)}
+    if not deltas:
+        return
+
+    ops = connection.ops
+    tabla = Resumen._meta.db_table
+    nuevas, restas = [], []
+    for (tenant_id, empleado_id, fecha, estado), (citas, ingresos, minutos) in deltas.items():
+        fecha, ingresos = ops.adapt_datefield_value(fecha), ops.adapt_decimalfield_value(ingresos, 12, 2)
+        if citas > 0:
+            nuevas.append([tenant_id, empleado_id, fecha, estado, citas, ingresos, minutos])
+        else:
+            restas.append([citas, ingresos, minutos, empleado_id, fecha, estado])
+
+    with connection.cursor() as cursor:
+        if nuevas:
+            cursor.execute(f"""
+                INSERT INTO {tabla} (tenant_id, empleado_id, fecha, estado, citas, ingresos, minutos)
+                VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(nuevas))}
+                ON CONFLICT (empleado_id, fecha, estado) DO UPDATE SET
+                    citas = {tabla}.citas + excluded.citas,
+                    ingresos = {tabla}.ingresos + excluded.ingresos,
+                    minutos = {tabla}.minutos + excluded.minutos
+            """, [valor for fila in nuevas for valor in fila])
+        if restas:
+            cursor.executemany(f"""
+                UPDATE {tabla} SET citas = citas + %s, ingresos = ingresos + %s, minutos = minutos + %s
+                WHERE empleado_id = %s AND fecha = %s AND estado = %s
+            """, restas)
+
+
+def reconstruir(desde, hasta, tenants=None):
+    """
+    Recalcula desde cero el resumen de los días [desde, hasta] (citas vivas y archivadas)
+    en una transacción. Devuelve cuántas filas quedaron.
+    Una reserva que se confirme mientras corre puede quedar fuera: correrlo con poco tráfico.
+    """
+    filtro = {'fecha_hora_inicio__gte': inicio_dia(desde), 'fecha_hora_inicio__lt': inicio_dia(hasta + timedelta(days=1))}
+    resumenes = Resumen.objects.filter(fecha__range=(desde, hasta))
+    if tenants is not None:
+        filtro['tenant__in'] = tenants
+        resumenes = resumenes.filter(tenant__in=tenants)
+
+    with transaction.atomic():
+        totales = {}
+        citas = Cita.objects.filter(**filtro).values_list(*CAMPOS).union(
+            CitaArchivada.objects.filter(**filtro).values_list(*CAMPOS), all=True
+        )
+        for valores in citas:
+            _acumular(totales, valores)
+        resumenes.delete()
+        Resumen.objects.bulk_create([
+            Resumen(tenant_id=tenant_id, empleado_id=empleado_id, fecha=fecha, estado=estado,
+                    citas=citas, ingresos=ingresos, minutos=minutos)
+            for (tenant_id, empleado_id, fecha, estado), (citas, ingresos, minutos) in totales.items()
+        ], batch_size=1000)
+    return len(totales)
+
+
+def totales_panel(tenant, hoy):
+    """
+    Citas, ingresos, minutos y canceladas de hoy, la semana (lunes a domingo) y el mes
+    de `hoy`, en una sola consulta: {'hoy': {...}, 'semana': {...}, 'mes': {...}}.
+    """
+    lunes = hoy - timedelta(days=hoy.weekday())
+    primero = hoy.replace(day=1)
+    ultimo = (primero.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    periodos = {
+        'hoy': Q(fecha=hoy),
+        'semana': Q(fecha__range=(lunes, lunes + timedelta(days=6))),
+        'mes': Q(fecha__range=(primero, ultimo)),
+    }
+
+    agregados = {}
+    for nombre, periodo in periodos.items():
+        validas = periodo & ~Q(estado__in=ESTADOS_SIN_INGRESO)
+        agregados[f'{nombre}_citas'] = Sum('citas', filter=validas, default=0)
+        agregados[f'{nombre}_ingresos'] = Sum('ingresos', filter=validas, default=Decimal(0))
+        agregados[f'{nombre}_minutos'] = Sum('minutos', filter=validas, default=0)
+        agregados[f'{nombre}_canceladas'] = Sum('citas', filter=periodo & Q(estado__in=ESTADOS_SIN_INGRESO), default=0)
+
+    fila = Resumen.objects.filter(
+        tenant=tenant, fecha__range=(min(lunes, primero), max(lunes + timedelta(days=6), ultimo))
+    ).aggregate(**agregados)
+    return {
+        nombre: {campo: fila[f'{nombre}_{campo}'] for campo in ('citas', 'ingresos', 'minutos', 'canceladas')}
+        for nombre in periodos
+    }
@@ -1,32 +1,59 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from datetime import datetime, timedelta
 
 from .models import Tenant, Professional, Service, Product, Appointment, ExternalPayment, Absence
 # Asegurate de haber creado el archivo forms.py que te puse arriba
 from .forms import ConfigNegocioForm, AbsenceForm 
+from .services import inicio_dia, localizar
+from .utils import agenda, busqueda, directorio, geo, replicas, reservas, resumen_diario
 
 # --- Vistas Públicas ---
 
 def landing_saas_view(request):
-    """Página de inicio / Landing Page"""
-    ciudades = Tenant.objects.values_list('ciudad', flat=True).distinct()
-    peluquerias = Tenant.objects.all()
-    
-    return render(request, 'salon/index.html', {
-        'ciudades': ciudades,
-        'peluquerias': peluquerias
-    })
+    """Página de inicio / Landing Page: directorio por ciudad (?ciudad=) y por páginas (?pagina=)"""
+    ciudad = request.GET.get('ciudad', '')
+    numero = request.GET.get('pagina', '1')
+    # Los anónimos ven todos la misma página: se sirve entera desde la cache
+    anonimo = not request.user.is_authenticated
+    version = directorio.version()
+    if anonimo:
+        respuesta = directorio.pagina_cacheada(version, ciudad, numero)
+        if respuesta is not None:
+            return respuesta
+
+    # Ciudades, tarjetas y página quedan en la cache bajo la versión ya leída: desde la primaria
+    with replicas.primaria():
+        ciudades = directorio.ciudades(version)
+        peluquerias = Tenant.objects.order_by('name', 'id')
+        if ciudad:
+            peluquerias = peluquerias.filter(ciudad=ciudad)
+        pagina = Paginator(peluquerias, directorio.POR_PAGINA).get_page(numero)
+
+        respuesta = render(request, 'salon/index.html', {
+            'ciudades': ciudades,
+            'ciudad': ciudad,
+            'pagina': pagina,
+            'peluquerias': directorio.marcar_tarjetas(pagina.object_list),
+            'cache_tarjetas': settings.DIRECTORIO_CACHE_SEGUNDOS,
+        })
+    # Con sesión la página cambia (menú del usuario): las caches intermedias deben separarlas
+    patch_vary_headers(respuesta, ['Cookie'])
+    # Solo combinaciones válidas, para que parámetros inventados no llenen la cache
+    if anonimo and numero == str(pagina.number) and (not ciudad or ciudad in ciudades):
+        directorio.guardar_pagina(version, ciudad, numero, respuesta)
+    return respuesta
 
 def booking_page(request, slug):
     """Vista pública para que el cliente reserve"""
-    tenant = get_object_or_404(Tenant, subdomain=slug)
-    servicios = tenant.services.all()
-    profesionales = tenant.professionals.all()
-
     if request.method == 'POST':
         servicio_id = request.POST.get('servicio')
         profesional_id = request.POST.get('profesional')
@@ -42,29 +69,24 @@ def booking_page(request, slug):
             # Construir fecha hora completa
             fecha_hora_str = f"{fecha} {hora}"
             fecha_hora = datetime.strptime(fecha_hora_str, "%Y-%m-%d %H:%M")
-            
-            servicio_obj = Service.objects.get(id=servicio_id)
-            profesional_obj = Professional.objects.get(id=profesional_id)
-
-            # Crear la cita
-            cita = Appointment.objects.create(
-                tenant=tenant,
-                servicio=servicio_obj,
-                empleado=profesional_obj,
-                fecha_hora_inicio=fecha_hora,
-                cliente_nombre=nombre,
-                cliente_telefono=telefono,
-                cliente_email=email,
-                precio_total=servicio_obj.precio,
-                estado='confirmada' 
-            )
+
+            # Misma ruta que la API: bloqueo del profesional y verificación de choques
+            servicio_obj = reservas.resolver_servicio(request.tenant, servicio_id)
+            cita = reservas.crear_cita(servicio_obj, profesional_id, fecha_hora, nombre, telefono, email or None)
             messages.success(request, "¡Cita reservada con éxito!")
             return redirect('confirmacion_reserva', cita_id=cita.id)
 
         except Exception as e:
-            messages.error(request, f"Error al reservar: {str(e)}")
+            if 'HORARIO_OCUPADO' in str(e):
+                messages.error(request, "Ese horario acaba de ser tomado, por favor elige otro.")
+            else:
+                messages.error(request, f"Error al reservar: {str(e)}")
             return redirect('agendar_cita', slug=slug)
 
+    tenant = request.tenant  # Resuelto por TenantMiddleware (404 si no existe)
+    servicios = tenant.services.all()
+    profesionales = tenant.professionals.all()
+
     return render(request, 'salon/agendar.html', {
         'tenant': tenant,
         'servicios': servicios,
@@ -79,29 +101,71 @@ def confirmation_view(request, cita_id):
         'mensaje': 'Reserva Exitosa'
     })
 
+def negocios_cercanos(request):
+    """JSON con los negocios más cercanos a ?lat=&lon= (opcional ?ciudad= y ?k=), para la landing"""
+    try:
+        lat, lon = float(request.GET['lat']), float(request.GET['lon'])
+        k = min(int(request.GET.get('k', 12)), geo.MAX_RESULTADOS)
+        if not (-geo.LATITUD_MAX <= lat <= geo.LATITUD_MAX and -180 <= lon <= 180) or k < 1:
+            raise ValueError('fuera de rango')
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Se requieren lat y lon válidos'}, status=400)
+
+    resultados = geo.cercanos(lat, lon, k=k, ciudad=request.GET.get('ciudad') or None)
+    return JsonResponse({'negocios': [{
+        'nombre': negocio.name,
+        'url': reverse('agendar_cita', args=[negocio.subdomain]),
+        'ciudad': negocio.ciudad,
+        'direccion': negocio.direccion,
+        'distancia_km': round(distancia, 2),
+    } for distancia, negocio in resultados]})
+
+def buscar_negocios(request):
+    """JSON con los negocios que coinciden con ?q= (opcional ?limite=) y el autocompletado de la última palabra"""
+    texto = request.GET.get('q', '').strip()
+    try:
+        limite = min(int(request.GET.get('limite', 20)), busqueda.MAX_RESULTADOS)
+        if limite < 1:
+            raise ValueError('fuera de rango')
+    except ValueError:
+        return JsonResponse({'error': 'limite inválido'}, status=400)
+
+    return JsonResponse({
+        'resultados': [{
+            'nombre': negocio['name'],
+            'url': reverse('agendar_cita', args=[negocio['subdomain']]),
+            'ciudad': negocio['ciudad'],
+            'puntaje': round(negocio['puntaje'], 2),
+        } for negocio in busqueda.buscar(texto, limite)],
+        'sugerencias': busqueda.sugerir(texto),
+    })
+
 # --- Panel de Gestión (Privado) ---
 
 @login_required
 def dashboard(request):
     """Panel principal del dueño"""
-    try:
-        tenant = request.user.tenants.first()
-    except:
-        tenant = None
-
-    if not tenant:
+    tenant = request.current_tenant
+    if not (tenant and tenant.es_dueno):
         return redirect('crear_negocio')
 
     # Datos para el dashboard
+    # Rango explícito del día en Colombia (un __date no puede usar el índice tenant+fecha)
+    hoy = localizar(timezone.now()).date()
+    desde = inicio_dia(hoy)
     citas_hoy = Appointment.objects.filter(
         tenant=tenant, 
-        fecha_hora_inicio__date=timezone.now().date()
+        fecha_hora_inicio__gte=desde,
+        fecha_hora_inicio__lt=desde + timedelta(days=1)
     ).order_by('fecha_hora_inicio')
+    # Totales de hoy, la semana y el mes desde el resumen diario (una consulta)
+    totales = resumen_diario.totales_panel(tenant, hoy)
     
     context = {
         'tenant': tenant,
         'appointments': citas_hoy,
-        'total_sales': 0, 
+        'totales': totales,
+        'total_sales': totales['mes']['ingresos'],
     }
     return render(request, 'salon/dashboard.html', context)
 
@@ -124,9 +188,8 @@ def create_tenant_view(request):
 @login_required
 def create_professional_view(request):
     """Crear un nuevo empleado/profesional"""
-    try:
-        tenant = request.user.tenants.first()
-    except:
+    tenant = request.current_tenant
+    if not (tenant and tenant.es_dueno):
         return redirect('panel_negocio')
 
     if request.method == 'POST':
@@ -156,15 +219,74 @@ def create_professional_view(request):
 
 # --- Gestión de Agenda y Ausencias ---
 
+def _pagina_agenda(request, tenant):
+    """
+    Página de la agenda según ?desde=&hasta= (YYYY-MM-DD, por defecto hoy ± agenda.DIAS_VENTANA),
+    ?profesional=, ?estado= y ?cursor=. Un profesional solo ve sus citas. Lanza ValueError.
+    """
+    parametros = request.GET
+    desde, hasta = agenda.ventana_por_defecto(localizar(timezone.now()).date())
+    if parametros.get('desde'):
+        desde = datetime.strptime(parametros['desde'], '%Y-%m-%d').date()
+    if parametros.get('hasta'):
+        hasta = datetime.strptime(parametros['hasta'], '%Y-%m-%d').date()
+    limite = min(int(parametros.get('limite') or agenda.POR_PAGINA), agenda.MAX_POR_PAGINA)
+    if limite < 1:
+        raise ValueError('limite debe ser positivo')
+
+    citas, siguiente = agenda.pagina(
+        tenant, desde, hasta,
+        cursor=parametros.get('cursor'),
+        empleado_id=int(parametros['profesional']) if parametros.get('profesional') else None,
+        estado=parametros.get('estado') or None,
+        usuario=None if tenant.es_dueno else request.user,
+        limite=limite,
+    )
+    return {'citas': citas, 'siguiente': siguiente, 'desde': desde, 'hasta': hasta,
+            'profesional': parametros.get('profesional', ''), 'estado': parametros.get('estado', '')}
+
 @login_required
 def client_agenda(request):
-    """Vista de agenda para el profesional/dueño"""
-    tenant = request.user.tenants.first()
+    """Vista de agenda para el profesional/dueño: una ventana de fechas, por páginas"""
+    tenant = request.current_tenant
     if not tenant:
         return redirect('crear_negocio')
-    citas = Appointment.objects.filter(tenant=tenant).order_by('-fecha_hora_inicio')
-    
-    return render(request, 'salon/mi_agenda.html', {'citas': citas})
+    try:
+        contexto = _pagina_agenda(request, tenant)
+    except ValueError:
+        messages.error(request, "Filtros de agenda inválidos, se muestran los de hoy.")
+        return redirect('mi_agenda')
+
+    contexto['estados'] = Appointment.ESTADOS
+    if tenant.es_dueno:
+        contexto['profesionales'] = Professional.objects.filter(tenant=tenant).values_list('id', 'nombre')
+    return render(request, 'salon/mi_agenda.html', contexto)
+
+@login_required
+def client_agenda_json(request):
+    """Misma agenda en JSON, para ir cargando páginas con scroll infinito (?cursor=siguiente)"""
+    tenant = request.current_tenant
+    if not tenant:
+        return JsonResponse({'error': 'Negocio no encontrado'}, status=404)
+    try:
+        pagina = _pagina_agenda(request, tenant)
+    except ValueError as ve:
+        return JsonResponse({'error': f'Filtros inválidos: {ve}'}, status=400)
+
+    return JsonResponse({
+        'citas': [{
+            'id': cita.id,
+            'inicio': localizar(cita.fecha_hora_inicio).isoformat(),
+            'fin': cita.fecha_hora_fin and localizar(cita.fecha_hora_fin).isoformat(),
+            'cliente_nombre': cita.cliente_nombre,
+            'cliente_telefono': cita.cliente_telefono,
+            'servicio': cita.servicio.nombre,
+            'profesional': cita.empleado.nombre,
+            'estado': cita.estado,
+            'precio_total': float(cita.precio_total),
+        } for cita in pagina['citas']],
+        'siguiente': pagina['siguiente'],
+    })
 
 @login_required
 def manage_absences(request):
@@ -196,9 +318,10 @@ def manage_absences(request):
 
 @login_required
 def delete_absence(request, absence_id):
-    ausencia = get_object_or_404(Absence, id=absence_id)
+    ausencia = get_object_or_404(Absence.objects.select_related('professional'), id=absence_id)
     # Validar permisos simple
-    if (ausencia.professional.user == request.user) or (request.user.tenants.exists()):
+    tenant = request.current_tenant
+    if (ausencia.professional.user_id == request.user.id) or (tenant and tenant.es_dueno and tenant.id == ausencia.professional.tenant_id):
         ausencia.delete()
         messages.success(request, "Ausencia eliminada.")
     return redirect('mis_ausencias')
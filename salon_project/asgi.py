@@ -3,6 +3,8 @@ ASGI config for salon_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+En producción lo sirve gunicorn con workers de uvicorn (ver gunicorn.conf.py y Procfile).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +14,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'salon_project.settings')
+# Django no admite conexiones persistentes bajo ASGI: una por petición (o PgBouncer delante)
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
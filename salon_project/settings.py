@@ -33,9 +33,12 @@ INSTALLED_APPS = [
 # 3. MIDDLEWARE
 # ==========================================
 
+# Los de salon/ sirven sync y async. WhiteNoiseMiddleware (6.8) solo es sync: bajo ASGI
+# Django la envuelve y cada petición pasa una vez por un hilo antes de llegar a la cadena async.
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'salon.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,13 +78,92 @@ WSGI_APPLICATION = 'salon_project.wsgi.application'
 # 5. BASE DE DATOS
 # ==========================================
 
+# Conexiones persistentes (segundos). salon_project/asgi.py lo pone en 0: bajo ASGI cada
+# petición usa hilos distintos y Django no las admite (ver gunicorn.conf.py)
+CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+
 DATABASES = {
     'default': dj_database_url.config(
         default='sqlite:///db.sqlite3',
-        conn_max_age=600
+        conn_max_age=CONN_MAX_AGE
     )
 }
 
+# Modo SQLite para despliegues de una sola máquina:
+# - WAL: los lectores no bloquean al que escribe (y viceversa).
+# - timeout: espera hasta N segundos un bloqueo antes de dar "database is locked".
+# - IMMEDIATE: cada transacción toma el bloqueo de escritura al empezar, así la
+#   verificación de conflicto y la creación de la cita no pueden intercalarse.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': int(os.environ.get('SQLITE_TIMEOUT', 20)),
+    })
+    # Reservas (salon/utils/booking_lock.py): espera por intento; los 5 intentos con su backoff
+    # deben quedar bajo GUNICORN_TIMEOUT (gunicorn.conf.py)
+    SQLITE_TIMEOUT_RESERVAS = float(os.environ.get('SQLITE_TIMEOUT_RESERVAS', 2))
+
+# Réplica de solo lectura (opcional). Las peticiones GET leen de ella; escrituras,
+# reservas y el cliente que acaba de escribir usan la primaria (ver salon/utils/replicas.py).
+# En local sirve un segundo archivo SQLite:
+#   REPLICA_DATABASE_URL=sqlite:///db_replica.sqlite3  (python manage.py migrate --database replica)
+REPLICA_DB = None
+if os.environ.get('REPLICA_DATABASE_URL'):
+    REPLICA_DB = 'replica'
+    DATABASES[REPLICA_DB] = dj_database_url.parse(os.environ['REPLICA_DATABASE_URL'], conn_max_age=CONN_MAX_AGE)
+    # En los tests la réplica es la misma base de pruebas
+    DATABASES[REPLICA_DB]['TEST'] = {'MIRROR': 'default'}
+# Lookups de trigramas (__trigram_word_similar) para BUSQUEDA_MOTOR='trigramas'
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+DATABASE_ROUTERS = ['salon.utils.replicas.RouterReplica']
+# Segundos que un cliente que escribió sigue leyendo de la primaria (retraso de la réplica)
+REPLICA_FIJAR_SEGUNDOS = int(os.environ.get('REPLICA_FIJAR_SEGUNDOS', 5))
+
+# ==========================================
+# 5.1 CACHE
+# ==========================================
+
+# LocMemCache ya desaloja por LRU; MAX_ENTRIES acota la memoria por proceso.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'salon-default',
+    },
+    'disponibilidad': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'salon-disponibilidad',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('DISPONIBILIDAD_CACHE_MAX_ENTRIES', 20000)),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+# Cache compartida por todos los workers y procesos (p. ej. las generaciones que invalidan la
+# disponibilidad): Redis si hay REDIS_URL; si no, una tabla de la base (la crea la migración 0017)
+if os.environ.get('REDIS_URL'):
+    CACHES['compartida'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+else:
+    CACHES['compartida'] = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'salon_cache',
+        'OPTIONS': {'MAX_ENTRIES': 200000},
+    }
+DISPONIBILIDAD_CACHE_TIMEOUT = int(os.environ.get('DISPONIBILIDAD_CACHE_TIMEOUT', 300))
+# Cuerpos JSON del catálogo de la API por versión (ver salon/utils/catalogo.py); las versiones viejas vencen solas
+CATALOGO_CACHE_SEGUNDOS = int(os.environ.get('CATALOGO_CACHE_SEGUNDOS', 3600))
+# Landing pública: ciudades, tarjetas de negocios y páginas para anónimos (ver salon/utils/directorio.py)
+DIRECTORIO_CACHE_SEGUNDOS = int(os.environ.get('DIRECTORIO_CACHE_SEGUNDOS', 300))
+# Búsqueda entre negocios (ver salon/utils/busqueda.py): 'memoria' o 'trigramas' (PostgreSQL)
+BUSQUEDA_MOTOR = os.environ.get('BUSQUEDA_MOTOR', 'memoria')
+# Cada proceso reconstruye su índice completo cada tanto (los cambios llegan por señales)
+BUSQUEDA_INDICE_SEGUNDOS = int(os.environ.get('BUSQUEDA_INDICE_SEGUNDOS', 600))
+
 # ==========================================
 # 6. VALIDACIÓN DE PASSWORD
 # ==========================================
@@ -162,8 +244,25 @@ JAZZMIN_SETTINGS = {
 
 CORS_ALLOW_ALL_ORIGINS = True
 API_SECRET_KEY = os.environ.get('API_SECRET_KEY', 'mi-clave-super-secreta-cambiame')
+# Cuánto tiempo se recuerdan las respuestas de POST con Idempotency-Key
+IDEMPOTENCIA_TTL_HORAS = int(os.environ.get('IDEMPOTENCIA_TTL_HORAS', 24))
+# Cuánto dura un apartado de horario antes de liberarse solo
+APARTADO_TTL_MINUTOS = int(os.environ.get('APARTADO_TTL_MINUTOS', 5))
+# Vigencia de la cache de negocios por subdominio (por proceso) de TenantMiddleware
+TENANT_CACHE_SEGUNDOS = int(os.environ.get('TENANT_CACHE_SEGUNDOS', 60))
+# Citas completadas/canceladas con más de estos días pasan a la tabla de archivo (archivar_citas)
+CITAS_ARCHIVAR_DIAS = int(os.environ.get('CITAS_ARCHIVAR_DIAS', 180))
 
 # --- CONFIGURACION LOGIN AUTOMATICA ---
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = 'panel_negocio'
 LOGOUT_REDIRECT_URL = 'landing_negocio'
+
+# --- LOGS ---
+# Errores de la app (loggers 'salon.*') a la consola, que gunicorn/uvicorn ya recogen
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'consola': {'class': 'logging.StreamHandler'}},
+    'loggers': {'salon': {'handlers': ['consola'], 'level': os.environ.get('SALON_LOG_LEVEL', 'INFO')}},
+}
@@ -5,6 +5,8 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # login / logout (registration/login.html); LOGIN_URL apunta aquí
+    path('accounts/', include('django.contrib.auth.urls')),
     path('', include('salon.urls')),
 ]
 